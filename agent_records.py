@@ -0,0 +1,56 @@
+import numpy as np
+from typing import Dict, Sequence
+
+# Timing fields of the per-agent record tables, grouped by the nested dicts they were
+# stored in before (see AgentRecords.to_dicts)
+AIRCRAFT_RECORD_GROUPS = {
+    'arrival_departure_times': ('arrival_time', 'pushback_time', 'departure_time'),
+    'waiting_times': ('tlof_arrival_queue_waiting_time', 'park_queue_waiting_time', 'tlof_departure_queue_waiting_time'),
+    'process_times': ('landing_process_time', 'charge_process_time', 'departure_process_time'),
+    'time_logs': ('departure_queue_enter_time', 'departure_queue_exit_time'),
+}
+PASSENGER_RECORD_GROUPS = {
+    'arrival_departure_times': ('arrival_time',),
+    'waiting_times': ('waiting_time',),
+    'time_logs': ('departure_queue_exit_time',),
+}
+
+
+class AgentRecords:
+    """
+    Per-agent timing table. Agents are the integer indices 0 .. num_agents - 1 and every
+    timing field is a float64 column of a preallocated structured array, NaN until it is
+    set. The columns are also attributes, e.g. records.arrival_time[agent] = env.now, and can
+    be used directly in vectorized metrics. String labels are only made on export.
+    """
+    def __init__(self, num_agents: int, groups: Dict[str, Sequence[str]], label_prefix: str):
+        self.groups = groups
+        self.label_prefix = label_prefix
+        fields = [field for group_fields in groups.values() for field in group_fields]
+        self.table = np.full(num_agents, np.nan, dtype=[(field, np.float64) for field in fields])
+        for field in fields:
+            setattr(self, field, self.table[field])
+
+    def __len__(self):
+        return len(self.table)
+
+    def label(self, agent: int) -> str:
+        return f"{self.label_prefix}_{agent}"
+
+    def to_dicts(self, group: str) -> Dict[str, Dict[str, float]]:
+        """
+        Exports one group of fields as {label: {field: time}}, the layout of the nested dicts
+        the simulation used to keep, with the fields that were never set left out.
+        """
+        fields = self.groups.get(group, ())
+        exported = {}
+        if not fields:
+            return exported
+        columns = [self.table[field] for field in fields]
+        is_set = np.zeros(len(self.table), dtype=bool)
+        for column in columns:
+            is_set |= ~np.isnan(column)
+        for agent in np.flatnonzero(is_set).tolist():
+            exported[self.label(agent)] = {field: float(column[agent])
+                                           for field, column in zip(fields, columns) if not np.isnan(column[agent])}
+        return exported
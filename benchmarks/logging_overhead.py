@@ -0,0 +1,100 @@
+"""
+Measures what logging costs per event.
+
+Compares, per debug call, the old eager f-string message with the lazy Logger calls with
+logging off and on, then the time per aircraft of a whole simulation with is_logging off
+and on. With logging on the level is DEBUG, so the per-aircraft messages are written.
+Run from the repository root:
+
+    python benchmarks/logging_overhead.py
+"""
+import logging
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logger import Logger
+from sim_runner import run_simulation
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+
+def per_call_microseconds(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def benchmark_calls(number=200000):
+    env = Clock()
+    start_datetime = datetime(2024, 1, 1)
+
+    def advance():
+        # Each event happens at a new simulation time, so the sim-time cache never hits
+        env.now += 0.001
+
+    def eager(logger):
+        advance()
+        logger.debug(f"Aircraft_1 will request terminal buffer at {(start_datetime + timedelta(hours=env.now)).strftime('%Y-%m-%d %H:%M:%S')}. Num aircraft at terminal buffer: {3}")
+
+    def lazy(logger):
+        advance()
+        logger.debug("%s will request terminal buffer at %s. Num aircraft at terminal buffer: %s", 'Aircraft_1', logger.sim_time, 3)
+
+    results = {}
+    disabled = Logger(env, start_datetime, is_logging=False)
+    results['no message'] = per_call_microseconds(advance, number)
+    results['eager f-string, logging off'] = per_call_microseconds(lambda: eager(disabled), number)
+    results['lazy, logging off'] = per_call_microseconds(lambda: lazy(disabled), number)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            enabled = Logger(env, start_datetime, is_logging=True)
+            enabled.logger.setLevel(logging.DEBUG)
+            results['lazy, logging on'] = per_call_microseconds(lambda: lazy(enabled), number // 20)
+            enabled.close()
+            enabled.logger.setLevel(logging.NOTSET)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def benchmark_simulation(num_aircraft=2500, is_logging=False):
+    kwargs = dict(aircraft_arrival_rate=20, passenger_arrival_rate=10000, charge_time=6, num_park=3,
+                  num_aircraft=num_aircraft, num_passenger=10000, seat_capacity=4, tlof_feedback=False,
+                  tlof_time=1, stochastic=True, blocking=True, terminal_buffer_capacity=50, seed=0,
+                  no_pax_arrival=True, summary_only=True)
+
+    def run():
+        _, system_metrics = run_simulation(**kwargs, is_logging=is_logging)
+        # Each run adds a file handler to the shared module logger
+        system_metrics.sim.logger.close()
+
+    module_logger = logging.getLogger('logger')
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        if is_logging:
+            module_logger.setLevel(logging.DEBUG)
+        try:
+            seconds = min(timeit.repeat(run, number=1, repeat=3))
+        finally:
+            module_logger.setLevel(logging.NOTSET)
+            os.chdir(cwd)
+    return seconds / num_aircraft * 1e6
+
+
+if __name__ == '__main__':
+    print('Per debug call (us):')
+    for name, microseconds in benchmark_calls().items():
+        print(f'  {name:<30} {microseconds:8.3f}')
+    print('Per aircraft of a simulation (us):')
+    for is_logging in (False, True):
+        print(f'  is_logging={is_logging!s:<19} {benchmark_simulation(is_logging=is_logging):8.2f}')
@@ -0,0 +1,184 @@
+"""
+Benchmark suite for the simulator and the sweep pipeline. Runs without a database.
+
+Times single run_simulation calls at small, medium and large num_aircraft, at low and near
+saturation utilization, with and without passengers, the SystemMetrics post-processing of
+a full run, and a mini sweep through a process Pool, with one task per run and with one
+task per adaptively replicated configuration. Each benchmark reports the best of a few
+repeats. Run from the repository root:
+
+    python benchmarks/suite.py --save baseline.json
+    python benchmarks/suite.py --compare baseline.json --threshold 0.1
+
+--compare prints the change of every benchmark against the saved baseline and exits with
+status 1 if any got slower by more than the threshold (a fraction of the baseline time).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from datetime import datetime
+from functools import partial
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import simpy
+
+from metrics import SystemMetrics
+from replications import METRIC_NAMES
+import sim_runner
+from sim_runner import run_configuration_with_params, run_simulation, run_simulations_with_params
+
+# Three parks charging for 6 minutes serve about 30 aircraft per hour
+BASE_PARAMS = dict(aircraft_arrival_rate=20, passenger_arrival_rate=60, charge_time=6, num_park=3,
+                   num_aircraft=2500, num_passenger=7500, seat_capacity=4, tlof_feedback=False,
+                   tlof_time=1, stochastic=True, blocking=True, terminal_buffer_capacity=50, seed=0,
+                   no_pax_arrival=False)
+SIZES = {'small': 500, 'medium': 2500, 'large': 10000}
+UTILIZATIONS = {'low_utilization': 10, 'near_saturation': 29}
+
+
+def best_seconds(function, repeat, number=1):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def benchmark_run(repeat, **overrides):
+    params = {**BASE_PARAMS, **overrides}
+    if not params['no_pax_arrival']:
+        # Enough passengers to fill every departing aircraft
+        params['num_passenger'] = params['num_aircraft'] * params['seat_capacity']
+    return best_seconds(lambda: run_simulation(**params, is_logging=False, summary_only=True), repeat)
+
+
+def benchmark_metrics(repeat):
+    """
+    Time to compute every sweep metric from a large full (not summary-only) run.
+    """
+    params = {**BASE_PARAMS, 'num_aircraft': SIZES['large'], 'num_passenger': SIZES['large'] * BASE_PARAMS['seat_capacity']}
+    _, system_metrics = run_simulation(**params, is_logging=False, summary_only=False)
+    simulation = system_metrics.sim
+
+    def compute():
+        metrics = SystemMetrics(simulation, warmup_period=system_metrics.warmup_period)
+        return [getattr(metrics, name)() for name in METRIC_NAMES]
+    # A single computation takes milliseconds, so average over several
+    return best_seconds(compute, repeat, number=20)
+
+
+def benchmark_sweep(repeat, task_type='run', num_processes=2):
+    """
+    Time for a Pool of workers to run a small grid the way sim_runner's sweep does, with the
+    result rows collected in memory instead of written to the database. task_type is 'run'
+    for one task per seed, or 'configuration' for one task per configuration that runs its
+    seeds with adaptive replications.
+    """
+    configurations = [{**BASE_PARAMS, 'num_aircraft': 500, 'num_passenger': 2000, 'aircraft_arrival_rate': rate,
+                       'no_pax_arrival': no_pax_arrival}
+                      for rate in (10, 20) for no_pax_arrival in (False, True)]
+    seeds = list(range(10))
+    if task_type == 'configuration':
+        tasks = [{**configuration, 'seed': seeds[0]} for configuration in configurations]
+        run_task = partial(run_configuration_with_params, seeds=seeds, relative_precision=sim_runner.relative_precision,
+                           absolute_precision=sim_runner.absolute_precision)
+    else:
+        tasks = [{**configuration, 'seed': seed} for configuration in configurations for seed in seeds[:2]]
+        run_task = run_simulations_with_params
+
+    def sweep():
+        with Pool(processes=num_processes) as pool:
+            rows = [row for task_rows, _, _, _ in pool.imap_unordered(run_task, tasks) for row in task_rows]
+        # A configuration task returns a row per replication it ran
+        assert len(rows) >= len(tasks)
+    return best_seconds(sweep, repeat)
+
+
+def benchmarks():
+    """
+    Benchmark name -> function of the number of repeats that returns the best time in seconds.
+    """
+    cases = {}
+    for size, num_aircraft in SIZES.items():
+        cases[f'run_{size}'] = partial(benchmark_run, num_aircraft=num_aircraft)
+    for utilization, rate in UTILIZATIONS.items():
+        cases[f'run_{utilization}'] = partial(benchmark_run, aircraft_arrival_rate=rate)
+    cases['run_no_pax'] = partial(benchmark_run, no_pax_arrival=True)
+    cases['run_no_pax_fast_engine'] = lambda repeat: best_seconds(
+        lambda: run_simulation(**{**BASE_PARAMS, 'no_pax_arrival': True}, is_logging=False, summary_only=True,
+                               engine='fast'), repeat)
+    cases['metrics_post_processing'] = benchmark_metrics
+    cases['mini_sweep'] = benchmark_sweep
+    cases['mini_sweep_configurations'] = partial(benchmark_sweep, task_type='configuration')
+    return cases
+
+
+def run_benchmarks(names=None, repeat=3):
+    results = {}
+    for name, benchmark in benchmarks().items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        results[name] = benchmark(repeat)
+        print(f'  {name:<28} {results[name]:9.4f} s')
+    return results
+
+
+def environment():
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'numpy': np.__version__,
+            'simpy': simpy.__version__, 'date': datetime.now().isoformat(timespec='seconds')}
+
+
+def save_baseline(path, results, repeat):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'repeat': repeat, 'results': results}, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline_results, threshold):
+    """
+    Prints the relative change of every benchmark against the baseline and returns the names
+    of the ones that got slower by more than threshold.
+    """
+    regressions = []
+    for name, seconds in results.items():
+        if name not in baseline_results:
+            print(f'  {name:<28} (not in baseline)')
+            continue
+        change = seconds / baseline_results[name] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'  {name:<28} {baseline_results[name]:9.4f} s -> {seconds:9.4f} s  {change:+7.1%}{flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks of the simulator and the sweep pipeline.')
+    parser.add_argument('--save', metavar='PATH', help='save the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown, as a fraction of the baseline time, flagged as a regression')
+    parser.add_argument('--repeat', type=int, default=3, help='repeats per benchmark, the best is kept')
+    parser.add_argument('--only', nargs='*', metavar='NAME', help='run the benchmarks whose names contain NAME')
+    args = parser.parse_args()
+
+    print('Benchmarks (best of %d):' % args.repeat)
+    results = run_benchmarks(args.only, repeat=args.repeat)
+    if args.save:
+        save_baseline(args.save, results, args.repeat)
+        print(f'Saved baseline to {args.save}')
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        print(f"Against {args.compare} ({baseline['environment']['date']}):")
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions above {args.threshold:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+        print(f'No regressions above {args.threshold:.0%}.')
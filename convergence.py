@@ -0,0 +1,94 @@
+import numpy as np
+from typing import Dict, List
+from replications import confidence_interval
+
+
+def mser_truncation(observations: np.ndarray, max_fraction: float = 0.5) -> int:
+    """
+    MSER warm-up detector. Returns the number d of leading observations to delete that
+    minimizes the MSER statistic, the sum of squared deviations of the remaining n - d
+    observations divided by (n - d)^2, searching d up to max_fraction of the observations.
+    """
+    observations = np.asarray(observations, dtype=np.float64)
+    num_observations = len(observations)
+    if num_observations < 2:
+        return 0
+    # Sums over the suffix that starts at every d
+    suffix_sum = np.cumsum(observations[::-1])[::-1]
+    suffix_sum_squares = np.cumsum(observations[::-1] ** 2)[::-1]
+    remaining = np.arange(num_observations, 0, -1)
+    squared_deviations = suffix_sum_squares - suffix_sum ** 2 / remaining
+    statistic = squared_deviations / remaining ** 2
+    max_deleted = int(num_observations * max_fraction)
+    return int(np.argmin(statistic[:max_deleted + 1]))
+
+
+class ConvergenceMonitor:
+    """
+    Watches the time averages of a set of traces with the method of batch means.
+
+    observe closes a batch of batch_duration hours and records the time average of every
+    trace over it. The warm-up is detected with MSER on the batch means of each trace, and
+    the estimates have converged when, after deleting the warm-up batches, at least
+    min_batches remain and the confidence interval half-width of every trace's mean is
+    within relative_tolerance of the mean, or absolute_tolerance for means close to zero.
+    """
+    def __init__(self, trackers: Dict, batch_duration: float = 1.0, relative_tolerance: float = 0.05,
+                 absolute_tolerance: float = 0.01, min_batches: int = 20, confidence: float = 0.95):
+        self.trackers = trackers
+        self.batch_duration = batch_duration
+        self.relative_tolerance = relative_tolerance
+        self.absolute_tolerance = absolute_tolerance
+        self.min_batches = min_batches
+        self.confidence = confidence
+        self.batch_means: Dict[str, List[float]] = {name: [] for name in trackers}
+        self._integrals = {name: 0.0 for name in trackers}
+        self._batch_start = 0.0
+
+    def observe(self, time: float):
+        """
+        Closes the batch that ends at the given time.
+        """
+        duration = time - self._batch_start
+        if duration <= 0:
+            return
+        for name, tracker in self.trackers.items():
+            integral = tracker.integral(time)
+            self.batch_means[name].append((integral - self._integrals[name]) / duration)
+            self._integrals[name] = integral
+        self._batch_start = time
+
+    @property
+    def num_batches(self) -> int:
+        return len(next(iter(self.batch_means.values()), []))
+
+    def warmup_batches(self) -> int:
+        """
+        Number of batches in the warm-up period, the largest MSER truncation over the traces.
+        """
+        return max((mser_truncation(means) for means in self.batch_means.values()), default=0)
+
+    @property
+    def detected_warmup(self) -> float:
+        """
+        End of the detected warm-up period, in hours.
+        """
+        return self.warmup_batches() * self.batch_duration
+
+    def estimates(self) -> Dict:
+        """
+        Mean and confidence interval half-width of every trace after the detected warm-up.
+        """
+        warmup_batches = self.warmup_batches()
+        return {name: confidence_interval(means[warmup_batches:], self.confidence)
+                for name, means in self.batch_means.items()}
+
+    def has_converged(self) -> bool:
+        warmup_batches = self.warmup_batches()
+        for means in self.batch_means.values():
+            if len(means) - warmup_batches < self.min_batches:
+                return False
+            mean, half_width = confidence_interval(means[warmup_batches:], self.confidence)
+            if half_width > max(self.relative_tolerance * abs(mean), self.absolute_tolerance):
+                return False
+        return True
@@ -0,0 +1,195 @@
+import inspect
+import numpy as np
+from typing import Callable, Dict, Union
+from random_streams import BufferedSampler, constant_sampler
+
+
+class Distribution:
+    """
+    Base class of the service and interarrival time distributions. sample draws an array of
+    variates with one vectorized call, so that a BufferedSampler can hand them out cheaply.
+    """
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def sampler(self, rng: np.random.Generator, block_size: int = 4096) -> Callable[[], float]:
+        """
+        Returns a callable that draws one variate per call from the given stream.
+        """
+        return BufferedSampler(lambda size: self.sample(rng, size), block_size)
+
+    @property
+    def mean(self) -> float:
+        raise NotImplementedError
+
+
+class Exponential(Distribution):
+    def __init__(self, mean: float):
+        self._mean = mean
+
+    def sample(self, rng, size):
+        return rng.exponential(self._mean, size)
+
+    @property
+    def mean(self):
+        return self._mean
+
+    def __repr__(self):
+        return f"Exponential(mean={self._mean})"
+
+
+class Deterministic(Distribution):
+    def __init__(self, mean: float):
+        self._mean = mean
+
+    def sample(self, rng, size):
+        return np.full(size, self._mean, dtype=np.float64)
+
+    def sampler(self, rng, block_size=4096):
+        # No random draws at all
+        return constant_sampler(self._mean)
+
+    @property
+    def mean(self):
+        return self._mean
+
+    def __repr__(self):
+        return f"Deterministic(mean={self._mean})"
+
+
+class Erlang(Distribution):
+    """
+    Sum of k exponential phases with the given overall mean. The coefficient of variation is 1/sqrt(k).
+    """
+    def __init__(self, mean: float, k: int = 2):
+        if k < 1:
+            raise ValueError('Erlang shape k must be at least 1.')
+        self._mean = mean
+        self.k = k
+
+    def sample(self, rng, size):
+        return rng.gamma(self.k, self._mean / self.k, size)
+
+    @property
+    def mean(self):
+        return self._mean
+
+    def __repr__(self):
+        return f"Erlang(mean={self._mean}, k={self.k})"
+
+
+class LogNormal(Distribution):
+    """
+    Lognormal distribution with the given mean, where sigma is the standard deviation of the
+    underlying normal distribution.
+    """
+    def __init__(self, mean: float, sigma: float = 0.5):
+        self._mean = mean
+        self.sigma = sigma
+        self.mu = np.log(mean) - sigma ** 2 / 2
+
+    def sample(self, rng, size):
+        return rng.lognormal(self.mu, self.sigma, size)
+
+    @property
+    def mean(self):
+        return self._mean
+
+    def __repr__(self):
+        return f"LogNormal(mean={self._mean}, sigma={self.sigma})"
+
+
+class Empirical(Distribution):
+    """
+    Distribution given by a histogram. A bin is picked with a precomputed alias table (Vose's
+    method) in constant time per variate, and the variate is uniform within the bin, so
+    sampling costs the same whatever the number of bins.
+    """
+    def __init__(self, bin_edges, counts):
+        bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        counts = np.asarray(counts, dtype=np.float64)
+        if len(bin_edges) != len(counts) + 1:
+            raise ValueError('Empirical distribution needs one more bin edge than counts.')
+        if np.any(counts < 0) or counts.sum() <= 0:
+            raise ValueError('Empirical distribution counts must be non-negative and not all zero.')
+        self.bin_edges = bin_edges
+        self.bin_widths = np.diff(bin_edges)
+        self.probabilities = counts / counts.sum()
+        self.alias_probability, self.alias = self._build_alias_table(self.probabilities)
+
+    @classmethod
+    def from_samples(cls, samples, bins='auto') -> 'Empirical':
+        """
+        Builds the distribution from observed values, e.g. measured charge times.
+        """
+        counts, bin_edges = np.histogram(np.asarray(samples, dtype=np.float64), bins=bins)
+        return cls(bin_edges, counts)
+
+    @staticmethod
+    def _build_alias_table(probabilities):
+        num_bins = len(probabilities)
+        scaled = probabilities * num_bins
+        alias_probability = np.ones(num_bins)
+        alias = np.arange(num_bins)
+        small = [i for i in range(num_bins) if scaled[i] < 1]
+        large = [i for i in range(num_bins) if scaled[i] >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            alias_probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        # Leftovers are 1 up to rounding
+        return alias_probability, alias
+
+    def sample(self, rng, size):
+        # Each variate takes two consecutive uniforms, so a block of variates is the same as
+        # that many single draws
+        uniforms = rng.random((size, 2))
+        scaled = uniforms[:, 0] * len(self.probabilities)
+        bins = scaled.astype(np.intp)
+        # The fractional part is itself uniform and decides between the bin and its alias
+        bins = np.where(scaled - bins < self.alias_probability[bins], bins, self.alias[bins])
+        return self.bin_edges[bins] + self.bin_widths[bins] * uniforms[:, 1]
+
+    @property
+    def mean(self):
+        centers = self.bin_edges[:-1] + self.bin_widths / 2
+        return float(np.dot(self.probabilities, centers))
+
+    def __repr__(self):
+        return f"Empirical(bins={len(self.probabilities)}, mean={self.mean:.4g})"
+
+
+DISTRIBUTIONS = {
+    'exponential': Exponential,
+    'deterministic': Deterministic,
+    'erlang': Erlang,
+    'lognormal': LogNormal,
+    'empirical': Empirical,
+}
+
+
+def make_distribution(spec: Union[str, Dict, Distribution], mean: float = None) -> Distribution:
+    """
+    Creates a distribution from a registry name ('exponential', 'erlang', ...), a dict with a
+    'name' and the constructor arguments (e.g. {'name': 'erlang', 'k': 3}), or returns a
+    Distribution instance as is. mean is used when the spec does not set one.
+    """
+    if isinstance(spec, Distribution):
+        return spec
+    if isinstance(spec, str):
+        spec = {'name': spec}
+    kwargs = dict(spec)
+    name = kwargs.pop('name')
+    if name not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution '{name}'. Choose from {list(DISTRIBUTIONS)}.")
+    cls = DISTRIBUTIONS[name]
+    if 'mean' in inspect.signature(cls).parameters and 'mean' not in kwargs:
+        if mean is None:
+            raise ValueError(f"Distribution '{name}' needs a mean.")
+        kwargs['mean'] = mean
+    return cls(**kwargs)
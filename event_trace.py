@@ -0,0 +1,140 @@
+import numpy as np
+from typing import Dict, Tuple
+
+# Event codes
+AIRCRAFT_ARRIVAL = 0
+AIRCRAFT_REJECTED = 1
+TERMINAL_ENTER = 2
+LANDING_START = 3
+LANDING_END = 4
+CHARGE_START = 5
+CHARGE_END = 6
+PUSHBACK = 7
+DEPARTURE = 8
+PASSENGER_ARRIVAL = 9
+BOARDING = 10
+EVENT_NAMES = ('aircraft_arrival', 'aircraft_rejected', 'terminal_enter', 'landing_start', 'landing_end',
+               'charge_start', 'charge_end', 'pushback', 'departure', 'passenger_arrival', 'boarding')
+
+# Agent types
+AIRCRAFT = 0
+PASSENGER = 1
+
+# Queue lengths snapshotted with every event, as they are right after it
+SNAPSHOT_FIELDS = ('aircraft_arrival_queue', 'park_queue_length', 'surface_aircraft_count',
+                   'aircraft_departure_queue', 'passenger_service_queue')
+
+# One fixed-width little-endian record per event
+EVENT_DTYPE = np.dtype([('time', '<f8'),
+                        ('event', 'u1'),
+                        ('agent_type', 'u1'),
+                        ('agent_id', '<i4')] +
+                       [(name, '<i4') for name in SNAPSHOT_FIELDS])
+
+
+class EventTraceWriter:
+    """
+    Appends events to a binary file of EVENT_DTYPE records. Records are collected in a
+    preallocated buffer and written buffer_size at a time, so the cost per event is one
+    structured array assignment.
+    """
+    def __init__(self, path: str, buffer_size: int = 65536):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.buffer = np.zeros(buffer_size, dtype=EVENT_DTYPE)
+        self.num_buffered = 0
+        self.num_records = 0
+
+    def record(self, time: float, event: int, agent_type: int, agent_id: int, *snapshot: int):
+        """
+        Records an event with the queue lengths of SNAPSHOT_FIELDS, in that order.
+        """
+        self.buffer[self.num_buffered] = (time, event, agent_type, agent_id, *snapshot)
+        self.num_buffered += 1
+        if self.num_buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.num_buffered == 0:
+            return
+        self.buffer[:self.num_buffered].tofile(self.file)
+        self.file.flush()
+        self.num_records += self.num_buffered
+        self.num_buffered = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class EventTrace:
+    """
+    Memory-mapped reader of an event trace file. Queue-length traces and per-agent timelines
+    are reconstructed from the records without running the simulation again.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            self.records = np.memmap(path, dtype=EVENT_DTYPE, mode='r')
+        except ValueError:
+            # An empty file cannot be mapped
+            self.records = np.zeros(0, dtype=EVENT_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    def events(self, event: int) -> np.ndarray:
+        """
+        The records of one event type.
+        """
+        return self.records[self.records['event'] == event]
+
+    def queue_length(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Times and values of a queue-length trace, keeping the events that changed it. The
+        result can be passed to metrics.time_weighted_mean_variance.
+        """
+        if name not in SNAPSHOT_FIELDS:
+            raise ValueError(f"Unknown queue '{name}'. Choose from {list(SNAPSHOT_FIELDS)}.")
+        values = np.asarray(self.records[name])
+        times = np.asarray(self.records['time'])
+        if name != 'passenger_service_queue':
+            # The simulation starts these traces with a zero record at time 0
+            times = np.concatenate([[0.0], times])
+            values = np.concatenate([[0], values])
+        else:
+            # The simulation records this trace from its first change, so the snapshots taken
+            # before it are left out
+            first_change = np.flatnonzero(values != 0)
+            start = first_change[0] if len(first_change) else len(values)
+            times, values = times[start:], values[start:]
+        changed = np.ones(len(values), dtype=bool)
+        changed[1:] = values[1:] != values[:-1]
+        return times[changed], values[changed]
+
+    def event_times(self, event: int, agent_type: int = AIRCRAFT) -> np.ndarray:
+        """
+        Time of an event for every agent of the type, indexed by agent id, with NaN for the
+        agents the event did not happen to.
+        """
+        records = self.records[(self.records['event'] == event) & (self.records['agent_type'] == agent_type)]
+        is_agent = self.records['agent_type'] == agent_type
+        num_agents = int(self.records['agent_id'][is_agent].max()) + 1 if is_agent.any() else 0
+        times = np.full(num_agents, np.nan)
+        times[records['agent_id']] = records['time']
+        return times
+
+    def timeline(self, agent_id: int, agent_type: int = AIRCRAFT) -> Dict[str, float]:
+        """
+        Event name -> time of every event of one agent.
+        """
+        records = self.records[(self.records['agent_id'] == agent_id) & (self.records['agent_type'] == agent_type)]
+        return {EVENT_NAMES[event]: float(time) for event, time in zip(records['event'], records['time'])}
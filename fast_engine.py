@@ -0,0 +1,305 @@
+import heapq
+import numpy as np
+from collections import defaultdict
+from distributions import make_distribution
+from lindley import fifo_multi_server_service_times, lindley_service_times
+from random_streams import make_random_streams
+from time_series import TimeSeries, SummaryTimeSeries, record_changes
+
+# Event codes
+AIRCRAFT_ARRIVAL = 0
+LANDING_END = 1
+CHARGE_END = 2
+DEPARTURE_END = 3
+
+
+class SimulationClock:
+    """
+    Stands in for the SimPy environment, so SystemMetrics can read the end time as env.now.
+    """
+    __slots__ = ('now',)
+
+    def __init__(self):
+        self.now = 0
+
+
+class TandemQueueSimulation:
+    """
+    Event-driven engine for the no-passenger configuration of VertiportSimulation, without SimPy.
+
+    Without passengers the vertiport is a tandem queue: terminal buffer -> TLOF -> park/charge
+    -> TLOF departure, where with blocking an aircraft reserves a park before it leaves the
+    terminal buffer. Aircraft are exchangeable and every service time is drawn when service
+    starts, so queues and servers are integer counters, and the only pending events are the
+    next arrival and the landings, charges and departures in progress, kept in a heapq event
+    list. Times come from the same random streams and samplers as VertiportSimulation.
+
+    Without tlof_feedback, blocking or a finite terminal buffer the stages do not interact:
+    both TLOFs are FIFO single servers and the parks a FIFO multi-server queue, fed in turn.
+    Run then skips event scheduling and computes every stage over whole arrays with Lindley's
+    recursion (see lindley.py), unless use_recursions is False. Landing and take-off times
+    still come from the TLOF stream, but in a different order than in the event-driven runs.
+
+    The queue-length, surface and counter traces SystemMetrics reads are recorded like in
+    VertiportSimulation. Per-aircraft timing records are not kept.
+    """
+    def __init__(self,
+                 num_aircraft,
+                 aircraft_mean_interarrival_time,
+                 num_park,
+                 tlof_mean_service_time,
+                 charge_mean_service_time,
+                 seat_capacity,
+                 stochastic,
+                 terminal_buffer_capacity,
+                 tlof_feedback=True,
+                 blocking=False,
+                 seed=0,
+                 summary_only=False,
+                 warmup_period=5,
+                 aircraft_interarrival_distribution=None,
+                 tlof_distribution=None,
+                 charge_distribution=None,
+                 use_recursions=True):
+        self.num_aircraft = num_aircraft
+        self.num_park = num_park
+        self.seat_capacity = seat_capacity
+        self.terminal_buffer_capacity = terminal_buffer_capacity
+        self.tlof_feedback = tlof_feedback
+        self.blocking = blocking
+        self.seed = seed
+        self.summary_only = summary_only
+        self.warmup_period = warmup_period
+        self.use_recursions = use_recursions
+        self.env = SimulationClock()
+
+        self.random_streams = make_random_streams(seed)
+        default_distribution = 'exponential' if stochastic else 'deterministic'
+        self.aircraft_interarrival_distribution = make_distribution(aircraft_interarrival_distribution or default_distribution, aircraft_mean_interarrival_time)
+        self.tlof_distribution = make_distribution(tlof_distribution or default_distribution, tlof_mean_service_time)
+        self.charge_distribution = make_distribution(charge_distribution or default_distribution, charge_mean_service_time)
+        self.aircraft_interarrival_sampler = self.aircraft_interarrival_distribution.sampler(self.random_streams['arrivals'])
+        self.tlof_sampler = self.tlof_distribution.sampler(self.random_streams['tlof'])
+        self.charge_sampler = self.charge_distribution.sampler(self.random_streams['charging'])
+
+        # Statistics, with the same layout as in VertiportSimulation
+        if summary_only:
+            series = lambda: SummaryTimeSeries(warmup_period)
+        else:
+            series = TimeSeries
+        self.arrival_departure_counter = defaultdict(lambda: defaultdict(series))
+        self.queue_lengths = defaultdict(series)
+        self.surface_aircraft_count = series()
+        self.rejected_aircraft_counter = 0
+        self.arrival_departure_counter['aircraft']['arrival_counter'].record(0, 0)
+        self.arrival_departure_counter['aircraft']['departure_counter'].record(0, 0)
+        self.queue_lengths['aircraft_arrival_queue'].record(0, 0)
+        self.queue_lengths['park_queue_length'].record(0, 0)
+        self.surface_aircraft_count.record(0, 0)
+
+    @property
+    def stages_are_independent(self) -> bool:
+        return not self.tlof_feedback and not self.blocking and self.terminal_buffer_capacity == np.inf
+
+    def run(self):
+        """
+        Runs until the arrival process runs out of aircraft, like the termination_event of
+        VertiportSimulation.
+        """
+        if self.use_recursions and self.stages_are_independent:
+            return self._run_recursions()
+        # Local names keep attribute lookups out of the event loop
+        heappush, heappop = heapq.heappush, heapq.heappop
+        interarrival, tlof_time, charge_time = self.aircraft_interarrival_sampler, self.tlof_sampler, self.charge_sampler
+        # The traces are recorded from counters kept here, through their bound record methods
+        record_arrival_queue = self.queue_lengths['aircraft_arrival_queue'].record
+        record_park_queue = self.queue_lengths['park_queue_length'].record
+        record_passenger_service_queue = self.queue_lengths['passenger_service_queue'].record
+        record_surface_count = self.surface_aircraft_count.record
+        record_arrivals = self.arrival_departure_counter['aircraft']['arrival_counter'].record
+        record_departures = self.arrival_departure_counter['aircraft']['departure_counter'].record
+        finite_buffer = self.terminal_buffer_capacity != np.inf
+        shared_tlof = self.tlof_feedback
+        blocking = self.blocking
+        num_park = self.num_park
+        seat_capacity = self.seat_capacity
+
+        # State counters
+        terminal_free = self.terminal_buffer_capacity if finite_buffer else 0
+        surface_free = num_park             # Park reservations (blocking only)
+        surface_waiting = 0                 # Aircraft in the terminal buffer waiting for a reservation
+        landing_waiting = 0                 # Aircraft waiting for the arrival TLOF
+        departure_waiting = 0               # Charged aircraft waiting for the departure TLOF
+        arrival_tlof_busy = False
+        departure_tlof_busy = False         # Same server as arrival_tlof_busy with tlof_feedback
+        parks_busy = 0
+        park_waiting = 0
+        passenger_service_queue_length = 0
+        arrival_queue_length = 0
+        park_queue_length = 0
+        surface_count = 0
+        num_arrivals = 0
+        num_departures = 0
+        remaining_arrivals = self.num_aircraft
+
+        events = []
+        sequence = 0
+        heappush(events, (interarrival(), sequence, AIRCRAFT_ARRIVAL))
+
+        while events:
+            now, _, event = heappop(events)
+
+            if event == AIRCRAFT_ARRIVAL:
+                if remaining_arrivals == 0:
+                    break
+                remaining_arrivals -= 1
+                sequence += 1
+                heappush(events, (now + interarrival(), sequence, AIRCRAFT_ARRIVAL))
+                if finite_buffer:
+                    if terminal_free == 0:
+                        self.rejected_aircraft_counter += 1
+                        continue
+                    terminal_free -= 1
+                num_arrivals += 1
+                record_arrivals(now, num_arrivals)
+                arrival_queue_length += 1
+                record_arrival_queue(now, arrival_queue_length)
+                if blocking:
+                    if surface_free == 0:
+                        surface_waiting += 1
+                        continue
+                    surface_free -= 1
+                request_landing = True
+
+            elif event == LANDING_END:
+                # Release the TLOF to the next aircraft in line
+                if landing_waiting:
+                    landing_waiting -= 1
+                    arrival_queue_length -= 1
+                    record_arrival_queue(now, arrival_queue_length)
+                    if finite_buffer:
+                        terminal_free += 1
+                    sequence += 1
+                    heappush(events, (now + tlof_time(), sequence, LANDING_END))
+                elif shared_tlof and departure_waiting:
+                    departure_waiting -= 1
+                    passenger_service_queue_length -= seat_capacity
+                    record_passenger_service_queue(now, passenger_service_queue_length)
+                    sequence += 1
+                    heappush(events, (now + tlof_time(), sequence, DEPARTURE_END))
+                else:
+                    arrival_tlof_busy = False
+                surface_count += 1
+                record_surface_count(now, surface_count)
+                park_queue_length += 1
+                record_park_queue(now, park_queue_length)
+                if parks_busy < num_park:
+                    parks_busy += 1
+                    park_queue_length -= 1
+                    record_park_queue(now, park_queue_length)
+                    sequence += 1
+                    heappush(events, (now + charge_time(), sequence, CHARGE_END))
+                else:
+                    park_waiting += 1
+                continue
+
+            elif event == CHARGE_END:
+                if park_waiting:
+                    park_waiting -= 1
+                    park_queue_length -= 1
+                    record_park_queue(now, park_queue_length)
+                    sequence += 1
+                    heappush(events, (now + charge_time(), sequence, CHARGE_END))
+                else:
+                    parks_busy -= 1
+                tlof_busy = arrival_tlof_busy if shared_tlof else departure_tlof_busy
+                if tlof_busy:
+                    departure_waiting += 1
+                else:
+                    if shared_tlof:
+                        arrival_tlof_busy = True
+                    else:
+                        departure_tlof_busy = True
+                    passenger_service_queue_length -= seat_capacity
+                    record_passenger_service_queue(now, passenger_service_queue_length)
+                    sequence += 1
+                    heappush(events, (now + tlof_time(), sequence, DEPARTURE_END))
+                continue
+
+            else:
+                # DEPARTURE_END: release the TLOF, landings first if it is shared
+                if shared_tlof and landing_waiting:
+                    landing_waiting -= 1
+                    arrival_queue_length -= 1
+                    record_arrival_queue(now, arrival_queue_length)
+                    if finite_buffer:
+                        terminal_free += 1
+                    sequence += 1
+                    heappush(events, (now + tlof_time(), sequence, LANDING_END))
+                elif departure_waiting:
+                    departure_waiting -= 1
+                    passenger_service_queue_length -= seat_capacity
+                    record_passenger_service_queue(now, passenger_service_queue_length)
+                    sequence += 1
+                    heappush(events, (now + tlof_time(), sequence, DEPARTURE_END))
+                elif shared_tlof:
+                    arrival_tlof_busy = False
+                else:
+                    departure_tlof_busy = False
+                num_departures += 1
+                record_departures(now, num_departures)
+                # The departing aircraft frees its park reservation
+                if not blocking:
+                    continue
+                if surface_waiting:
+                    surface_waiting -= 1
+                    request_landing = True
+                else:
+                    surface_free += 1
+                    continue
+
+            # An aircraft in the terminal buffer is cleared to request the arrival TLOF
+            if request_landing:
+                if arrival_tlof_busy:
+                    landing_waiting += 1
+                else:
+                    arrival_tlof_busy = True
+                    arrival_queue_length -= 1
+                    record_arrival_queue(now, arrival_queue_length)
+                    if finite_buffer:
+                        terminal_free += 1
+                    sequence += 1
+                    heappush(events, (now + tlof_time(), sequence, LANDING_END))
+
+        self.env.now = now
+        return self
+
+    def _run_recursions(self):
+        """
+        Computes the run stage by stage with no event scheduling.
+        """
+        num_aircraft = self.num_aircraft
+        # The run ends at the arrival that finds no aircraft left
+        arrival_times = np.cumsum(self.aircraft_interarrival_distribution.sample(self.random_streams['arrivals'], num_aircraft + 1))
+        end_time = arrival_times[-1]
+        arrival_times = arrival_times[:-1]
+
+        landing_start, landing_end = lindley_service_times(arrival_times, self.tlof_distribution.sample(self.random_streams['tlof'], num_aircraft))
+        charge_start, charge_end = fifo_multi_server_service_times(landing_end,
+                                                                   self.charge_distribution.sample(self.random_streams['charging'], num_aircraft),
+                                                                   self.num_park)
+        # Aircraft line up for the departure TLOF in the order they finish charging
+        departure_start, departure_end = lindley_service_times(np.sort(charge_end),
+                                                               self.tlof_distribution.sample(self.random_streams['tlof'], num_aircraft))
+
+        def before_end(times):
+            return times[times < end_time]
+
+        record_changes(self.arrival_departure_counter['aircraft']['arrival_counter'], [(arrival_times, 1)])
+        record_changes(self.queue_lengths['aircraft_arrival_queue'], [(arrival_times, 1), (before_end(landing_start), -1)])
+        record_changes(self.surface_aircraft_count, [(before_end(landing_end), 1)])
+        record_changes(self.queue_lengths['park_queue_length'], [(before_end(landing_end), 1), (before_end(charge_start), -1)])
+        record_changes(self.queue_lengths['passenger_service_queue'], [(before_end(departure_start), -self.seat_capacity)])
+        record_changes(self.arrival_departure_counter['aircraft']['departure_counter'], [(before_end(departure_end), 1)])
+        self.env.now = end_time
+        return self
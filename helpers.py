@@ -4,6 +4,7 @@ from matplotlib.ticker import MaxNLocator
 import time
 from datetime import datetime, timedelta
 import psycopg2
+from result_sinks import PostgresResultSink, build_result_row
 
 def plot_output_curve(data: dict, agents: list):
     # Determine the number of agents to set the number of subplots
@@ -115,71 +116,13 @@ def save_simulation_results_postgres(db_name, parameters, system_metrics):
     # CREATE DATABASE vertiport_sim;
     # CREATE USER emin WITH ENCRYPTED PASSWORD 'emin';
     # GRANT ALL PRIVILEGES ON DATABASE vertiport_sim TO emin;
-    
-    # PostgreSQL connection string
-    user, password, host, port = 'emin', 'emin', 'localhost', '5432'
-    conn_str = f"dbname='{db_name}' user='{user}' password='{password}' host='{host}' port='{port}'"
-    
-    try:
-        # Connect to your postgres DB
-        conn = psycopg2.connect(conn_str)
-        cur = conn.cursor()
-        
-        # Create table if it doesn't exist (adjust the data types as necessary)
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS simulation_metrics (
-                id SERIAL PRIMARY KEY, 
-                tlof_feedback BOOLEAN,
-                seed INTEGER, 
-                num_park INTEGER, 
-                aircraft_arrival_rate INTEGER, 
-                passenger_arrival_rate INTEGER, 
-                tlof_time REAL,
-                charge_time REAL,
-                terminal_buffer_capacity REAL, 
-                blocking BOOLEAN, 
-                num_rejected_aircraft INTEGER,
-                aircraft_throughput_rate REAL, 
-                terminal_queue_length REAL, 
-                avg_num_aircraft_at_surface REAL, 
-                passenger_queue_length REAL, 
-                variance_in_terminal_queue_length REAL, 
-                variance_in_pax_queue_length REAL
-            )
-        ''')
-
-        # Insert a row
-        cur.execute('''
-            INSERT INTO simulation_metrics (
-                tlof_feedback, seed, num_park, aircraft_arrival_rate, passenger_arrival_rate, tlof_time, charge_time, terminal_buffer_capacity, blocking, num_rejected_aircraft, aircraft_throughput_rate, terminal_queue_length, avg_num_aircraft_at_surface, passenger_queue_length, variance_in_terminal_queue_length, variance_in_pax_queue_length
-            ) VALUES (%s, %s, %s, %s, %s, %s ,%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (
-            parameters['tlof_feedback'],
-            parameters['seed'], 
-            parameters['num_park'], 
-            parameters['aircraft_arrival_rate'], 
-            parameters['passenger_arrival_rate'], 
-            parameters['tlof_time'],
-            parameters['charge_time'], 
-            parameters['terminal_buffer_capacity'], 
-            parameters['blocking'], 
-            system_metrics.get_rejected_num_aircraft(),
-            round(system_metrics.average_aircraft_throughput(),2), 
-            round(system_metrics.average_terminal_queue_length(),2), 
-            round(system_metrics.average_num_aircraft_at_surface(),2), 
-            round(system_metrics.average_passenger_queue_length(),2), 
-            round(system_metrics.variance_in_terminal_queue_length(),2), 
-            round(system_metrics.variance_in_pax_queue_length(),2)))
 
-        # Commit the transaction
-        conn.commit()
-        
+    # Opens a connection for a single row. Sweeps should keep a PostgresResultSink open instead.
+    try:
+        with PostgresResultSink(db_name, batch_size=1) as sink:
+            sink.write(build_result_row(parameters, system_metrics))
     except Exception as e:
         print(f"An error occurred: {e}")
-    finally:
-        if conn:
-            # Close the connection
-            conn.close()
 
 
 def save_metrics_to_sqlite(db_name, num_park, aircraft_arrival_rate, passenger_arrival_rate, charge_time, terminal_buffer_capacity, blocking, seed, sim):
@@ -217,8 +160,3 @@ def save_metrics_to_postgres(db_name, num_park, aircraft_arrival_rate, passenger
         if conn:
             # Close the connection
             conn.close()
-
-
-# Pre-generate IDs based on expected numbers
-def generate_ids(num_agents, prefix):
-    return [f"{prefix}_{i}" for i in range(num_agents)]
\ No newline at end of file
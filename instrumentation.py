@@ -0,0 +1,160 @@
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Optional
+
+from simpy.core import EmptySchedule
+
+
+class Instrumentation:
+    """
+    Opt-in profiling of a simulation run. It works by wrapping the methods, samplers and
+    trackers of one simulation instance (see VertiportSimulation), so that a run without
+    instrumentation executes no extra code at all.
+
+    It records:
+    - process_events: the events each type of process waited on,
+    - update_seconds and update_calls: wall time and calls per update category (tracker
+      updates, random draws, ...),
+    - simpy_events: the SimPy events processed, and the wall time between start and stop.
+    """
+    def __init__(self):
+        self.process_events = defaultdict(int)
+        self.update_seconds = defaultdict(float)
+        self.update_calls = defaultdict(int)
+        self.simpy_events = 0
+        self.wall_time = 0.0
+        self._start = None
+
+    def count_events(self, category: str, generator_function: Callable) -> Callable:
+        """
+        Wraps a SimPy process function so that every event its processes yield is counted
+        under the category.
+        """
+        process_events = self.process_events
+
+        def counted(*args, **kwargs):
+            generator = generator_function(*args, **kwargs)
+            value, error = None, None
+            while True:
+                try:
+                    event = generator.send(value) if error is None else generator.throw(error)
+                except StopIteration as stop:
+                    return stop.value
+                process_events[category] += 1
+                try:
+                    value, error = (yield event), None
+                except BaseException as e:
+                    value, error = None, e
+        return counted
+
+    def count_calls(self, category: str, function: Callable) -> Callable:
+        """
+        Wraps a plain function so that its calls are counted as process events.
+        """
+        process_events = self.process_events
+
+        def counted(*args, **kwargs):
+            process_events[category] += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def timed(self, category: str, function: Callable) -> Callable:
+        """
+        Wraps a function so that its calls and wall time are added to the category.
+        """
+        update_seconds, update_calls = self.update_seconds, self.update_calls
+        perf_counter = time.perf_counter
+
+        def timed_function(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                update_seconds[category] += perf_counter() - start
+                update_calls[category] += 1
+        return timed_function
+
+    def time_tracker(self, category: str, tracker):
+        """
+        Times the record and update calls of a TimeSeries or SummaryTimeSeries. update calls
+        record, so only record is wrapped.
+        """
+        tracker.record = self.timed(category, tracker.record)
+
+    def count_simpy_events(self, env):
+        """
+        Counts the events processed by a SimPy environment.
+        """
+        step = env.step
+
+        def counted_step():
+            self.simpy_events += 1
+            try:
+                step()
+            except EmptySchedule:
+                # A run without an end event ends with a step that finds no event to process
+                self.simpy_events -= 1
+                raise
+        env.step = counted_step
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self):
+        if self._start is not None:
+            self.wall_time += time.perf_counter() - self._start
+            self._start = None
+
+    def report(self) -> Dict:
+        """
+        Returns the collected figures as a plain dict, which can be pickled and merged with
+        merge_reports.
+        """
+        return {
+            'process_events': dict(self.process_events),
+            'update_seconds': dict(self.update_seconds),
+            'update_calls': dict(self.update_calls),
+            'simpy_events': self.simpy_events,
+            'wall_time': self.wall_time,
+            'events_per_second': self.simpy_events / self.wall_time if self.wall_time > 0 else 0.0,
+            'num_runs': 1,
+        }
+
+
+def merge_reports(reports: Iterable[Optional[Dict]]) -> Optional[Dict]:
+    """
+    Sums instrumentation reports over runs. Missing reports (None) are skipped.
+    """
+    merged = None
+    for report in reports:
+        if report is None:
+            continue
+        if merged is None:
+            merged = {'process_events': defaultdict(int), 'update_seconds': defaultdict(float),
+                      'update_calls': defaultdict(int), 'simpy_events': 0, 'wall_time': 0.0, 'num_runs': 0}
+        for field in ('process_events', 'update_seconds', 'update_calls'):
+            for category, value in report[field].items():
+                merged[field][category] += value
+        for field in ('simpy_events', 'wall_time', 'num_runs'):
+            merged[field] += report[field]
+    if merged is None:
+        return None
+    for field in ('process_events', 'update_seconds', 'update_calls'):
+        merged[field] = dict(merged[field])
+    merged['events_per_second'] = merged['simpy_events'] / merged['wall_time'] if merged['wall_time'] > 0 else 0.0
+    return merged
+
+
+def format_report(report: Dict) -> str:
+    """
+    Formats a report for printing, with each update category as a share of the wall time.
+    """
+    wall_time = report['wall_time']
+    lines = [f"{report['num_runs']} runs, {report['simpy_events']} SimPy events in {wall_time:.2f} s "
+             f"({report['events_per_second']:.0f} events/s)"]
+    for category, count in sorted(report['process_events'].items()):
+        lines.append(f"  {category} process events: {count}")
+    for category, seconds in sorted(report['update_seconds'].items()):
+        share = seconds / wall_time if wall_time > 0 else 0.0
+        lines.append(f"  {category}: {seconds:.3f} s in {report['update_calls'][category]} calls ({share:.1%} of wall time)")
+    return '\n'.join(lines)
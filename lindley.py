@@ -0,0 +1,59 @@
+import heapq
+import numpy as np
+from typing import Tuple
+
+
+def lindley_service_times(arrival_times: np.ndarray, service_times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end of service of every customer of a FIFO single server, from sorted arrival
+    times and the service time of each customer. With 2-D arrays every row is a separate
+    queue, e.g. one replication.
+
+    Lindley's recursion end[n] = max(arrival[n], end[n-1]) + service[n] unrolls to
+    end[n] = C[n] + max_{k <= n}(arrival[k] - C[k-1]) with C the cumulative service time,
+    which is evaluated for all customers at once with a running maximum.
+    """
+    arrival_times = np.asarray(arrival_times, dtype=np.float64)
+    service_times = np.asarray(service_times, dtype=np.float64)
+    cumulative_service = np.cumsum(service_times, axis=-1)
+    # Work that arrived before each customer, measured from the start of the busy period
+    previous_cumulative_service = cumulative_service - service_times
+    end_times = cumulative_service + np.maximum.accumulate(arrival_times - previous_cumulative_service, axis=-1)
+    # End minus service time can round to a hair before the arrival, which would take the
+    # customer out of the queue before it joined
+    start_times = np.maximum(end_times - service_times, arrival_times)
+    return start_times, end_times
+
+
+def fifo_multi_server_service_times(arrival_times: np.ndarray, service_times: np.ndarray,
+                                    num_servers: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end of service of every customer of a FIFO queue with num_servers identical
+    servers (Kiefer-Wolfowitz recursion). Each customer takes the server that frees up first.
+    With 2-D arrays every row is a separate queue, and the recursion steps through the
+    customers with whole-column operations.
+    """
+    arrival_times = np.asarray(arrival_times, dtype=np.float64)
+    service_times = np.asarray(service_times, dtype=np.float64)
+    if arrival_times.ndim == 2:
+        return _fifo_multi_server_rows(arrival_times, service_times, num_servers)
+    start_times = np.empty(len(arrival_times))
+    free_times = [0.0] * num_servers
+    for n, (arrival_time, service_time) in enumerate(zip(arrival_times.tolist(), service_times.tolist())):
+        start_time = max(arrival_time, free_times[0])
+        start_times[n] = start_time
+        heapq.heapreplace(free_times, start_time + service_time)
+    return start_times, start_times + service_times
+
+
+def _fifo_multi_server_rows(arrival_times, service_times, num_servers):
+    num_rows, num_customers = arrival_times.shape
+    rows = np.arange(num_rows)
+    start_times = np.empty((num_rows, num_customers))
+    free_times = np.zeros((num_rows, num_servers))
+    for n in range(num_customers):
+        server = free_times.argmin(axis=1)
+        start_time = np.maximum(arrival_times[:, n], free_times[rows, server])
+        start_times[:, n] = start_time
+        free_times[rows, server] = start_time + service_times[:, n]
+    return start_times, start_times + service_times
@@ -1,72 +1,111 @@
 import logging
-
-import logging
+import os
 from datetime import datetime, timedelta
 
+
+class SimTime:
+    """
+    The current simulation time as a date string. Pass it as an argument of a logging call,
+    e.g. logger.debug('%s landed at %s', aircraft_id, logger.sim_time): it is only formatted
+    if the record is emitted, and the string is cached until env.now changes.
+    """
+    __slots__ = ('env', 'start_datetime', '_time', '_string')
+
+    def __init__(self, env, start_datetime):
+        self.env = env
+        self.start_datetime = start_datetime
+        self._time = None
+        self._string = None
+
+    def __str__(self):
+        now = self.env.now
+        if now != self._time:
+            self._time = now
+            self._string = (self.start_datetime + timedelta(hours=now)).strftime('%Y-%m-%d %H:%M:%S')
+        return self._string
+
+
 class SimTimeFormatter(logging.Formatter):
-    def __init__(self, sim_env, start_datetime, fmt='%(sim_time)s - %(levelname)s - %(message)s'):
+    def __init__(self, sim_env, start_datetime, fmt='%(sim_time)s - %(levelname)s - %(message)s', sim_time=None):
         super().__init__(fmt)
         self.sim_env = sim_env
         # Assume start_datetime is a datetime.datetime object representing the start of the simulation
         self.start_datetime = start_datetime
+        # Records made at the same simulation time share the formatted date. A Logger passes
+        # its own SimTime, so its messages and their timestamps share one cache.
+        self.sim_time = sim_time if sim_time is not None else SimTime(sim_env, start_datetime)
 
     def format(self, record):
-        # Convert simulation time (in hours) to a datetime object
-        sim_datetime = self.start_datetime + timedelta(hours=self.sim_env.now)
-        # Format the simulation datetime as %Y%m%d_%H%M%S
-        record.sim_time = sim_datetime.strftime('%Y-%m-%d %H:%M:%S')
+        record.sim_time = str(self.sim_time)
         return super().format(record)
 
 class Logger:
+    """
+    Wrapper around the module logger that timestamps records with the simulation time.
+
+    Messages are formatted lazily, logging-style: pass a format string and its arguments
+    rather than an f-string, and use sim_time for the current simulation time. Calls below
+    the enabled level return before anything is formatted, so a disabled logger costs about
+    one method call per message.
+    """
     def __init__(self, env, simulation_start_datetime, is_logging=True):
         self.env = env
         self.start_datetime = simulation_start_datetime
+        self.sim_time = SimTime(env, simulation_start_datetime)
         self.logger = logging.getLogger(__name__)
+        self.handler = None
         if is_logging:
             self.setup_logger()
-        else:
+        elif not any(isinstance(handler, logging.NullHandler) for handler in self.logger.handlers):
+            # The module logger is shared by every simulation, so add the NullHandler only once
             self.logger.addHandler(logging.NullHandler())
             # self.logger.setLevel(logging.NOTSET)
-    
+
     def setup_logger(self):
-        self.logger.setLevel(logging.INFO)
+        # INFO unless a level was set on the module logger, e.g. DEBUG for per-aircraft messages
+        if self.logger.level == logging.NOTSET:
+            self.logger.setLevel(logging.INFO)
+        os.makedirs('logs', exist_ok=True)
         self.logger_path = f"logs/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log"
-        self.handler = logging.FileHandler(self.logger_path)        
+        self.handler = logging.FileHandler(self.logger_path)
         # Set logger name using the current date time
         # Use the custom formatter with simulation time and start datetime
-        self.formatter = SimTimeFormatter(self.env, self.start_datetime)
+        self.formatter = SimTimeFormatter(self.env, self.start_datetime, sim_time=self.sim_time)
         self.handler.setFormatter(self.formatter)
 
         self.logger.addHandler(self.handler)
 
-    def log(self, message):
-        self.logger.info(message)
-
-    def debug(self, *args, **kwargs):
-        if self.logger is None:
-            raise Exception('Logger not initialized. Call create_logger first.')
-        return self.logger.debug(*args, **kwargs)
-    
-    def info(self, *args, **kwargs):
-        if self.logger is None:
-            raise Exception('Logger not initialized. Call create_logger first.')
-        return self.logger.info(*args, **kwargs)
-    
-    def warning(self, *args, **kwargs):
-        if self.logger is None:
-            raise Exception('Logger not initialized. Call create_logger first.')
-        return self.logger.warning(*args, **kwargs)
-
-    def error(self, *args, **kwargs):
-        if self.logger is None:
-            raise Exception('Logger not initialized. Call create_logger first.')
-        return self.logger.error(*args, **kwargs)
-    
-    def critical(self, *args, **kwargs):
-        if self.logger is None:
-            raise Exception('Logger not initialized. Call create_logger first.')
-        return self.logger.critical(*args, **kwargs)        
+    def is_enabled_for(self, level: int) -> bool:
+        """
+        Whether messages of the given level are emitted. Guard expensive arguments with it.
+        """
+        return self.logger.isEnabledFor(level)
+
+    def log(self, message, *args):
+        self.info(message, *args)
+
+    def debug(self, message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(message, *args, **kwargs)
+
+    def info(self, message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(message, *args, **kwargs)
+
+    def warning(self, message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(message, *args, **kwargs)
+
+    def error(self, message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self.logger.error(message, *args, **kwargs)
+
+    def critical(self, message, *args, **kwargs):
+        if self.logger.isEnabledFor(logging.CRITICAL):
+            self.logger.critical(message, *args, **kwargs)
 
     def close(self):
-        self.logger.removeHandler(self.handler)
-        self.handler.close()
\ No newline at end of file
+        if self.handler is not None:
+            self.logger.removeHandler(self.handler)
+            self.handler.close()
+            self.handler = None
@@ -1,17 +1,28 @@
-from typing import Dict
+import numpy as np
+from typing import Tuple
+from time_series import TimeSeries, SummaryTimeSeries
+
 
 class SystemMetrics:
     """
     Class to compute performance metrics.
     """
-    def __init__(self, sim_object):
+    def __init__(self, sim_object, warmup_period: float = None):
         self.sim = sim_object
+        # Hours at the start of the run excluded from time averages. Defaults to the warm-up
+        # period detected by the simulation's convergence monitor, else the one it was
+        # configured with.
+        if warmup_period is None:
+            warmup_period = getattr(sim_object, 'detected_warmup', None)
+            if warmup_period is None:
+                warmup_period = getattr(sim_object, 'warmup_period', 5)
+        self.warmup_period = warmup_period
 
     def average_aircraft_throughput(self):
         """
         Computes the average hourly aircraft departure rate.
         """
-        return list(self.sim.arrival_departure_counter['aircraft']['departure_counter'].values())[-1] / self.sim.env.now
+        return self.sim.arrival_departure_counter['aircraft']['departure_counter'].last_value / self.sim.env.now
     
     def average_terminal_queue_length(self):
         """
@@ -55,87 +66,101 @@ class SystemMetrics:
         """
         return self.sim.rejected_aircraft_counter
 
+    def stand_group_utilization(self):
+        """
+        Returns the share of time the stands of each stand group were occupied.
+        """
+        stands = getattr(self.sim, 'stands', None)
+        if stands is None:
+            return {}
+        return {name: stands.utilization(group) for name, group in self.sim.topology.group_stands().items()}
+
+    def instrumentation_report(self):
+        """
+        Returns the instrumentation report of an instrumented run, else None.
+        """
+        instrumentation = getattr(self.sim, 'instrumentation', None)
+        return instrumentation.report() if instrumentation is not None else None
     
-    # def calculate_time_average(self, tracker: Dict) -> float:
-    #     # Compute the time difference between each consecutive key and multiply by the value. then sum everything and divide by the total time
-    #     total_weighted = 0
-    #     keys = list(tracker.keys())  # Extracting the keys as a list for direct access
-
-    #     # Calculating total weighted queue more efficiently
-    #     for i in range(len(keys) - 1):
-    #         duration = keys[i+1] - keys[i]  # Duration between current and next timestamp
-    #         queue_length = tracker[keys[i]]  # Current queue length
-    #         total_weighted += queue_length * duration
-
-    #     # The total time calculation remains the same
-    #     total_time_efficient = keys[-1] - keys[0]
-
-    #     # Calculating the average queue length more efficiently
-    #     return total_weighted / total_time_efficient     
-    
+    def calculate_time_average(self, tracker: TimeSeries) -> float:
+        """
+        Computes the time-weighted average of a trace after the warm-up period.
+        """
+        return self.calculate_time_weighted_statistics(tracker)[0]
 
-    def calculate_time_average(self, tracker: Dict) -> float:
-        keys = list(tracker.keys())  # Assuming keys are sorted and represent hours
+    def calculate_variance(self, tracker: TimeSeries) -> float:
+        """
+        Computes the time-weighted variance of a trace after the warm-up period.
+        """
+        return self.calculate_time_weighted_statistics(tracker)[1]
 
-        # Find the index for the key immediately after the first two hours
-        start_index = 0
-        for i, key in enumerate(keys):
-            if key - keys[0] > 5:  # Direct comparison in hours
-                start_index = i
-                break
-
-        # Ensure there's at least one interval after excluding the first several hours
-        if start_index == len(keys) - 1:
-            return 0  # Return 0 or suitable value if there's no data to compute average
-
-        # Adjust calculation to start from the key after the first two hours
-        total_weighted = 0
-        for i in range(start_index, len(keys) - 1):
-            duration = keys[i+1] - keys[i]
-            queue_length = tracker[keys[i]]
-            total_weighted += queue_length * duration
-
-        # Adjust total time calculation to exclude the first two hours
-        total_time_adjusted = keys[-1] - keys[start_index]
-
-        # Return the average queue length excluding the first two hours
-        return total_weighted / total_time_adjusted if total_time_adjusted != 0 else 0    
-
-    # def calculate_variance(self, tracker: Dict) -> float:
-    #     time_average = self.calculate_time_average(tracker)
-    #     total_variance = 0
-    #     keys = list(tracker.keys())
-    #     for i in range(len(keys) - 1):
-    #         duration = keys[i+1] - keys[i]
-    #         queue_length = tracker[keys[i]]
-    #         total_variance += (queue_length - time_average)**2 * duration
-    #     total_time = keys[-1] - keys[0]
-    #     return total_variance / total_time
-    
-    def calculate_variance(self, tracker: Dict) -> float:
-        # First, ensure the average excludes the first two hours
-        time_average = self.calculate_time_average(tracker)
-        
-        keys = list(tracker.keys())
-        
-        # Find the start index after the first two hours
+    def calculate_time_weighted_statistics(self, tracker: TimeSeries) -> Tuple[float, float]:
+        """
+        Computes the time-weighted average and variance of a trace after the warm-up period.
+        """
+        if isinstance(tracker, SummaryTimeSeries):
+            # Summary-only runs accumulated the statistics while the simulation ran
+            return tracker.mean_variance(self.warmup_period)
+        return time_weighted_mean_variance(tracker.keys(), tracker.values(), self.warmup_period)
+
+
+def time_weighted_mean_variance(times: np.ndarray, values: np.ndarray, warmup_period: float = 5) -> Tuple[float, float]:
+    """
+    Computes the time-weighted mean and variance of a piecewise-constant trace,
+    excluding the records in the first warmup_period hours.
+
+    times must be sorted (ties allowed) and values[i] holds from times[i] to times[i+1].
+    If no record falls after the warm-up period the whole trace is used.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(times) == 0:
+        return 0, 0
+
+    # First record strictly after the warm-up period
+    start_index = np.searchsorted(times, times[0] + warmup_period, side='right')
+    if start_index == len(times):
         start_index = 0
-        for i, key in enumerate(keys):
-            if key - keys[0] > 5:  # Using hours directly for comparison
-                start_index = i
-                break
-        
-        # Check to ensure there's data to compute after the first two hours
-        if start_index == len(keys) - 1:
-            return 0  # Return 0 or suitable value if there's no data to compute variance
-        
-        total_variance = 0
-        for i in range(start_index, len(keys) - 1):
-            duration = keys[i+1] - keys[i]
-            queue_length = tracker[keys[i]]
-            total_variance += (queue_length - time_average)**2 * duration
-        
-        # Adjust total time calculation to exclude the first two hours
-        total_time_adjusted = keys[-1] - keys[start_index]
-        
-        return total_variance / total_time_adjusted if total_time_adjusted != 0 else 0
+
+    # Ensure there's at least one interval after excluding the warm-up period
+    if start_index == len(times) - 1:
+        return 0, 0
+
+    durations = np.diff(times[start_index:])
+    total_time = times[-1] - times[start_index]
+    if total_time == 0:
+        return 0, 0
+
+    levels = values[start_index:-1]
+    mean = np.dot(levels, durations) / total_time
+    variance = np.dot((levels - mean) ** 2, durations) / total_time
+    return float(mean), float(variance)
+
+
+def time_weighted_mean_variance_rows(times: np.ndarray, values: np.ndarray,
+                                     warmup_period: float = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row-wise time_weighted_mean_variance of a batch of traces given as 2-D arrays, one trace
+    per row. Shorter traces are padded by repeating the time of their last record, which only
+    adds intervals of zero length; a row of zero times is an empty trace.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    num_rows, num_records = times.shape
+    if num_records < 2:
+        return np.zeros(num_rows), np.zeros(num_rows)
+
+    # First record strictly after the warm-up period, or the first record if there is none
+    start_index = (times <= times[:, :1] + warmup_period).sum(axis=1)
+    start_index[start_index == num_records] = 0
+
+    durations = np.diff(times, axis=1)
+    durations[np.arange(num_records - 1) < start_index[:, None]] = 0
+    total_time = durations.sum(axis=1)
+    # Rows without any interval after the warm-up period get zeros, like a single trace
+    safe_total_time = np.where(total_time > 0, total_time, 1)
+    levels = values[:, :-1]
+    mean = (levels * durations).sum(axis=1) / safe_total_time
+    variance = ((levels - mean[:, None]) ** 2 * durations).sum(axis=1) / safe_total_time
+    has_intervals = total_time > 0
+    return np.where(has_intervals, mean, 0), np.where(has_intervals, variance, 0)
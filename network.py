@@ -0,0 +1,343 @@
+import os
+import time
+from multiprocessing import Pipe, Process
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+import simpy
+
+from metrics import SystemMetrics
+from random_streams import BufferedSampler
+from replications import METRIC_NAMES
+from vertiport_sim import VertiportSimulation
+
+# A hand-off of an aircraft between vertiports: (arrival_time, destination, source, sequence).
+# source and sequence order hand-offs that arrive at the same time, so that results do not
+# depend on how the vertiports are spread over processes.
+Handoff = Tuple[float, int, int, int]
+
+
+def make_network_simulation(env: simpy.Environment, params: Dict, seed) -> VertiportSimulation:
+    """
+    Creates the summary-only simulation of one vertiport of a network from run_simulation
+    style parameters. An aircraft_arrival_rate of 0 means the vertiport only receives
+    aircraft from the network.
+    """
+    aircraft_arrival_rate = params['aircraft_arrival_rate']
+    passenger_arrival_rate = params['passenger_arrival_rate']
+    return VertiportSimulation(env=env,
+                               num_aircraft=params['num_aircraft'],
+                               num_passenger=params['num_passenger'],
+                               aircraft_mean_interarrival_time=1 / aircraft_arrival_rate if aircraft_arrival_rate > 0 else np.inf,
+                               passenger_mean_interarrival_time=1 / passenger_arrival_rate if passenger_arrival_rate > 0 else np.inf,
+                               num_park=params.get('num_park'),
+                               tlof_mean_service_time=params['tlof_time'] / 60,
+                               charge_mean_service_time=params['charge_time'] / 60,
+                               seat_capacity=params['seat_capacity'],
+                               termination_event=env.event(),
+                               stochastic=params['stochastic'],
+                               terminal_buffer_capacity=params['terminal_buffer_capacity'],
+                               tlof_feedback=params['tlof_feedback'],
+                               blocking=params['blocking'],
+                               no_pax_arrival=params['no_pax_arrival'],
+                               seed=seed,
+                               summary_only=True,
+                               warmup_period=params.get('warmup_period', 5),
+                               aircraft_interarrival_distribution=params.get('aircraft_interarrival_distribution'),
+                               tlof_distribution=params.get('tlof_distribution'),
+                               charge_distribution=params.get('charge_distribution'),
+                               passenger_interarrival_distribution=params.get('passenger_interarrival_distribution'),
+                               topology=params.get('topology'),
+                               # Aircraft from other vertiports share the arrival pads
+                               use_recursions=False)
+
+
+class NetworkNode:
+    """
+    One vertiport of a network. Its departures are flown to a destination drawn from its
+    routing row and become hand-offs, which the coordinator delivers to the destination as
+    arrivals flight_time hours later. Handed-over aircraft get ids after the vertiport's own
+    aircraft.
+    """
+    def __init__(self, index: int, params: Dict, seed_sequence: np.random.SeedSequence,
+                 flight_times: Sequence[float], routing: Sequence[float]):
+        self.index = index
+        vertiport_seed, routing_seed = seed_sequence.spawn(2)
+        self.env = simpy.Environment()
+        self.simulation = make_network_simulation(self.env, params, vertiport_seed)
+        self.simulation.departure_handler = self.depart
+        self.flight_times = list(flight_times)
+        routing = np.asarray(routing, dtype=np.float64)
+        destinations = np.flatnonzero(routing > 0)
+        self.destination_sampler = None
+        if len(destinations):
+            rng = np.random.default_rng(routing_seed)
+            probabilities = routing[destinations] / routing[destinations].sum()
+            self.destination_sampler = BufferedSampler(lambda size: rng.choice(destinations, size=size, p=probabilities))
+        self.outbox = []
+        self.next_aircraft_id = self.simulation.num_aircraft
+        self.num_sent = 0
+        self.num_received = 0
+
+        if not params['no_pax_arrival']:
+            self.env.process(self.simulation.passenger_process())
+        if params['aircraft_arrival_rate'] > 0:
+            self.env.process(self.simulation.aircraft_arrival_process())
+        # The initial fleet arrives at time 0, without being received from another vertiport
+        for _ in range(params.get('initial_aircraft', 0)):
+            self.env.timeout(0).callbacks.append(self._admit)
+
+    def depart(self, aircraft_id):
+        if self.destination_sampler is None:
+            # Leaves the network
+            return
+        destination = self.destination_sampler()
+        self.outbox.append((self.env.now + self.flight_times[destination], destination, self.index, self.num_sent))
+        self.num_sent += 1
+
+    def deliver(self, handoffs: List[Handoff]):
+        """
+        Schedules the arrivals of hand-offs, none of which is earlier than the current time.
+        """
+        for arrival_time, _, _, _ in handoffs:
+            arrival = self.env.timeout(arrival_time - self.env.now)
+            arrival.callbacks.append(self._receive)
+
+    def _receive(self, event):
+        self.num_received += 1
+        self._admit(event)
+
+    def _admit(self, event):
+        aircraft_id = self.next_aircraft_id
+        self.next_aircraft_id += 1
+        self.simulation.admit_aircraft(aircraft_id)
+
+    def advance(self, until: float) -> List[Handoff]:
+        """
+        Processes the events before until and returns the hand-offs made meanwhile.
+        """
+        if until > self.env.now:
+            self.env.run(until=until)
+        outbox, self.outbox = self.outbox, []
+        return outbox
+
+    def next_event_time(self) -> float:
+        return self.env.peek()
+
+    def results(self) -> Dict[str, float]:
+        system_metrics = SystemMetrics(self.simulation)
+        results = {name: getattr(system_metrics, name)() for name in METRIC_NAMES}
+        results['aircraft_sent'] = self.num_sent
+        results['aircraft_received'] = self.num_received
+        return results
+
+
+class LocalNodes:
+    """
+    Runs a group of network nodes in this process.
+    """
+    def __init__(self, node_arguments: List[Tuple]):
+        self.nodes = {arguments[0]: NetworkNode(*arguments) for arguments in node_arguments}
+        self._reply = None
+
+    def next_event_times(self) -> Dict[int, float]:
+        return {index: node.next_event_time() for index, node in self.nodes.items()}
+
+    def send_advance(self, until: float, inbox: Dict[int, List[Handoff]]):
+        for index, handoffs in inbox.items():
+            self.nodes[index].deliver(handoffs)
+        outbox = [handoff for node in self.nodes.values() for handoff in node.advance(until)]
+        self._reply = (outbox, self.next_event_times())
+
+    def receive_advance(self) -> Tuple[List[Handoff], Dict[int, float]]:
+        return self._reply
+
+    def finish(self) -> Dict[int, Dict[str, float]]:
+        return {index: node.results() for index, node in self.nodes.items()}
+
+
+def _serve_nodes(connection, node_arguments):
+    nodes = LocalNodes(node_arguments)
+    connection.send(nodes.next_event_times())
+    while True:
+        command, arguments = connection.recv()
+        if command == 'advance':
+            nodes.send_advance(*arguments)
+            connection.send(nodes.receive_advance())
+        else:
+            connection.send(nodes.finish())
+            break
+    connection.close()
+
+
+class ProcessNodes:
+    """
+    Runs a group of network nodes in a worker process, driven through a pipe. send_advance
+    returns at once, so that all workers advance in parallel before their replies are read.
+    """
+    def __init__(self, node_arguments: List[Tuple]):
+        self.connection, worker_connection = Pipe()
+        self.process = Process(target=_serve_nodes, args=(worker_connection, node_arguments), daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self._next_event_times = self.connection.recv()
+
+    def next_event_times(self) -> Dict[int, float]:
+        return self._next_event_times
+
+    def send_advance(self, until: float, inbox: Dict[int, List[Handoff]]):
+        self.connection.send(('advance', (until, inbox)))
+
+    def receive_advance(self) -> Tuple[List[Handoff], Dict[int, float]]:
+        return self.connection.recv()
+
+    def finish(self) -> Dict[int, Dict[str, float]]:
+        self.connection.send(('finish', None))
+        results = self.connection.recv()
+        self.process.join()
+        return results
+
+
+class NetworkResults:
+    """
+    Per-vertiport results of a network run, with the synchronization statistics.
+    """
+    def __init__(self, vertiports: List[Dict[str, float]], duration: float, lookahead: float, num_windows: int,
+                 num_handoffs: int, num_in_flight: int, wall_time: float):
+        self.vertiports = vertiports
+        self.duration = duration
+        self.lookahead = lookahead
+        self.num_windows = num_windows
+        self.num_handoffs = num_handoffs
+        self.num_in_flight = num_in_flight
+        self.wall_time = wall_time
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """
+        Values of one result across the vertiports.
+        """
+        return np.array([results[name] for results in self.vertiports])
+
+    def __len__(self):
+        return len(self.vertiports)
+
+
+class NetworkSimulation:
+    """
+    A network of vertiports whose departures fly to other vertiports of the network.
+
+    vertiports is a list of run_simulation style parameter dicts, one per vertiport, which
+    may also set initial_aircraft (a fleet that arrives at time 0) and an
+    aircraft_arrival_rate of 0 (no arrivals from outside the network). flight_times is a
+    matrix of hours between vertiports, or one time for every route, and routing[i][j] is
+    the probability that a departure from i flies to j (by default the other vertiports
+    with equal probability; a row of zeros sends departures out of the network).
+
+    Each vertiport is a simulation of its own, and the vertiports are spread over
+    num_processes worker processes. They are synchronized conservatively in windows: the
+    shortest flight time of a route in use is the lookahead, so a window of that length
+    starting at the earliest pending event cannot receive a hand-off made in the same
+    window, and every vertiport can simulate it independently. Hand-offs are exchanged
+    between windows. Results do not depend on num_processes.
+    """
+    def __init__(self, vertiports: List[Dict], flight_times: Union[float, Sequence[Sequence[float]]],
+                 routing: Sequence[Sequence[float]] = None, duration: float = 100, seed: int = 0,
+                 num_processes: int = None):
+        num_vertiports = len(vertiports)
+        if num_vertiports < 1:
+            raise ValueError('A network needs at least one vertiport.')
+        self.vertiports = [dict(params) for params in vertiports]
+        self.flight_times = np.broadcast_to(np.asarray(flight_times, dtype=np.float64), (num_vertiports, num_vertiports))
+        if routing is None:
+            routing = np.ones((num_vertiports, num_vertiports)) - np.eye(num_vertiports)
+            if num_vertiports > 1:
+                routing /= num_vertiports - 1
+        self.routing = np.asarray(routing, dtype=np.float64)
+        if self.routing.shape != (num_vertiports, num_vertiports):
+            raise ValueError('routing needs one row and one column per vertiport.')
+        row_sums = self.routing.sum(axis=1)
+        if np.any(self.routing < 0) or not np.all(np.isclose(row_sums, 1) | (row_sums == 0)):
+            raise ValueError('Every row of routing must be probabilities summing to 1, or all zeros.')
+        routes = self.routing > 0
+        self.lookahead = float(self.flight_times[routes].min()) if routes.any() else np.inf
+        if self.lookahead <= 0:
+            raise ValueError('Flight times of the routes in use must be positive, they are the lookahead.')
+        self.duration = duration
+        self.seed = seed
+        if num_processes is None:
+            num_processes = min(os.cpu_count() or 1, num_vertiports)
+        self.num_processes = max(1, min(num_processes, num_vertiports))
+
+    def _node_arguments(self) -> List[List[Tuple]]:
+        """
+        Arguments of the nodes of each process, vertiports dealt out round robin. Every
+        vertiport has its own child of the seed, whatever process it runs in.
+        """
+        seed_sequences = np.random.SeedSequence(self.seed).spawn(len(self.vertiports))
+        groups = [[] for _ in range(self.num_processes)]
+        for index, (params, seed_sequence) in enumerate(zip(self.vertiports, seed_sequences)):
+            groups[index % self.num_processes].append((index, params, seed_sequence,
+                                                       self.flight_times[index].tolist(), self.routing[index].tolist()))
+        return groups
+
+    def run(self) -> NetworkResults:
+        start_time = time.perf_counter()
+        groups = self._node_arguments()
+        if self.num_processes == 1:
+            workers = [LocalNodes(groups[0])]
+        else:
+            workers = [ProcessNodes(group) for group in groups]
+
+        next_event_time = min(min(worker.next_event_times().values()) for worker in workers)
+        pending = []
+        num_windows = 0
+        num_handoffs = 0
+        num_in_flight = 0
+        until = 0.0
+        while until < self.duration:
+            # The window starts at the earliest pending event or hand-off
+            window_start = min([next_event_time] + [handoff[0] for handoff in pending])
+            until = min(window_start + self.lookahead, self.duration)
+            inboxes = [{} for _ in workers]
+            for handoff in sorted(pending, key=lambda handoff: (handoff[0], handoff[2], handoff[3])):
+                destination = handoff[1]
+                inboxes[destination % self.num_processes].setdefault(destination, []).append(handoff)
+            for worker, inbox in zip(workers, inboxes):
+                worker.send_advance(until, inbox)
+            pending = []
+            next_event_time = np.inf
+            for worker in workers:
+                outbox, next_event_times = worker.receive_advance()
+                pending.extend(outbox)
+                next_event_time = min([next_event_time] + list(next_event_times.values()))
+            num_handoffs += len(pending)
+            # Hand-offs that land after the end of the run
+            num_in_flight += sum(handoff[0] >= self.duration for handoff in pending)
+            num_windows += 1
+
+        results = {}
+        for worker in workers:
+            results.update(worker.finish())
+        return NetworkResults([results[index] for index in range(len(self.vertiports))],
+                              duration=self.duration,
+                              lookahead=self.lookahead,
+                              num_windows=num_windows,
+                              num_handoffs=num_handoffs,
+                              num_in_flight=num_in_flight,
+                              wall_time=time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    # A ring of six vertiports exchanging a fleet, on a handful of processes
+    vertiport = dict(aircraft_arrival_rate=0, passenger_arrival_rate=200, charge_time=6, num_park=4,
+                     num_aircraft=0, num_passenger=100000, seat_capacity=4, tlof_feedback=False, tlof_time=1,
+                     stochastic=True, blocking=True, terminal_buffer_capacity=50, no_pax_arrival=False,
+                     initial_aircraft=10)
+    num_vertiports = 6
+    flight_times = [[0.25 + 0.1 * min(abs(i - j), num_vertiports - abs(i - j)) for j in range(num_vertiports)]
+                    for i in range(num_vertiports)]
+    for num_processes in (1, 3):
+        results = NetworkSimulation([vertiport] * num_vertiports, flight_times, duration=200, seed=0,
+                                    num_processes=num_processes).run()
+        print(f"{num_processes} processes: {results.wall_time:.2f} s, {results.num_windows} windows, "
+              f"{results.num_handoffs} hand-offs, throughput {np.round(results['average_aircraft_throughput'], 2)}")
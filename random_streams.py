@@ -0,0 +1,41 @@
+import numpy as np
+from typing import Callable, Dict, Union
+
+# Independent random number streams of a simulation. Each source of randomness draws from
+# its own stream, so that scenarios run with the same seed see the same arrivals, TLOF and
+# charge times (common random numbers) whatever else differs between them.
+RANDOM_STREAMS = ('arrivals', 'tlof', 'charging', 'passengers')
+
+
+def make_random_streams(seed: Union[int, np.random.SeedSequence]) -> Dict[str, np.random.Generator]:
+    """
+    Spawns one numpy.random.Generator per stream in RANDOM_STREAMS from the seed. Streams
+    are assigned by position, so a stream only depends on the seed and its name.
+    """
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    children = seed_sequence.spawn(len(RANDOM_STREAMS))
+    return {name: np.random.Generator(np.random.PCG64(child)) for name, child in zip(RANDOM_STREAMS, children)}
+
+
+class BufferedSampler:
+    """
+    Hands out variates one at a time from blocks of block_size drawn with one vectorized call.
+    draw_block(size) must return an array of variates. A block of n variates drawn from a
+    Generator is bit-identical to n consecutive scalar draws of the same distribution, so a
+    sampler that is the only consumer of its stream reproduces scalar draws exactly.
+    """
+    def __init__(self, draw_block: Callable[[int], np.ndarray], block_size: int = 4096):
+        self.draw_block = draw_block
+        self.block_size = block_size
+        self._block = iter(())
+
+    def __call__(self) -> float:
+        try:
+            return next(self._block)
+        except StopIteration:
+            self._block = iter(self.draw_block(self.block_size).tolist())
+            return next(self._block)
+
+
+def constant_sampler(value: float) -> Callable[[], float]:
+    return lambda: value
@@ -0,0 +1,307 @@
+import numpy as np
+from typing import Callable, Dict, List, Sequence, Tuple
+from distributions import make_distribution
+from fast_engine import TandemQueueSimulation
+from lindley import fifo_multi_server_service_times, lindley_service_times
+from metrics import SystemMetrics, time_weighted_mean_variance_rows
+from random_streams import make_random_streams
+
+# SystemMetrics methods that make up the results of a replication
+METRIC_NAMES = ('get_rejected_num_aircraft',
+                'average_aircraft_throughput',
+                'average_terminal_queue_length',
+                'average_num_aircraft_at_surface',
+                'average_passenger_queue_length',
+                'variance_in_terminal_queue_length',
+                'variance_in_num_aircraft_at_surface',
+                'variance_in_pax_queue_length')
+
+# Two-sided Student t critical values for 1 to 30 degrees of freedom
+_T_TABLE = {
+    0.90: (6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812,
+           1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725,
+           1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697),
+    0.95: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+           2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+           2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042),
+    0.99: (63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169,
+           3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878, 2.861, 2.845,
+           2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750),
+}
+_NORMAL_QUANTILES = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+
+def t_critical_value(confidence: float, degrees_of_freedom: int) -> float:
+    """
+    Two-sided Student t critical value. Beyond the table it is interpolated in
+    1 / degrees_of_freedom towards the normal quantile, which is accurate to about 1e-3.
+    """
+    if confidence not in _T_TABLE:
+        raise ValueError(f'Confidence level must be one of {sorted(_T_TABLE)}.')
+    if degrees_of_freedom < 1:
+        raise ValueError('Need at least one degree of freedom.')
+    table = _T_TABLE[confidence]
+    if degrees_of_freedom <= len(table):
+        return table[degrees_of_freedom - 1]
+    normal_quantile = _NORMAL_QUANTILES[confidence]
+    return normal_quantile + (table[-1] - normal_quantile) * len(table) / degrees_of_freedom
+
+
+def confidence_interval(samples: Sequence[float], confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    Returns the sample mean and the half-width of its t confidence interval. The half-width
+    is infinite with fewer than two samples.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    mean = float(samples.mean()) if len(samples) else np.nan
+    if len(samples) < 2:
+        return mean, np.inf
+    standard_error = samples.std(ddof=1) / np.sqrt(len(samples))
+    return mean, float(t_critical_value(confidence, len(samples) - 1) * standard_error)
+
+
+class ReplicationMetrics:
+    """
+    Stands in for the SystemMetrics of one replication of a batch, with the values already
+    computed, so that it can be passed to build_result_row.
+    """
+    def __init__(self, values: Dict[str, float]):
+        self.values = values
+
+    def get_rejected_num_aircraft(self):
+        return self.values['get_rejected_num_aircraft']
+
+    def average_aircraft_throughput(self):
+        return self.values['average_aircraft_throughput']
+
+    def average_terminal_queue_length(self):
+        return self.values['average_terminal_queue_length']
+
+    def average_num_aircraft_at_surface(self):
+        return self.values['average_num_aircraft_at_surface']
+
+    def average_passenger_queue_length(self):
+        return self.values['average_passenger_queue_length']
+
+    def variance_in_terminal_queue_length(self):
+        return self.values['variance_in_terminal_queue_length']
+
+    def variance_in_num_aircraft_at_surface(self):
+        return self.values['variance_in_num_aircraft_at_surface']
+
+    def variance_in_pax_queue_length(self):
+        return self.values['variance_in_pax_queue_length']
+
+    def __repr__(self):
+        return f"ReplicationMetrics({self.values})"
+
+
+class ReplicationResults:
+    """
+    Metrics of the replications of a batch, one array entry per seed.
+    """
+    def __init__(self, seeds: Sequence[int], metrics: Dict[str, np.ndarray]):
+        self.seeds = list(seeds)
+        self.metrics = metrics
+
+    @classmethod
+    def from_system_metrics(cls, seeds: Sequence[int], system_metrics: Sequence) -> 'ReplicationResults':
+        """
+        Collects the results of replications run one by one.
+        """
+        metrics = {name: np.asarray([getattr(replication, name)() for replication in system_metrics], dtype=np.float64)
+                   for name in METRIC_NAMES}
+        return cls(seeds, metrics)
+
+    def concatenate(self, other: 'ReplicationResults') -> 'ReplicationResults':
+        return ReplicationResults(self.seeds + other.seeds,
+                                  {name: np.concatenate([values, other.metrics[name]]) for name, values in self.metrics.items()})
+
+    def is_precise(self, target_metrics: Sequence[str], relative_precision: float, confidence: float = 0.95,
+                   absolute_precision: float = 0) -> bool:
+        """
+        Whether the confidence interval half-width of every target metric is at most
+        relative_precision times the absolute value of its mean. absolute_precision bounds
+        the required half-width from below for metrics with a mean close to zero.
+        """
+        for name in target_metrics:
+            mean, half_width = confidence_interval(self.metrics[name], confidence)
+            if half_width > max(relative_precision * abs(mean), absolute_precision):
+                return False
+        return True
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def __getitem__(self, index) -> ReplicationMetrics:
+        return ReplicationMetrics({name: values[index].item() for name, values in self.metrics.items()})
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def summary(self, confidence: float = 0.95) -> Dict[str, Tuple[float, float]]:
+        """
+        Across-seed mean and confidence interval half-width of every metric.
+        """
+        return {name: confidence_interval(values, confidence) for name, values in self.metrics.items()}
+
+
+class ReplicationBatch:
+    """
+    Runs the replications of one no-passenger configuration, one per seed, together.
+
+    With use_recursions and independent stages (see TandemQueueSimulation) every replication
+    is a row of R x num_aircraft arrays: the Lindley recursions run on all rows at once, the
+    park stage steps through the aircraft with R-wide operations and the traces are reduced
+    row-wise, so the Python overhead of the batch is about that of a single run. Each row
+    draws from the streams of its seed exactly like TandemQueueSimulation with
+    use_recursions, so the results are identical to running the seeds one by one.
+
+    Other configurations, which includes every blocking or finite-buffer one, run the event
+    engine seed by seed, with the same results as run_simulation. Their stages interact and
+    landings and take-offs take their TLOF draws in event order, so there is no recursion to
+    vectorize. Stepping R replications through their events together on R-wide arrays takes
+    some fifty masked NumPy operations of about a microsecond each per event, about what the
+    event engine spends on the same event in R = 30 replications, so it would not be faster.
+    """
+    def __init__(self,
+                 seeds: Sequence[int],
+                 num_aircraft,
+                 aircraft_mean_interarrival_time,
+                 num_park,
+                 tlof_mean_service_time,
+                 charge_mean_service_time,
+                 seat_capacity,
+                 stochastic,
+                 terminal_buffer_capacity,
+                 tlof_feedback=True,
+                 blocking=False,
+                 warmup_period=5,
+                 aircraft_interarrival_distribution=None,
+                 tlof_distribution=None,
+                 charge_distribution=None,
+                 use_recursions=False):
+        self.seeds = list(seeds)
+        self.num_aircraft = num_aircraft
+        self.num_park = num_park
+        self.seat_capacity = seat_capacity
+        self.warmup_period = warmup_period
+        self.simulation_parameters = dict(num_aircraft=num_aircraft,
+                                          aircraft_mean_interarrival_time=aircraft_mean_interarrival_time,
+                                          num_park=num_park,
+                                          tlof_mean_service_time=tlof_mean_service_time,
+                                          charge_mean_service_time=charge_mean_service_time,
+                                          seat_capacity=seat_capacity,
+                                          stochastic=stochastic,
+                                          terminal_buffer_capacity=terminal_buffer_capacity,
+                                          tlof_feedback=tlof_feedback,
+                                          blocking=blocking,
+                                          warmup_period=warmup_period,
+                                          aircraft_interarrival_distribution=aircraft_interarrival_distribution,
+                                          tlof_distribution=tlof_distribution,
+                                          charge_distribution=charge_distribution,
+                                          use_recursions=use_recursions)
+        self.stages_are_independent = not tlof_feedback and not blocking and terminal_buffer_capacity == np.inf
+        # Recursions take the TLOF draws in another order than the event engine, so like
+        # run_simulation the batch only uses them when asked to
+        self.is_vectorized = use_recursions and self.stages_are_independent
+        default_distribution = 'exponential' if stochastic else 'deterministic'
+        self.aircraft_interarrival_distribution = make_distribution(aircraft_interarrival_distribution or default_distribution, aircraft_mean_interarrival_time)
+        self.tlof_distribution = make_distribution(tlof_distribution or default_distribution, tlof_mean_service_time)
+        self.charge_distribution = make_distribution(charge_distribution or default_distribution, charge_mean_service_time)
+
+    def run(self) -> ReplicationResults:
+        if not self.seeds:
+            return ReplicationResults([], {name: np.empty(0) for name in METRIC_NAMES})
+        if self.is_vectorized:
+            return ReplicationResults(self.seeds, self._run_vectorized())
+        return ReplicationResults(self.seeds, self._run_each())
+
+    def _run_each(self) -> Dict[str, np.ndarray]:
+        system_metrics = [SystemMetrics(TandemQueueSimulation(**self.simulation_parameters, seed=seed, summary_only=True).run(),
+                                        warmup_period=self.warmup_period)
+                          for seed in self.seeds]
+        return ReplicationResults.from_system_metrics(self.seeds, system_metrics).metrics
+
+    def _run_vectorized(self) -> Dict[str, np.ndarray]:
+        num_aircraft = self.num_aircraft
+        interarrival_times, landing_times, charge_times, departure_times = [], [], [], []
+        for seed in self.seeds:
+            # Same draws, in the same order, as TandemQueueSimulation._run_recursions
+            streams = make_random_streams(seed)
+            interarrival_times.append(self.aircraft_interarrival_distribution.sample(streams['arrivals'], num_aircraft + 1))
+            landing_times.append(self.tlof_distribution.sample(streams['tlof'], num_aircraft))
+            charge_times.append(self.charge_distribution.sample(streams['charging'], num_aircraft))
+            departure_times.append(self.tlof_distribution.sample(streams['tlof'], num_aircraft))
+
+        arrival_times = np.cumsum(np.vstack(interarrival_times), axis=1)
+        end_time = arrival_times[:, -1:]
+        arrival_times = arrival_times[:, :-1]
+        landing_start, landing_end = lindley_service_times(arrival_times, np.vstack(landing_times))
+        charge_start, charge_end = fifo_multi_server_service_times(landing_end, np.vstack(charge_times), self.num_park)
+        departure_start, departure_end = lindley_service_times(np.sort(charge_end, axis=1), np.vstack(departure_times))
+
+        arrival_queue = _trace_rows(end_time, [(arrival_times, 1), (landing_start, -1)])
+        surface_count = _trace_rows(end_time, [(landing_end, 1)])
+        passenger_queue = _trace_rows(end_time, [(departure_start, -self.seat_capacity)], initial_record=False)
+        terminal_mean, terminal_variance = time_weighted_mean_variance_rows(*arrival_queue, self.warmup_period)
+        surface_mean, surface_variance = time_weighted_mean_variance_rows(*surface_count, self.warmup_period)
+        passenger_mean, passenger_variance = time_weighted_mean_variance_rows(*passenger_queue, self.warmup_period)
+        return {
+            'get_rejected_num_aircraft': np.zeros(len(self.seeds)),
+            'average_aircraft_throughput': (departure_end < end_time).sum(axis=1) / end_time[:, 0],
+            'average_terminal_queue_length': terminal_mean,
+            'average_num_aircraft_at_surface': surface_mean,
+            'average_passenger_queue_length': passenger_mean,
+            'variance_in_terminal_queue_length': terminal_variance,
+            'variance_in_num_aircraft_at_surface': surface_variance,
+            'variance_in_pax_queue_length': passenger_variance,
+        }
+
+
+def run_until_precise(run_seeds: Callable[[List[int]], ReplicationResults],
+                      seeds: Sequence[int],
+                      target_metrics: Sequence[str] = ('average_aircraft_throughput', 'average_terminal_queue_length'),
+                      relative_precision: float = 0.05,
+                      absolute_precision: float = 0,
+                      confidence: float = 0.95,
+                      min_replications: int = 5,
+                      batch_size: int = 5) -> ReplicationResults:
+    """
+    Sequential replication procedure. Runs the seeds in order, batch_size at a time through
+    run_seeds, until the confidence intervals of the target metrics are within
+    relative_precision of their means (see ReplicationResults.is_precise) or all seeds have
+    run. At least min_replications replications are run before checking, so that a few
+    lucky replications cannot stop the procedure.
+    """
+    seeds = list(seeds)
+    num_run = min(max(min_replications, batch_size), len(seeds))
+    results = run_seeds(seeds[:num_run])
+    while num_run < len(seeds) and not results.is_precise(target_metrics, relative_precision, confidence, absolute_precision):
+        next_seeds = seeds[num_run:num_run + batch_size]
+        results = results.concatenate(run_seeds(next_seeds))
+        num_run += len(next_seeds)
+    return results
+
+
+def _trace_rows(end_time: np.ndarray, changes: List[Tuple[np.ndarray, float]],
+                initial_record: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the traces of a counter for every row from (times, change) pairs, like
+    time_series.record_changes, keeping only the changes before the end of the
+    run of the row. Rows are padded for time_weighted_mean_variance_rows.
+    """
+    times = np.concatenate([change_times for change_times, _ in changes], axis=1)
+    deltas = np.concatenate([np.full(change_times.shape, change, dtype=np.float64) for change_times, change in changes], axis=1)
+    if initial_record:
+        times = np.hstack([np.zeros((len(times), 1)), times])
+        deltas = np.hstack([np.zeros((len(deltas), 1)), deltas])
+    order = np.argsort(times, axis=1, kind='stable')
+    times = np.take_along_axis(times, order, axis=1)
+    values = np.cumsum(np.take_along_axis(deltas, order, axis=1), axis=1)
+    # Changes at or after the end of the run never happen; they sort last in each row
+    happened = times < end_time
+    num_records = happened.sum(axis=1)
+    last_time = np.take_along_axis(times, np.maximum(num_records - 1, 0)[:, None], axis=1)
+    times = np.where(happened, times, np.where(num_records[:, None] > 0, last_time, 0))
+    return times, values
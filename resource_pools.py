@@ -0,0 +1,161 @@
+import heapq
+from collections import deque
+from itertools import count
+from typing import Optional, Sequence
+
+import simpy
+
+
+class PoolRequest(simpy.Event):
+    """
+    Request for one unit of an IndexedResourcePool. It succeeds with the index of the unit it
+    was granted, also kept in unit. Used in a with statement, the unit is released on exit,
+    like a simpy.Resource request.
+    """
+    def __init__(self, pool: 'IndexedResourcePool', priority: int, origin: int):
+        super().__init__(pool.env)
+        self.pool = pool
+        self.priority = priority
+        self.origin = origin
+        self.unit = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Like simpy requests, do not release on generator cleanups
+        if exc_type is not GeneratorExit:
+            self.pool.release(self)
+
+
+class IndexedResourcePool:
+    """
+    A resource of num_units numbered units, e.g. the TLOF pads or the stands of a vertiport.
+    Free units are kept in heaps ordered by preference, so granting and releasing a unit take
+    O(log num_units) whatever the number of units, and a request learns which unit it got.
+
+    preferences is one sequence of keys per origin (e.g. per landing pad), the lowest key
+    being the most preferred unit for requests from that origin. Without preferences units
+    are granted lowest index first, and with a single row of keys origin is ignored.
+
+    Requests wait in priority order, then in order of arrival, and are served with the same
+    event timing as a simpy.PriorityResource: a request is granted when it is made if a unit
+    is free, else when a release is processed.
+    """
+    def __init__(self, env: simpy.Environment, num_units: int, preferences: Optional[Sequence[Sequence]] = None):
+        if num_units < 1:
+            raise ValueError('A resource pool needs at least one unit.')
+        self.env = env
+        self.num_units = num_units
+        if preferences is None:
+            preferences = [range(num_units)]
+        self.preferences = [list(keys) for keys in preferences]
+        if any(len(keys) != num_units for keys in self.preferences):
+            raise ValueError('Every row of preferences needs one key per unit.')
+        self.is_free = [True] * num_units
+        self.num_free = num_units
+        self.heaps = [sorted(zip(keys, range(num_units))) for keys in self.preferences]
+        self.waiting = []
+        self.sequence = count()
+        # Busy time per unit, for utilization
+        self.busy_time = [0.0] * num_units
+        self.busy_since = [0.0] * num_units
+
+    @property
+    def count(self) -> int:
+        """
+        Number of units in use.
+        """
+        return self.num_units - self.num_free
+
+    @property
+    def queue_length(self) -> int:
+        return len(self.waiting)
+
+    def request(self, priority: int = 0, origin: int = 0) -> PoolRequest:
+        request = PoolRequest(self, priority, origin)
+        heapq.heappush(self.waiting, (priority, next(self.sequence), request))
+        self._serve()
+        return request
+
+    def release(self, request: PoolRequest):
+        if request.unit is None:
+            # Never granted: leave the queue
+            self.waiting = [entry for entry in self.waiting if entry[2] is not request]
+            heapq.heapify(self.waiting)
+            return
+        unit = request.unit
+        request.unit = None
+        self.busy_time[unit] += self.env.now - self.busy_since[unit]
+        self.is_free[unit] = True
+        self.num_free += 1
+        for heap, keys in zip(self.heaps, self.preferences):
+            heapq.heappush(heap, (keys[unit], unit))
+            if len(heap) > 2 * self.num_units:
+                self._compact(heap, keys)
+        # The next request is served when the release is processed, as in simpy
+        released = self.env.event()
+        released.callbacks.append(self._serve)
+        released.succeed()
+
+    def _serve(self, event=None):
+        if not self.waiting or not self.num_free:
+            return
+        _, _, request = heapq.heappop(self.waiting)
+        # With several preference orders a unit taken through one heap stays in the others
+        # until it is popped there, so stale entries are skipped
+        heap = self.heaps[request.origin if len(self.heaps) > 1 else 0]
+        while True:
+            _, unit = heapq.heappop(heap)
+            if self.is_free[unit]:
+                break
+        self.is_free[unit] = False
+        self.num_free -= 1
+        self.busy_since[unit] = self.env.now
+        request.unit = unit
+        request.succeed(unit)
+
+    def _compact(self, heap, keys):
+        heap[:] = [(keys[unit], unit) for unit in range(self.num_units) if self.is_free[unit]]
+        heapq.heapify(heap)
+
+    def utilization(self, units: Sequence[int] = None) -> float:
+        """
+        Share of time the units (all by default) were in use up to now.
+        """
+        units = range(self.num_units) if units is None else units
+        now = self.env.now
+        if now == 0 or len(units) == 0:
+            return 0.0
+        busy = sum(self.busy_time[unit] + (0 if self.is_free[unit] else now - self.busy_since[unit]) for unit in units)
+        return busy / (len(units) * now)
+
+
+class CapacityCounter:
+    """
+    Counts free places, e.g. in the terminal buffer or on the surface, without holding a token
+    per place. get waits for a place and put returns one; waiting gets are served in order,
+    with the same event timing as a simpy.Store of tokens.
+    """
+    def __init__(self, env: simpy.Environment, available: int = 0):
+        self.env = env
+        self.available = available
+        self.waiting = deque()
+
+    def get(self) -> simpy.Event:
+        event = self.env.event()
+        self.waiting.append(event)
+        self._serve()
+        return event
+
+    def put(self):
+        self.available += 1
+        # Waiting gets are served when the put is processed, as in simpy
+        put = self.env.event()
+        put.callbacks.append(self._serve)
+        put.succeed()
+
+    def _serve(self, event=None):
+        if self.waiting and self.available:
+            self.available -= 1
+            self.waiting.popleft().succeed()
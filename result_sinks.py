@@ -0,0 +1,493 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Set
+
+# Columns of the simulation_metrics table, in insertion order
+RESULT_COLUMNS = [
+    ('tlof_feedback', 'BOOLEAN'),
+    ('seed', 'INTEGER'),
+    ('num_park', 'INTEGER'),
+    ('aircraft_arrival_rate', 'INTEGER'),
+    ('passenger_arrival_rate', 'INTEGER'),
+    ('tlof_time', 'REAL'),
+    ('charge_time', 'REAL'),
+    ('terminal_buffer_capacity', 'REAL'),
+    ('blocking', 'BOOLEAN'),
+    ('num_rejected_aircraft', 'INTEGER'),
+    ('aircraft_throughput_rate', 'REAL'),
+    ('terminal_queue_length', 'REAL'),
+    ('avg_num_aircraft_at_surface', 'REAL'),
+    ('passenger_queue_length', 'REAL'),
+    ('variance_in_terminal_queue_length', 'REAL'),
+    ('variance_in_pax_queue_length', 'REAL'),
+    ('run_key', 'TEXT'),
+    ('num_replications', 'INTEGER'),
+    ('configuration_key', 'TEXT'),
+]
+RESULT_COLUMN_NAMES = [name for name, _ in RESULT_COLUMNS]
+RESULT_TABLE = 'simulation_metrics'
+RUN_KEY_INDEX = f'{RESULT_TABLE}_run_key'
+# Configurations with as many stored runs as replications
+COMPLETED_CONFIGURATIONS_QUERY = (f'SELECT configuration_key FROM {RESULT_TABLE} WHERE configuration_key IS NOT NULL '
+                                  'GROUP BY configuration_key HAVING COUNT(DISTINCT run_key) >= MAX(num_replications)')
+# A run written again, e.g. by an adaptive configuration that reran a seed an earlier sweep
+# stored, keeps its row and gets the replication columns it did not have
+UPSERT_CLAUSE = (f'ON CONFLICT (run_key) DO UPDATE SET '
+                 f'num_replications = COALESCE(excluded.num_replications, {RESULT_TABLE}.num_replications), '
+                 f'configuration_key = COALESCE(excluded.configuration_key, {RESULT_TABLE}.configuration_key)')
+
+
+def build_result_row(parameters: Dict, system_metrics, run_key: str = None, num_replications: int = None,
+                     configuration_key: str = None) -> Dict:
+    """
+    Builds the simulation_metrics row of a finished simulation. run_key identifies the
+    parameter combination in resumable sweeps. An adaptive sweep also records the
+    configuration_key shared by all the seeds of the configuration, and num_replications,
+    the number of seeds it ran for the configuration.
+    """
+    return {
+        'tlof_feedback': bool(parameters['tlof_feedback']),
+        'seed': int(parameters['seed']),
+        'num_park': int(parameters['num_park']),
+        'aircraft_arrival_rate': int(parameters['aircraft_arrival_rate']),
+        'passenger_arrival_rate': int(parameters['passenger_arrival_rate']),
+        'tlof_time': float(parameters['tlof_time']),
+        'charge_time': float(parameters['charge_time']),
+        'terminal_buffer_capacity': float(parameters['terminal_buffer_capacity']),
+        'blocking': bool(parameters['blocking']),
+        'num_rejected_aircraft': int(system_metrics.get_rejected_num_aircraft()),
+        'aircraft_throughput_rate': round(float(system_metrics.average_aircraft_throughput()), 2),
+        'terminal_queue_length': round(float(system_metrics.average_terminal_queue_length()), 2),
+        'avg_num_aircraft_at_surface': round(float(system_metrics.average_num_aircraft_at_surface()), 2),
+        'passenger_queue_length': round(float(system_metrics.average_passenger_queue_length()), 2),
+        'variance_in_terminal_queue_length': round(float(system_metrics.variance_in_terminal_queue_length()), 2),
+        'variance_in_pax_queue_length': round(float(system_metrics.variance_in_pax_queue_length()), 2),
+        'run_key': run_key,
+        'num_replications': num_replications,
+        'configuration_key': configuration_key,
+    }
+
+
+def unique_rows(rows: List[Dict]) -> List[Dict]:
+    """
+    Keeps one row per run_key, the last one written, in the position of the first. Postgres
+    refuses an upsert that affects a row twice, which a batch with a run twice would, e.g.
+    when spill files of two failed sweeps hold the same configuration. Rows without a run_key
+    are all kept.
+    """
+    keyed_rows = {}
+    for index, row in enumerate(rows):
+        key = row.get('run_key')
+        keyed_rows[index if key is None else ('run_key', key)] = row
+    return list(keyed_rows.values())
+
+
+def report_removed_duplicates(num_removed: int):
+    if num_removed > 0:
+        print(f"Removed {num_removed} duplicate rows from {RESULT_TABLE} before adding its unique run_key index.")
+
+
+class ResultSink:
+    """
+    Buffers result rows and writes them to a backend in batches of batch_size rows.
+    Subclasses implement _write_rows and _close.
+    """
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.buffer = []
+
+    def write(self, row: Dict):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self._write_rows(unique_rows(self.buffer))
+        self.buffer = []
+
+    def completed_keys(self) -> Set[str]:
+        """
+        Returns the run keys of the rows already stored in the backend.
+        """
+        raise NotImplementedError
+
+    def completed_configuration_keys(self) -> Set[str]:
+        """
+        Returns the configuration keys of the adaptive configurations whose replications are
+        all stored in the backend.
+        """
+        raise NotImplementedError
+
+    def drain(self) -> List[Dict]:
+        """
+        Removes and returns the buffered rows that have not been written yet.
+        """
+        rows, self.buffer = self.buffer, []
+        return rows
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._close()
+
+    def _write_rows(self, rows: List[Dict]):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PostgresResultSink(ResultSink):
+    """
+    Writes result rows to PostgreSQL over one persistent connection using multi-row inserts.
+    """
+    def __init__(self, db_name, user='emin', password='emin', host='localhost', port='5432', batch_size=500):
+        super().__init__(batch_size)
+        import psycopg2
+        from psycopg2.extras import execute_values
+        self._connect = lambda: psycopg2.connect(dbname=db_name, user=user, password=password, host=host, port=port)
+        self._execute_values = execute_values
+        self.conn = self._connect()
+        columns = ', '.join(f'{name} {sql_type}' for name, sql_type in RESULT_COLUMNS)
+        with self.conn.cursor() as cur:
+            cur.execute(f'CREATE TABLE IF NOT EXISTS {RESULT_TABLE} (id SERIAL PRIMARY KEY, {columns})')
+            # Tables created by older versions may miss newer columns
+            for name, sql_type in RESULT_COLUMNS:
+                cur.execute(f'ALTER TABLE {RESULT_TABLE} ADD COLUMN IF NOT EXISTS {name} {sql_type}')
+            # A run is stored once, so rows written again by a resumed sweep are ignored
+            cur.execute('SELECT 1 FROM pg_indexes WHERE tablename = %s AND indexname = %s', (RESULT_TABLE, RUN_KEY_INDEX))
+            if cur.fetchone() is None:
+                # Tables of older versions may hold duplicates, of which the first row is kept.
+                # This runs once, when the index is created.
+                cur.execute(f'DELETE FROM {RESULT_TABLE} a USING {RESULT_TABLE} b WHERE a.run_key = b.run_key AND a.id > b.id')
+                report_removed_duplicates(cur.rowcount)
+                cur.execute(f'CREATE UNIQUE INDEX {RUN_KEY_INDEX} ON {RESULT_TABLE} (run_key)')
+        self.conn.commit()
+
+    def completed_keys(self):
+        self.flush()
+        with self.conn.cursor() as cur:
+            cur.execute(f'SELECT DISTINCT run_key FROM {RESULT_TABLE} WHERE run_key IS NOT NULL')
+            return {key for key, in cur.fetchall()}
+
+    def completed_configuration_keys(self):
+        self.flush()
+        with self.conn.cursor() as cur:
+            cur.execute(COMPLETED_CONFIGURATIONS_QUERY)
+            return {key for key, in cur.fetchall()}
+
+    def _write_rows(self, rows):
+        values = [tuple(row[name] for name in RESULT_COLUMN_NAMES) for row in rows]
+        if self.conn.closed:
+            # The connection dropped during an earlier write
+            self.conn = self._connect()
+        try:
+            with self.conn.cursor() as cur:
+                self._execute_values(cur,
+                                     f'INSERT INTO {RESULT_TABLE} ({", ".join(RESULT_COLUMN_NAMES)}) VALUES %s {UPSERT_CLAUSE}',
+                                     values,
+                                     page_size=len(values))
+            self.conn.commit()
+        except Exception:
+            if not self.conn.closed:
+                self.conn.rollback()
+            raise
+
+    def _close(self):
+        self.conn.close()
+
+
+class SQLiteResultSink(ResultSink):
+    """
+    Writes result rows to a local SQLite database file.
+    """
+    def __init__(self, db_path, batch_size=500):
+        super().__init__(batch_size)
+        # Several sweep workers may share the file, so wait on locks rather than fail. The sink
+        # may be created in one thread and written from a ResultWriter thread.
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        columns = ', '.join(f'{name} {sql_type}' for name, sql_type in RESULT_COLUMNS)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS {RESULT_TABLE} (id INTEGER PRIMARY KEY, {columns})')
+        # Tables created by older versions may miss newer columns
+        existing_columns = {row[1] for row in self.conn.execute(f'PRAGMA table_info({RESULT_TABLE})')}
+        for name, sql_type in RESULT_COLUMNS:
+            if name not in existing_columns:
+                self.conn.execute(f'ALTER TABLE {RESULT_TABLE} ADD COLUMN {name} {sql_type}')
+        # A run is stored once, so rows written again by a resumed sweep are ignored
+        has_index = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                      (RUN_KEY_INDEX,)).fetchone() is not None
+        if not has_index:
+            # Tables of older versions may hold duplicates, of which the first row is kept.
+            # This runs once, when the index is created.
+            removed = self.conn.execute(f'DELETE FROM {RESULT_TABLE} WHERE run_key IS NOT NULL AND id NOT IN '
+                                        f'(SELECT MIN(id) FROM {RESULT_TABLE} WHERE run_key IS NOT NULL GROUP BY run_key)')
+            report_removed_duplicates(removed.rowcount)
+            self.conn.execute(f'CREATE UNIQUE INDEX {RUN_KEY_INDEX} ON {RESULT_TABLE} (run_key)')
+        self.conn.commit()
+
+    def completed_keys(self):
+        self.flush()
+        rows = self.conn.execute(f'SELECT DISTINCT run_key FROM {RESULT_TABLE} WHERE run_key IS NOT NULL')
+        return {key for key, in rows}
+
+    def completed_configuration_keys(self):
+        self.flush()
+        return {key for key, in self.conn.execute(COMPLETED_CONFIGURATIONS_QUERY)}
+
+    def _write_rows(self, rows):
+        placeholders = ', '.join('?' for _ in RESULT_COLUMN_NAMES)
+        with self.conn:
+            self.conn.executemany(f'INSERT INTO {RESULT_TABLE} ({", ".join(RESULT_COLUMN_NAMES)}) VALUES ({placeholders}) {UPSERT_CLAUSE}',
+                                  [tuple(row[name] for name in RESULT_COLUMN_NAMES) for row in rows])
+
+    def _close(self):
+        self.conn.close()
+
+
+class ParquetResultSink(ResultSink):
+    """
+    Writes result rows to a Parquet file, one row group per flush. Each process writes its
+    own part file in the given directory. Requires pyarrow.
+    """
+    def __init__(self, directory, batch_size=500):
+        super().__init__(batch_size)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError('ParquetResultSink requires pyarrow. Install it with `pip install pyarrow`.') from e
+        self._pa = pa
+        self._pq = pq
+        self.directory = directory
+        arrow_types = {'BOOLEAN': pa.bool_(), 'INTEGER': pa.int64(), 'REAL': pa.float64(), 'TEXT': pa.string()}
+        self.schema = pa.schema([(name, arrow_types[sql_type]) for name, sql_type in RESULT_COLUMNS])
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{RESULT_TABLE}-{os.getpid()}-{time.time_ns()}.parquet')
+        self.writer = pq.ParquetWriter(self.path, self.schema)
+
+    def _write_rows(self, rows):
+        self.writer.write_table(self._pa.Table.from_pylist(rows, schema=self.schema))
+
+    def completed_keys(self):
+        keys = set()
+        for table in self._stored_tables():
+            if 'run_key' in table.column_names:
+                keys.update(key for key in table.column('run_key').to_pylist() if key is not None)
+        return keys
+
+    def completed_configuration_keys(self):
+        run_keys, num_replications = defaultdict(set), defaultdict(int)
+        for table in self._stored_tables():
+            if 'configuration_key' not in table.column_names:
+                continue
+            for row in table.select(['configuration_key', 'run_key', 'num_replications']).to_pylist():
+                key = row['configuration_key']
+                if key is not None:
+                    run_keys[key].add(row['run_key'])
+                    num_replications[key] = max(num_replications[key], row['num_replications'] or 0)
+        return {key for key, keys in run_keys.items() if len(keys) >= num_replications[key]}
+
+    def _stored_tables(self):
+        self.flush()
+        for file_name in os.listdir(self.directory):
+            path = os.path.join(self.directory, file_name)
+            # The part file of this process is still open for writing
+            if not file_name.endswith('.parquet') or path == self.path:
+                continue
+            yield self._pq.read_table(path)
+
+    def _close(self):
+        self.writer.close()
+
+
+RESULT_SINKS = {
+    'postgres': PostgresResultSink,
+    'sqlite': SQLiteResultSink,
+    'parquet': ParquetResultSink,
+}
+
+
+def make_result_sink(kind: str, **kwargs) -> ResultSink:
+    """
+    Creates a result sink by backend name ('postgres', 'sqlite' or 'parquet').
+    """
+    if kind not in RESULT_SINKS:
+        raise ValueError(f"Unknown result sink '{kind}'. Choose from {list(RESULT_SINKS)}.")
+    return RESULT_SINKS[kind](**kwargs)
+
+
+class ResultWriter:
+    """
+    Writes result rows to a sink from a dedicated thread, so that producers never wait on the
+    database. Rows go through a bounded queue: put() blocks when max_queue_size rows are
+    pending. Failed writes are retried with exponential backoff and, if they keep failing,
+    the rows are appended to spill_path as JSON lines instead of being lost. Once the sink
+    has failed, later rows are spilled straight away for recovery_delay seconds, after which
+    the next row tries the sink again, once.
+    """
+    def __init__(self, sink: ResultSink, max_queue_size=1000, max_retries=3, retry_delay=1.0,
+                 spill_path='spilled_results.jsonl', recovery_delay=60.0):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.spill_path = spill_path
+        self.recovery_delay = recovery_delay
+        self.num_spilled = 0
+        self.sink_failed = False
+        # time.monotonic() from which a failed sink is tried again
+        self.next_sink_attempt = 0.0
+        # The error that stopped the writer thread, raised by put and close
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='ResultWriter', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, row: Dict):
+        self._put(row)
+
+    def close(self):
+        """
+        Writes the remaining rows and closes the sink.
+        """
+        self._put(_STOP)
+        self.thread.join()
+        if self.error is not None:
+            raise RuntimeError('The result writer failed.') from self.error
+
+    def _put(self, item):
+        # Wait for room in the queue only as long as the writer thread is there to make it
+        while True:
+            if not self.thread.is_alive():
+                raise RuntimeError('The result writer is not running.') from self.error
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def _run(self):
+        try:
+            while True:
+                row = self.queue.get()
+                if row is _STOP:
+                    break
+                try:
+                    self._write(row)
+                except Exception as e:
+                    # Even spilling failed; keep consuming so that producers are not blocked
+                    print(f"An error occurred while writing a result row: {e}")
+            if not self.sink_failed:
+                self._with_retries(self.sink.flush)
+        except Exception as e:
+            self.error = e
+            print(f"The result writer stopped: {e}")
+        try:
+            self.sink.close()
+        except Exception as e:
+            print(f"An error occurred while closing the result sink: {e}")
+
+    def _write(self, row: Dict):
+        if not self.sink_failed:
+            self._with_retries(self.sink.write, row)
+        elif time.monotonic() < self.next_sink_attempt:
+            self._spill([row])
+        else:
+            # Probe the failed sink with a flush, as a buffered write would not reach it
+            self._with_retries(self._write_and_flush, row)
+
+    def _write_and_flush(self, row: Dict):
+        self.sink.write(row)
+        self.sink.flush()
+
+    def _with_retries(self, write, *args):
+        # The sink keeps rows it failed to flush in its buffer, so retries only need to flush.
+        # A sink that failed before is tried once, so that producers do not wait on the backoff,
+        # and counts as recovered once that write has flushed.
+        num_retries = 0 if self.sink_failed else self.max_retries
+        try:
+            write(*args)
+            self._sink_recovered()
+            return
+        except Exception as e:
+            error = e
+        for attempt in range(num_retries):
+            time.sleep(self.retry_delay * 2 ** attempt)
+            try:
+                self.sink.flush()
+                self._sink_recovered()
+                return
+            except Exception as e:
+                error = e
+        self.sink_failed = True
+        self.next_sink_attempt = time.monotonic() + self.recovery_delay
+        rows = self.sink.drain()
+        self._spill(rows)
+        print(f"An error occurred: {error} (spilled {len(rows)} rows to {self.spill_path}, "
+              f"rows of the next {self.recovery_delay} s are spilled too)")
+
+    def _sink_recovered(self):
+        if self.sink_failed:
+            self.sink_failed = False
+            print(f"The result sink is writing again ({self.num_spilled} rows spilled to {self.spill_path} so far)")
+
+    def _spill(self, rows: List[Dict]):
+        with open(self.spill_path, 'a') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+        self.num_spilled += len(rows)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_spilled_results(spill_path: str) -> List[Dict]:
+    """
+    Reads back the rows a ResultWriter spilled, e.g. to write them to the sink again.
+    """
+    with open(spill_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_spilled_results(sink: ResultSink, spill_path: str) -> int:
+    """
+    Writes the rows a ResultWriter spilled to the sink and, once they are stored, removes the
+    spill file. Returns the number of rows written. If the write fails the rows are dropped
+    from the sink buffer, the spill file is kept and the error is raised.
+    """
+    if not os.path.exists(spill_path):
+        return 0
+    # Rows spilled by older versions may miss newer columns
+    rows = [{name: row.get(name) for name in RESULT_COLUMN_NAMES} for row in load_spilled_results(spill_path)]
+    try:
+        for row in rows:
+            sink.write(row)
+        sink.flush()
+    except Exception:
+        sink.drain()
+        raise
+    os.remove(spill_path)
+    return len(rows)
+
+
+# Marks the end of the rows in a ResultWriter queue
+_STOP = object()
@@ -1,13 +1,20 @@
-import itertools
+import os
+import time
+from functools import partial
 from multiprocessing import Pool
 import numpy as np
 import psycopg2
 import tqdm
-from helpers import save_simulation_results_postgres
+from result_sinks import ResultWriter, build_result_row, make_result_sink, replay_spilled_results
 from vertiport_sim import VertiportSimulation
-from helpers import generate_ids
+from fast_engine import TandemQueueSimulation
+from topology import make_topology
 import simpy
 from metrics import SystemMetrics
+from instrumentation import format_report, merge_reports
+from replications import ReplicationBatch, ReplicationResults, run_until_precise
+from sweep import (CostModel, SweepSpec, TaskTiming, TimingLog, WorkerIdleReport, has_enough_park_capacity,
+                   configuration_key, parameter_key, schedule_longest_first, suggest_chunksize)
 
 
 aircraft_arrival_rates =  list(range(1, 41, 1))
@@ -25,6 +32,17 @@ blocking = [True]
 no_pax_arrival = [True]
 terminal_buffer_capacity = [50]
 seed = list(range(0, 30))
+# Opt-in: run the seeds of each configuration in batches until the confidence intervals of
+# the throughput and terminal queue length are within relative_precision of their means (or
+# absolute_precision, for queues that are nearly always empty), using at most the seeds above.
+# Configurations then store fewer seeds, so the sweep results differ from running every seed.
+adaptive_replications = False
+relative_precision = 0.05
+absolute_precision = 0.01
+# Profile the SimPy runs and print where their time went (see instrumentation.py)
+instrument_runs = False
+# Rough wall-clock seconds of one simulation, used to size the Pool chunks
+estimated_task_duration = 1.0
 
 
 def run_simulation(aircraft_arrival_rate, 
@@ -41,7 +59,24 @@ def run_simulation(aircraft_arrival_rate,
                    terminal_buffer_capacity,
                    seed,
                    no_pax_arrival,
-                   is_logging=False):
+                   is_logging=False,
+                   warmup_period=5,
+                   summary_only=False,
+                   aircraft_interarrival_distribution=None,
+                   tlof_distribution=None,
+                   charge_distribution=None,
+                   passenger_interarrival_distribution=None,
+                   engine='simpy',
+                   stop_on_convergence=False,
+                   convergence_tolerance=0.05,
+                   event_trace_path=None,
+                   instrument=False,
+                   topology=None,
+                   use_recursions=False):
+    if topology is not None:
+        # num_park may be left out with a topology, and the row records its number of stands
+        topology = make_topology(topology, num_park)
+        num_park = topology.num_stands
     parameters = {
         'aircraft_arrival_rate': aircraft_arrival_rate,
         'passenger_arrival_rate': passenger_arrival_rate,
@@ -59,18 +94,50 @@ def run_simulation(aircraft_arrival_rate,
         'no_pax_arrival': no_pax_arrival,
         'seed': seed
     }
-    env = simpy.Environment()
     aircraft_mean_interarrival_time = 1/aircraft_arrival_rate # inter-arrival time in hours
     passenger_mean_interarrival_time = 1/passenger_arrival_rate # inter-arrival time in hours
     tlof_mean_service_time = tlof_time/60 # TLOF service time in hours
     charge_mean_service_time = charge_time/60 # Park service time in hours
 
-    aircraft_ids = generate_ids(num_aircraft, "Aircraft")
-    passenger_ids = generate_ids(num_passenger, "Passenger")
+    if engine == 'fast':
+        # Event-list engine without SimPy for the configurations without passengers
+        if not no_pax_arrival:
+            raise ValueError("The fast engine only supports no_pax_arrival=True.")
+        if stop_on_convergence:
+            raise ValueError("Stopping on convergence needs the SimPy engine.")
+        if event_trace_path is not None:
+            raise ValueError("Event traces need the SimPy engine.")
+        if instrument:
+            raise ValueError("Instrumentation needs the SimPy engine.")
+        if topology is not None:
+            raise ValueError("Vertiport topologies need the SimPy engine.")
+        simulation = TandemQueueSimulation(num_aircraft=num_aircraft,
+                                           aircraft_mean_interarrival_time=aircraft_mean_interarrival_time,
+                                           num_park=num_park,
+                                           tlof_mean_service_time=tlof_mean_service_time,
+                                           charge_mean_service_time=charge_mean_service_time,
+                                           seat_capacity=seat_capacity,
+                                           stochastic=stochastic,
+                                           terminal_buffer_capacity=terminal_buffer_capacity,
+                                           tlof_feedback=tlof_feedback,
+                                           blocking=blocking,
+                                           seed=seed,
+                                           summary_only=summary_only,
+                                           warmup_period=warmup_period,
+                                           aircraft_interarrival_distribution=aircraft_interarrival_distribution,
+                                           tlof_distribution=tlof_distribution,
+                                           charge_distribution=charge_distribution,
+                                           use_recursions=use_recursions).run()
+        return parameters, SystemMetrics(simulation, warmup_period=warmup_period)
+    elif engine != 'simpy':
+        raise ValueError(f"Unknown engine '{engine}'. Choose 'simpy' or 'fast'.")
+
+    env = simpy.Environment()
+
     termination_event = env.event()
     simulation = VertiportSimulation(env=env, 
-                                     aircraft_ids=aircraft_ids, 
-                                     passenger_ids=passenger_ids, 
+                                     num_aircraft=num_aircraft,
+                                     num_passenger=num_passenger,
                                      num_park=num_park,
                                      aircraft_mean_interarrival_time=aircraft_mean_interarrival_time, 
                                      passenger_mean_interarrival_time=passenger_mean_interarrival_time, 
@@ -84,63 +151,221 @@ def run_simulation(aircraft_arrival_rate,
                                      terminal_buffer_capacity=terminal_buffer_capacity,
                                      is_logging=is_logging,
                                      no_pax_arrival=no_pax_arrival,
-                                     seed=seed)
+                                     seed=seed,
+                                     summary_only=summary_only,
+                                     warmup_period=warmup_period,
+                                     aircraft_interarrival_distribution=aircraft_interarrival_distribution,
+                                     tlof_distribution=tlof_distribution,
+                                     charge_distribution=charge_distribution,
+                                     passenger_interarrival_distribution=passenger_interarrival_distribution,
+                                     stop_on_convergence=stop_on_convergence,
+                                     convergence_tolerance=convergence_tolerance,
+                                     event_trace_path=event_trace_path,
+                                     instrument=instrument,
+                                     topology=topology,
+                                     use_recursions=use_recursions)
     if not no_pax_arrival:
         env.process(simulation.passenger_process())
     env.process(simulation.aircraft_arrival_process())
+    if stop_on_convergence:
+        env.process(simulation.convergence_process())
+    if instrument:
+        simulation.instrumentation.start()
     env.run(until=termination_event)
-    system_metrics = SystemMetrics(simulation)
+    if instrument:
+        simulation.instrumentation.stop()
+    simulation.close_event_trace()
+    # A run stopped on convergence uses the warm-up period it detected
+    system_metrics = SystemMetrics(simulation, warmup_period=None if stop_on_convergence else warmup_period)
     return parameters, system_metrics
 
-def run_simulation_with_params(params):
-    # Unpack your parameters
-    aircraft_arrival_rate, passenger_arrival_rate, charge_time, num_park, num_aircraft, num_passenger, seat_capacity, tlof_feedback, tlof_time, stochastic, blocking, terminal_buffer_capacity, no_pax_arrival, seed = params
-
-    # Check if 60/charge_time*num_park is less than aircraft_arrival_rate
-    if 60 / charge_time * num_park < aircraft_arrival_rate:
-        # Skip this set of parameters
-        return
-        
-    parameters, system_metrics = run_simulation(
-        aircraft_arrival_rate=aircraft_arrival_rate,
-        passenger_arrival_rate=passenger_arrival_rate,
-        charge_time=charge_time,
-        num_park=num_park,
-        num_aircraft=num_aircraft,
-        num_passenger=num_passenger,
-        seat_capacity=seat_capacity,
-        tlof_feedback=tlof_feedback,
-        tlof_time=tlof_time,
-        stochastic=stochastic,
-        blocking=blocking,
-        terminal_buffer_capacity=terminal_buffer_capacity,
-        no_pax_arrival=no_pax_arrival,
-        is_logging=False,
-        seed=seed
-    )
-    
-    # Save the simulation results to the PostgreSQL database
-    save_simulation_results_postgres("queueing_sim", parameters=parameters, system_metrics=system_metrics)
+def run_replication_batch(aircraft_arrival_rate,
+                          passenger_arrival_rate,
+                          charge_time,
+                          num_park,
+                          num_aircraft,
+                          num_passenger,
+                          seat_capacity,
+                          tlof_feedback,
+                          tlof_time,
+                          stochastic,
+                          blocking,
+                          terminal_buffer_capacity,
+                          seeds,
+                          no_pax_arrival,
+                          warmup_period=5,
+                          aircraft_interarrival_distribution=None,
+                          tlof_distribution=None,
+                          charge_distribution=None,
+                          use_recursions=False):
+    """
+    Runs one replication per seed of a configuration without passengers as a ReplicationBatch.
+    Returns the (parameters, metrics) pair of every replication, like run_simulation, and the
+    ReplicationResults with the across-seed means and confidence intervals.
+    """
+    if not no_pax_arrival:
+        raise ValueError("Replication batches only support no_pax_arrival=True.")
+    results = ReplicationBatch(seeds,
+                               num_aircraft=num_aircraft,
+                               aircraft_mean_interarrival_time=1/aircraft_arrival_rate,
+                               num_park=num_park,
+                               tlof_mean_service_time=tlof_time/60,
+                               charge_mean_service_time=charge_time/60,
+                               seat_capacity=seat_capacity,
+                               stochastic=stochastic,
+                               terminal_buffer_capacity=terminal_buffer_capacity,
+                               tlof_feedback=tlof_feedback,
+                               blocking=blocking,
+                               warmup_period=warmup_period,
+                               aircraft_interarrival_distribution=aircraft_interarrival_distribution,
+                               tlof_distribution=tlof_distribution,
+                               charge_distribution=charge_distribution,
+                               use_recursions=use_recursions).run()
+    parameters = {
+        'aircraft_arrival_rate': aircraft_arrival_rate,
+        'passenger_arrival_rate': passenger_arrival_rate,
+        'charge_time': charge_time,
+        'num_park': num_park,
+        'num_aircraft': num_aircraft,
+        'num_passenger': num_passenger,
+        'seat_capacity': seat_capacity,
+        'tlof_feedback': tlof_feedback,
+        'tlof_time': tlof_time,
+        'stochastic': stochastic,
+        'blocking': blocking,
+        'terminal_buffer_capacity': terminal_buffer_capacity,
+        'no_pax_arrival': no_pax_arrival,
+    }
+    replications = [({**parameters, 'seed': seed}, metrics) for seed, metrics in zip(results.seeds, results)]
+    return replications, results
+
+def run_simulation_with_params(params, instrument=False):
+    start = time.time()
+    # The event-list engine gives the same results as SimPy for runs without passengers
+    engine = 'fast' if params['no_pax_arrival'] else 'simpy'
+    parameters, system_metrics = run_simulation(**params, is_logging=False, summary_only=True, engine=engine,
+                                                instrument=instrument and engine == 'simpy')
+    row = build_result_row(parameters, system_metrics, run_key=parameter_key(params))
+
+    # Return a compact result row, which the parent process writes to the database,
+    # the timing of this task for the cost model and the worker idle report, and the
+    # instrumentation report of the run (None unless instrumented)
+    report = system_metrics.instrumentation_report() if engine == 'simpy' else None
+    return row, params, TaskTiming(os.getpid(), start, time.time()), report
+
+def run_configuration_with_params(params, seeds, relative_precision=0.05, absolute_precision=0, min_replications=5,
+                                  replication_batch_size=5, instrument=False):
+    """
+    Runs the seeds of the configuration of params in order until its target metrics are
+    precise enough (see replications.run_until_precise). Returns the rows of all the
+    replications, each recording how many were run, with the params, task timing and the
+    merged instrumentation report of the SimPy runs.
+    """
+    start = time.time()
+    configuration = {name: value for name, value in params.items() if name != 'seed'}
+    reports = []
+    if configuration['no_pax_arrival']:
+        def run_seeds(batch_seeds):
+            return run_replication_batch(**configuration, seeds=batch_seeds)[1]
+    else:
+        def run_seeds(batch_seeds):
+            system_metrics = [run_simulation(**configuration, seed=batch_seed, summary_only=True, instrument=instrument)[1]
+                              for batch_seed in batch_seeds]
+            reports.extend(metrics.instrumentation_report() for metrics in system_metrics)
+            return ReplicationResults.from_system_metrics(batch_seeds, system_metrics)
+    results = run_until_precise(run_seeds, seeds,
+                                relative_precision=relative_precision,
+                                absolute_precision=absolute_precision,
+                                min_replications=min_replications,
+                                batch_size=replication_batch_size)
+    rows = []
+    for replication_seed, metrics in zip(results.seeds, results):
+        parameters = {**configuration, 'seed': replication_seed}
+        rows.append(build_result_row(parameters, metrics, run_key=parameter_key(parameters), num_replications=len(results),
+                                     configuration_key=configuration_key(params)))
+    return rows, params, TaskTiming(os.getpid(), start, time.time()), merge_reports(reports)
+
+def run_simulations_with_params(params, instrument=False):
+    row, params, timing, report = run_simulation_with_params(params, instrument=instrument)
+    return [row], params, timing, report
 
 if __name__ == "__main__":
-    # Generate all possible combinations of the parameters
-    parameter_combinations = list(itertools.product(aircraft_arrival_rates, 
-                                                    passenger_arrival_rates, 
-                                                    charge_times, 
-                                                    num_parks, 
-                                                    num_aircraft, 
-                                                    num_passenger, 
-                                                    seat_capacity, 
-                                                    tlof_feedback,
-                                                    tlof_times, 
-                                                    stochastic, 
-                                                    blocking, 
-                                                    terminal_buffer_capacity, 
-                                                    no_pax_arrival,
-                                                    seed))
-
-    # Initialize a pool of processes
-    with Pool(processes=14) as pool:
-        # Use tqdm to show progress
-        for _ in tqdm.tqdm(pool.imap_unordered(run_simulation_with_params, parameter_combinations), total=len(parameter_combinations)):
-            pass
+    # Combinations are generated lazily, and the ones the parks cannot serve are left out
+    sweep = SweepSpec({'aircraft_arrival_rate': aircraft_arrival_rates,
+                       'passenger_arrival_rate': passenger_arrival_rates,
+                       'charge_time': charge_times,
+                       'num_park': num_parks,
+                       'num_aircraft': num_aircraft,
+                       'num_passenger': num_passenger,
+                       'seat_capacity': seat_capacity,
+                       'tlof_feedback': tlof_feedback,
+                       'tlof_time': tlof_times,
+                       'stochastic': stochastic,
+                       'blocking': blocking,
+                       'terminal_buffer_capacity': terminal_buffer_capacity,
+                       'no_pax_arrival': no_pax_arrival,
+                       # With adaptive replications a task is a configuration, which
+                       # starts from the first seed
+                       'seed': seed[:1] if adaptive_replications else seed},
+                      predicates=[has_enough_park_capacity])
+    if adaptive_replications:
+        task_type = 'configuration'
+        run_task = partial(run_configuration_with_params, seeds=seed, relative_precision=relative_precision,
+                           absolute_precision=absolute_precision, instrument=instrument_runs)
+    else:
+        task_type = 'run'
+        run_task = partial(run_simulations_with_params, instrument=instrument_runs)
+
+    sink = make_result_sink('postgres', db_name='queueing_sim')
+    spill_path = 'spilled_results.jsonl'
+
+    # Store the rows earlier sweeps spilled, then skip the combinations finished by earlier,
+    # interrupted runs of this sweep. If the spilled rows cannot be stored their combinations
+    # run again.
+    try:
+        num_replayed = replay_spilled_results(sink, spill_path)
+        if num_replayed:
+            print(f"Wrote {num_replayed} spilled rows from {spill_path}.")
+    except Exception as e:
+        print(f"An error occurred while writing the spilled rows from {spill_path}: {e}")
+    # An adaptive configuration is finished once all its replications are stored, whatever
+    # runs of it a sweep of single runs stored before
+    if adaptive_replications:
+        completed_keys, task_key = sink.completed_configuration_keys(), configuration_key
+    else:
+        completed_keys, task_key = sink.completed_keys(), parameter_key
+    pending = sweep.with_predicate(lambda params: task_key(params) not in completed_keys)
+
+    # Dispatch the tasks longest first, with costs learned from the timings of earlier sweeps
+    timing_log = TimingLog('sweep_timings.jsonl')
+    recorded_timings = timing_log.load(task_type)
+    cost_model = CostModel().fit(recorded_timings)
+    tasks = schedule_longest_first(pending, cost_model)
+    num_tasks = len(tasks)
+    print(f"{num_tasks} of {sweep.num_combinations()} parameter combinations to run.")
+
+    num_processes = 14
+    if recorded_timings and tasks:
+        task_duration = sum(cost_model.predict(params) for params in tasks) / num_tasks
+    else:
+        task_duration = estimated_task_duration
+    chunksize = suggest_chunksize(num_tasks, num_processes, task_duration=task_duration)
+
+    idle_report = WorkerIdleReport()
+    instrumentation_reports = []
+    # Results are written to the database by a single writer thread in this process,
+    # so the simulation workers never wait on the database
+    with ResultWriter(sink, spill_path=spill_path) as writer:
+        # Initialize a pool of processes
+        with Pool(processes=num_processes) as pool:
+            # Use tqdm to show progress
+            for rows, params, timing, report in tqdm.tqdm(pool.imap_unordered(run_task, tasks, chunksize=chunksize), total=num_tasks):
+                for row in rows:
+                    writer.put(row)
+                timing_log.append(params, timing.end - timing.start, task_type)
+                idle_report.add(timing)
+                instrumentation_reports.append(report)
+    print(idle_report.summary())
+    instrumentation_report = merge_reports(instrumentation_reports)
+    if instrumentation_report is not None:
+        print(format_report(instrumentation_report))
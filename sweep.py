@@ -0,0 +1,257 @@
+import hashlib
+import itertools
+import json
+import math
+import numbers
+import os
+import time
+from collections import defaultdict, namedtuple
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Order of the values in a sweep parameter combination
+SWEEP_PARAMETERS = ('aircraft_arrival_rate',
+                    'passenger_arrival_rate',
+                    'charge_time',
+                    'num_park',
+                    'num_aircraft',
+                    'num_passenger',
+                    'seat_capacity',
+                    'tlof_feedback',
+                    'tlof_time',
+                    'stochastic',
+                    'blocking',
+                    'terminal_buffer_capacity',
+                    'no_pax_arrival',
+                    'seed')
+
+
+def parameter_key(parameters: Dict) -> str:
+    """
+    Returns a stable hash key of a parameter combination. The key does not depend on the
+    order of the parameters or on whether numbers are Python or NumPy scalars, so it can be
+    used to recognize finished runs across restarts.
+    """
+    canonical = {name: _canonical_value(value) for name, value in parameters.items()}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def configuration_key(parameters: Dict) -> str:
+    """
+    Returns the key of the configuration of a parameter combination in an adaptive sweep,
+    which runs it for as many seeds as it needs. The seed is left out and the mode is part of
+    the key, so it never equals the parameter_key of a single run.
+    """
+    configuration = {name: value for name, value in parameters.items() if name != 'seed'}
+    return parameter_key({**configuration, 'replications': 'adaptive'})
+
+
+class SweepSpec:
+    """
+    Parameter grid of a sweep. Combinations are generated lazily from the grid in
+    SWEEP_PARAMETERS order as parameter dicts, and only the ones that pass every predicate
+    are yielded, so infeasible or already finished combinations are never dispatched.
+    """
+    def __init__(self, grid: Dict[str, Sequence], predicates: Sequence[Callable[[Dict], bool]] = ()):
+        missing = [name for name in SWEEP_PARAMETERS if name not in grid]
+        if missing:
+            raise ValueError(f'Sweep grid is missing values for {missing}')
+        self.grid = {name: list(grid[name]) for name in SWEEP_PARAMETERS}
+        self.predicates = list(predicates)
+        self._count = None
+
+    def with_predicate(self, predicate: Callable[[Dict], bool]) -> 'SweepSpec':
+        """
+        Returns a copy of the sweep that also filters on the given predicate.
+        """
+        return SweepSpec(self.grid, self.predicates + [predicate])
+
+    def combinations(self) -> Iterator[Dict]:
+        """
+        Yields all combinations of the grid, feasible or not.
+        """
+        for values in itertools.product(*self.grid.values()):
+            yield dict(zip(SWEEP_PARAMETERS, values))
+
+    def __iter__(self) -> Iterator[Dict]:
+        for params in self.combinations():
+            if all(predicate(params) for predicate in self.predicates):
+                yield params
+
+    def num_combinations(self) -> int:
+        return math.prod(len(values) for values in self.grid.values())
+
+    def __len__(self):
+        # Exact number of tasks. Counting walks the grid once without materializing it.
+        if self._count is None:
+            self._count = sum(1 for _ in self)
+        return self._count
+
+
+def has_enough_park_capacity(params: Dict) -> bool:
+    """
+    Whether the parks can serve the arrival rate, i.e. 60 / charge_time * num_park is at
+    least aircraft_arrival_rate. Saturated combinations are left out of the sweep.
+    """
+    return 60 / params['charge_time'] * params['num_park'] >= params['aircraft_arrival_rate']
+
+
+def suggest_chunksize(num_tasks: int, num_workers: int, task_duration: float = None,
+                      target_chunk_duration: float = 0.5) -> int:
+    """
+    Suggests a Pool chunksize. Chunks are sized to take about target_chunk_duration seconds,
+    so that short tasks amortize the per-dispatch overhead, but never so large that there
+    are fewer than four chunks per worker to balance the load at the end of the sweep.
+    Without a task_duration estimate this falls back to the heuristic of Pool.map.
+    """
+    if num_tasks <= 0:
+        return 1
+    max_chunksize = max(1, num_tasks // (4 * num_workers))
+    if task_duration is None or task_duration <= 0:
+        return max_chunksize
+    return max(1, min(math.ceil(target_chunk_duration / task_duration), max_chunksize))
+
+
+def _canonical_value(value):
+    if isinstance(value, (bool, str)) or value is None:
+        return value
+    if hasattr(value, 'item'):
+        # NumPy scalar
+        value = value.item()
+        if isinstance(value, bool):
+            return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        # Integral floats hash like ints, so 50 and 50.0 are the same combination
+        return int(value) if value.is_integer() else repr(value)
+    raise TypeError(f'Cannot build a parameter key from {type(value).__name__} value {value!r}')
+
+
+def utilization(params: Dict) -> float:
+    """
+    Park utilization rho = aircraft_arrival_rate * charge_time / (60 * num_park), with the
+    arrival rate per hour and the charge time in minutes.
+    """
+    return params['aircraft_arrival_rate'] * params['charge_time'] / (60 * params['num_park'])
+
+
+def estimate_task_cost(params: Dict) -> float:
+    """
+    Prior estimate of the work in a simulation, in events. Rejected aircraft only cost an
+    arrival event, so the admitted fraction is bounded by the TLOF and park service rates.
+    """
+    tlof_rate = 60 / params['tlof_time']
+    if params['tlof_feedback']:
+        # Landings and take-offs share the one TLOF
+        tlof_rate /= 2
+    service_rate = min(tlof_rate, 60 / params['charge_time'] * params['num_park'])
+    admitted_fraction = min(1, service_rate / params['aircraft_arrival_rate'])
+    cost = params['num_aircraft'] * (1 + 4 * admitted_fraction)
+    if not params['no_pax_arrival']:
+        cost += 2 * params['num_passenger']
+    return cost
+
+
+class CostModel:
+    """
+    Predicts the wall-clock seconds of a simulation. The prior estimate_task_cost is scaled by
+    the seconds per event measured in earlier runs with a similar utilization, falling back to
+    the average over all recorded runs.
+    """
+    def __init__(self, bin_width: float = 0.1, max_utilization: float = 2):
+        self.bin_width = bin_width
+        self.max_utilization = max_utilization
+        self.seconds_per_event = {}
+        self.overall_seconds_per_event = None
+
+    def _bin(self, params: Dict) -> int:
+        return int(min(utilization(params), self.max_utilization) / self.bin_width)
+
+    def fit(self, timings: Iterable[Tuple[Dict, float]]) -> 'CostModel':
+        """
+        Fits the model to (params, seconds) pairs of finished simulations.
+        """
+        totals = defaultdict(lambda: [0.0, 0.0])
+        for params, seconds in timings:
+            total = totals[self._bin(params)]
+            total[0] += seconds
+            total[1] += estimate_task_cost(params)
+        self.seconds_per_event = {bin_: seconds / cost for bin_, (seconds, cost) in totals.items() if cost > 0}
+        total_seconds = sum(seconds for seconds, _ in totals.values())
+        total_cost = sum(cost for _, cost in totals.values())
+        self.overall_seconds_per_event = total_seconds / total_cost if total_cost > 0 else None
+        return self
+
+    def predict(self, params: Dict) -> float:
+        """
+        Predicted seconds of the simulation, or the prior cost in events if nothing was fitted.
+        """
+        cost = estimate_task_cost(params)
+        rate = self.seconds_per_event.get(self._bin(params), self.overall_seconds_per_event)
+        return cost * rate if rate is not None else cost
+
+
+def schedule_longest_first(tasks: Iterable[Dict], cost_model: CostModel) -> List[Dict]:
+    """
+    Orders the tasks by decreasing predicted cost, so that the slowest simulations start
+    first and the end of the sweep is not left to a few long tasks. This materializes the
+    feasible tasks.
+    """
+    return sorted(tasks, key=cost_model.predict, reverse=True)
+
+
+class TimingLog:
+    """
+    Append-only JSON-lines log of (params, seconds) of finished sweep tasks, used to fit the
+    CostModel of later sweeps. Each record is tagged with its task type, 'run' for a single
+    simulation or 'configuration' for all the replications of a configuration, so that the
+    durations of one kind never fit a model of the other.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, task_type: str = 'run') -> List[Tuple[Dict, float]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        # Untagged records of older sweeps may be of either kind, so they are skipped
+        return [(record['params'], record['seconds']) for record in records if record.get('task_type') == task_type]
+
+    def append(self, params: Dict, seconds: float, task_type: str = 'run'):
+        params = {name: value.item() if hasattr(value, 'item') else value for name, value in params.items()}
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'params': params, 'seconds': seconds, 'task_type': task_type}) + '\n')
+
+
+TaskTiming = namedtuple('TaskTiming', ['pid', 'start', 'end'])
+
+
+class WorkerIdleReport:
+    """
+    Collects the TaskTiming of every task to report how long each Pool worker was busy and
+    idle over the sweep.
+    """
+    def __init__(self):
+        self.start = time.time()
+        self.busy_time = defaultdict(float)
+        self.num_tasks = defaultdict(int)
+
+    def add(self, timing: TaskTiming):
+        self.busy_time[timing.pid] += timing.end - timing.start
+        self.num_tasks[timing.pid] += 1
+
+    def report(self) -> Dict[int, Dict[str, float]]:
+        wall_time = time.time() - self.start
+        return {pid: {'tasks': self.num_tasks[pid],
+                      'busy_time': busy_time,
+                      'idle_time': max(wall_time - busy_time, 0)}
+                for pid, busy_time in self.busy_time.items()}
+
+    def summary(self) -> str:
+        lines = []
+        for pid, stats in sorted(self.report().items()):
+            lines.append(f"Worker {pid}: {stats['tasks']} tasks, busy {stats['busy_time']:.1f} s, idle {stats['idle_time']:.1f} s")
+        return '\n'.join(lines)
@@ -0,0 +1,78 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from convergence import ConvergenceMonitor, mser_truncation
+from metrics import time_weighted_mean_variance
+from replications import METRIC_NAMES
+from sim_runner import run_simulation
+from time_series import SummaryTimeSeries, TimeSeries
+
+# Converges early for seed 1 after a warm-up of a few batches
+CONFIGURATION = dict(aircraft_arrival_rate=10, passenger_arrival_rate=80, charge_time=6, num_park=2,
+                     num_aircraft=3000, num_passenger=2000, seat_capacity=4, tlof_feedback=False, tlof_time=1,
+                     stochastic=True, blocking=True, terminal_buffer_capacity=50, no_pax_arrival=True, seed=1,
+                     convergence_tolerance=0.2)
+
+
+@pytest.mark.parametrize('num_transient', [0, 5, 20, 30])
+def test_mser_truncation_finds_a_step_change(num_transient):
+    rng = np.random.default_rng(num_transient)
+    observations = np.r_[np.full(num_transient, 10.0), np.zeros(100 - num_transient)] + rng.normal(0, 0.1, 100)
+    assert mser_truncation(observations) == num_transient
+
+
+def test_mser_truncation_searches_up_to_max_fraction():
+    observations = np.r_[np.full(30, 10.0), np.zeros(70)]
+    assert mser_truncation(observations) == 30
+    assert mser_truncation(observations, max_fraction=0.25) == 25
+    assert mser_truncation([3.0]) == 0
+
+
+def test_monitor_detects_warmup_and_converges():
+    tracker = TimeSeries()
+    tracker.record(0, 10)
+    monitor = ConvergenceMonitor({'queue': tracker}, batch_duration=1.0, min_batches=10)
+    for hour in range(1, 14):
+        if hour == 5:
+            tracker.record(4.5, 1)
+        monitor.observe(hour)
+    # Four batches at 10, one at 5.5 and eight at 1: too few batches after the warm-up
+    assert monitor.detected_warmup == 5
+    assert not monitor.has_converged()
+    for hour in (14, 15):
+        monitor.observe(hour)
+        assert monitor.has_converged() == (hour == 15)
+    assert monitor.estimates()['queue'] == (1, 0)
+
+
+def test_run_stops_on_convergence():
+    _, full_run = run_simulation(**CONFIGURATION, summary_only=True)
+    runs = [run_simulation(**CONFIGURATION, summary_only=summary_only, stop_on_convergence=True)[1]
+            for summary_only in (False, True)]
+    for system_metrics in runs:
+        assert system_metrics.sim.env.now < full_run.sim.env.now
+        assert system_metrics.warmup_period == system_metrics.sim.detected_warmup
+    traces, summary = runs
+    # The detected warm-up differs from the configured one, which summary traces used to keep
+    assert summary.warmup_period not in (0, summary.sim.warmup_period)
+    np.testing.assert_allclose([getattr(summary, name)() for name in METRIC_NAMES],
+                               [getattr(traces, name)() for name in METRIC_NAMES], rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('warmup_period', [0, 1, 2, 3, 5, 7, 100])
+def test_summary_statistics_after_any_cut(warmup_period):
+    rng = np.random.default_rng(0)
+    times = np.sort(np.round(rng.uniform(0.5, 10.5, 200), 1))
+    values = rng.integers(0, 10, 200).astype(np.float64)
+    summary = SummaryTimeSeries(warmup_period=5, cut_interval=1.0)
+    for time, value in zip(times.tolist(), values.tolist()):
+        summary.record(time, value)
+    np.testing.assert_allclose(summary.mean_variance(warmup_period),
+                               time_weighted_mean_variance(times, values, warmup_period), rtol=1e-9)
+    with pytest.raises(ValueError):
+        summary.mean_variance(warmup_period + 0.5)
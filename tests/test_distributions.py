@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distributions import DISTRIBUTIONS, make_distribution
+
+# A spec of every distribution in the registry
+SPECS = {
+    'exponential': 'exponential',
+    'deterministic': 'deterministic',
+    'erlang': {'name': 'erlang', 'k': 3},
+    'lognormal': {'name': 'lognormal', 'sigma': 0.8},
+    'empirical': {'name': 'empirical', 'bin_edges': [0.0, 0.05, 0.1, 0.2, 0.5], 'counts': [3, 10, 5, 1]},
+}
+
+
+def test_specs_cover_the_registry():
+    assert set(SPECS) == set(DISTRIBUTIONS)
+
+
+@pytest.mark.parametrize('name', sorted(SPECS))
+def test_block_draws_equal_scalar_draws(name):
+    distribution = make_distribution(SPECS[name], mean=0.1)
+    block = distribution.sample(np.random.default_rng(3), 1000)
+    rng = np.random.default_rng(3)
+    scalars = np.concatenate([distribution.sample(rng, 1) for _ in range(1000)])
+    np.testing.assert_array_equal(block, scalars)
+
+
+@pytest.mark.parametrize('name', sorted(SPECS))
+def test_sample_mean(name):
+    distribution = make_distribution(SPECS[name], mean=0.1)
+    samples = distribution.sample(np.random.default_rng(0), 200000)
+    assert samples.mean() == pytest.approx(distribution.mean, rel=0.02)
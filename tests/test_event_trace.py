@@ -0,0 +1,96 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import event_trace
+from event_trace import EVENT_DTYPE, SNAPSHOT_FIELDS, EventTrace, EventTraceWriter
+from metrics import time_weighted_mean_variance
+from sim_runner import run_simulation
+
+CONFIGURATION = dict(aircraft_arrival_rate=20, passenger_arrival_rate=60, charge_time=6, num_park=2,
+                     num_aircraft=300, num_passenger=1000, seat_capacity=4, tlof_feedback=True, tlof_time=1,
+                     stochastic=True, blocking=True, terminal_buffer_capacity=5, seed=0)
+
+
+def step_function(times, values):
+    """
+    The trace as a step function: the last record at every time, where the value changed.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    is_last = np.r_[times[1:] != times[:-1], True]
+    times, values = times[is_last], values[is_last]
+    changed = np.r_[True, values[1:] != values[:-1]]
+    return times[changed], values[changed]
+
+
+def padded(times, num_agents):
+    return np.r_[times, np.full(num_agents - len(times), np.nan)]
+
+
+@pytest.mark.parametrize('no_pax_arrival', [True, False])
+def test_trace_round_trip(tmp_path, no_pax_arrival):
+    path = str(tmp_path / 'events.bin')
+    _, system_metrics = run_simulation(**CONFIGURATION, no_pax_arrival=no_pax_arrival, event_trace_path=path)
+    simulation = system_metrics.sim
+    trace = EventTrace(path)
+    assert isinstance(trace.records, np.memmap)
+    assert len(trace) == simulation.event_trace.num_records
+    assert len(trace.events(event_trace.AIRCRAFT_REJECTED)) == simulation.rejected_aircraft_counter
+
+    in_memory = {name: simulation.queue_lengths[name] for name in SNAPSHOT_FIELDS if name != 'surface_aircraft_count'}
+    in_memory['surface_aircraft_count'] = simulation.surface_aircraft_count
+    for name in SNAPSHOT_FIELDS:
+        times, values = trace.queue_length(name)
+        expected_times, expected_values = step_function(in_memory[name].keys(), in_memory[name].values())
+        np.testing.assert_array_equal(step_function(times, values), (expected_times, expected_values), err_msg=name)
+        assert time_weighted_mean_variance(times, values) == \
+            pytest.approx(system_metrics.calculate_time_weighted_statistics(in_memory[name]), rel=1e-9, abs=1e-9)
+
+    aircraft = simulation.aircraft_records
+    num_aircraft = len(aircraft)
+    for event, expected in [(event_trace.AIRCRAFT_ARRIVAL, aircraft.arrival_time),
+                            (event_trace.PUSHBACK, aircraft.pushback_time),
+                            (event_trace.BOARDING, aircraft.departure_queue_exit_time),
+                            (event_trace.DEPARTURE, aircraft.departure_time)]:
+        np.testing.assert_array_equal(padded(trace.event_times(event), num_aircraft), expected,
+                                      err_msg=event_trace.EVENT_NAMES[event])
+    passengers = simulation.passenger_records
+    passenger_arrivals = trace.event_times(event_trace.PASSENGER_ARRIVAL, event_trace.PASSENGER)
+    assert (len(passenger_arrivals) > 0) != no_pax_arrival
+    np.testing.assert_array_equal(padded(passenger_arrivals, len(passengers)), passengers.arrival_time)
+
+    departed = int(np.flatnonzero(~np.isnan(aircraft.departure_time))[0])
+    timeline = trace.timeline(departed)
+    assert timeline['aircraft_arrival'] == aircraft.arrival_time[departed]
+    assert timeline['departure'] == aircraft.departure_time[departed]
+
+
+def test_writer_flushes_full_buffers(tmp_path):
+    path = str(tmp_path / 'events.bin')
+    with EventTraceWriter(path, buffer_size=3) as writer:
+        for index in range(7):
+            writer.record(index / 2, index % 3, 0, index, *range(index, index + len(SNAPSHOT_FIELDS)))
+        assert writer.num_records == 6
+    assert writer.num_records == 7
+    records = EventTrace(path).records
+    assert records.dtype == EVENT_DTYPE
+    np.testing.assert_array_equal(records['time'], np.arange(7) / 2)
+    np.testing.assert_array_equal(records['agent_id'], np.arange(7))
+    np.testing.assert_array_equal(records[SNAPSHOT_FIELDS[-1]], np.arange(7) + len(SNAPSHOT_FIELDS) - 1)
+
+
+def test_empty_trace(tmp_path):
+    path = str(tmp_path / 'events.bin')
+    EventTraceWriter(path).close()
+    trace = EventTrace(path)
+    assert len(trace) == 0
+    assert len(trace.event_times(event_trace.DEPARTURE)) == 0
+    times, values = trace.queue_length('aircraft_arrival_queue')
+    np.testing.assert_array_equal(times, [0.0])
+    with pytest.raises(ValueError):
+        trace.queue_length('terminal')
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_engine import TandemQueueSimulation
+from replications import METRIC_NAMES
+from sim_runner import run_simulation
+
+# Without TLOF feedback, blocking or a finite terminal buffer both engines use Lindley's
+# recursion when asked to
+INDEPENDENT_STAGES = dict(aircraft_arrival_rate=10, passenger_arrival_rate=80, charge_time=6, num_park=2,
+                          num_aircraft=500, num_passenger=2000, seat_capacity=4, tlof_feedback=False,
+                          tlof_time=1, stochastic=True, blocking=False, terminal_buffer_capacity=np.inf,
+                          seed=3, no_pax_arrival=True)
+
+
+@pytest.mark.parametrize('summary_only', [True, False])
+def test_recursions_match_vertiport_simulation(summary_only):
+    runs = []
+    for engine in ('fast', 'simpy'):
+        _, system_metrics = run_simulation(**INDEPENDENT_STAGES, summary_only=summary_only, engine=engine,
+                                           use_recursions=True)
+        runs.append(system_metrics)
+    fast, simpy_run = runs
+    assert fast.sim.stages_are_independent
+    assert simpy_run.sim.arrival_stage_is_independent
+    np.testing.assert_allclose([getattr(fast, name)() for name in METRIC_NAMES] + [fast.sim.env.now],
+                               [getattr(simpy_run, name)() for name in METRIC_NAMES] + [simpy_run.sim.env.now],
+                               rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_recursion_queues_are_never_negative(seed):
+    # Start times computed as end minus service time used to round to just before the arrival
+    simulation = TandemQueueSimulation(500, 0.1, 2, 1/60, 6.0, 4, True, np.inf, tlof_feedback=False, blocking=False,
+                                       seed=seed).run()
+    assert simulation.stages_are_independent
+    for name in ('aircraft_arrival_queue', 'park_queue_length'):
+        assert simulation.queue_lengths[name].values().min() >= 0, name
+    assert simulation.surface_aircraft_count.values().min() >= 0
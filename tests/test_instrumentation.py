@@ -0,0 +1,168 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import simpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation as instrumentation_module
+from instrumentation import Instrumentation, format_report, merge_reports
+from replications import METRIC_NAMES
+from sim_runner import run_simulation
+from time_series import SummaryTimeSeries, TimeSeries
+
+CONFIGURATION = dict(aircraft_arrival_rate=20, passenger_arrival_rate=60, charge_time=6, num_park=2,
+                     num_aircraft=200, num_passenger=600, seat_capacity=4, tlof_feedback=True, tlof_time=1,
+                     stochastic=True, blocking=True, terminal_buffer_capacity=5, no_pax_arrival=False, seed=0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    A perf_counter that advances by half a second at every call.
+    """
+    ticks = iter(np.arange(0, 1000, 0.5).tolist())
+    monkeypatch.setattr(instrumentation_module.time, 'perf_counter', lambda: next(ticks))
+
+
+def wait(env, *durations):
+    for duration in durations:
+        yield env.timeout(duration)
+
+
+def test_count_events():
+    instrumentation = Instrumentation()
+    env = simpy.Environment()
+
+    def process(env, durations):
+        for duration in durations:
+            try:
+                yield env.timeout(duration)
+            except simpy.Interrupt:
+                yield env.timeout(10)
+        return env.now
+
+    counted = instrumentation.count_events('moves', process)
+    finished = env.process(counted(env, [1, 2]))
+    interrupted = env.process(counted(env, [5]))
+    # Processes that are not wrapped are not counted
+    env.process(wait(env, 1))
+    env.run(until=0.5)
+    interrupted.interrupt()
+    env.run()
+    assert finished.value == 3
+    # The interrupted timeout and the one after it
+    assert interrupted.value == 10.5
+    assert instrumentation.process_events == {'moves': 4}
+
+
+def test_count_calls():
+    instrumentation = Instrumentation()
+    add = instrumentation.count_calls('pooling', lambda a, b: a + b)
+    assert [add(1, 2), add(3, b=4)] == [3, 7]
+    assert instrumentation.process_events == {'pooling': 2}
+
+
+def test_timed(clock):
+    instrumentation = Instrumentation()
+    square = instrumentation.timed('rng', lambda x: x * x)
+
+    def fail():
+        raise RuntimeError
+    failing = instrumentation.timed('rng', fail)
+    assert square(3) == 9
+    with pytest.raises(RuntimeError):
+        failing()
+    # Each call reads the clock twice, half a second apart, also when it raises
+    assert instrumentation.update_calls == {'rng': 2}
+    assert instrumentation.update_seconds == {'rng': 1.0}
+
+
+@pytest.mark.parametrize('series', [TimeSeries, SummaryTimeSeries])
+def test_time_tracker(series):
+    instrumentation = Instrumentation()
+    tracker = series()
+    tracker.record(0, 1)
+    instrumentation.time_tracker('queue_lengths', tracker)
+    tracker.record(1, 2)
+    tracker.update(2, -1)
+    assert instrumentation.update_calls == {'queue_lengths': 2}
+    assert (len(tracker), tracker.last_value) == (3, 1)
+
+
+def num_steps(env):
+    steps = 0
+    while env.peek() < float('inf'):
+        env.step()
+        steps += 1
+    return steps
+
+
+def test_report_and_merge(clock):
+    reference = simpy.Environment()
+    reference.process(wait(reference, 1, 2))
+    num_events = num_steps(reference)
+    instrumentation = Instrumentation()
+    env = simpy.Environment()
+    instrumentation.count_simpy_events(env)
+    env.process(wait(env, 1, 2))
+    instrumentation.start()
+    env.run()
+    instrumentation.stop()
+    instrumentation.stop()
+    report = instrumentation.report()
+    # Stopping twice counts the wall time once
+    assert report == {'process_events': {}, 'update_seconds': {}, 'update_calls': {}, 'simpy_events': num_events,
+                      'wall_time': 0.5, 'events_per_second': 2 * num_events, 'num_runs': 1}
+
+    other = {'process_events': {'arrival': 3}, 'update_seconds': {'rng': 0.25}, 'update_calls': {'rng': 5},
+             'simpy_events': 12, 'wall_time': 1.5, 'events_per_second': 8.0, 'num_runs': 1}
+    merged = merge_reports([report, None, other, other])
+    assert merged == {'process_events': {'arrival': 6}, 'update_seconds': {'rng': 0.5}, 'update_calls': {'rng': 10},
+                      'simpy_events': num_events + 24, 'wall_time': 3.5, 'num_runs': 3,
+                      'events_per_second': (num_events + 24) / 3.5}
+    assert merge_reports([None, None]) is None
+
+
+def test_format_report():
+    report = {'process_events': {'turnaround': 7, 'arrival': 3}, 'update_seconds': {'rng': 0.25, 'counters': 0.5},
+              'update_calls': {'rng': 5, 'counters': 8}, 'simpy_events': 20, 'wall_time': 2.0,
+              'events_per_second': 10.0, 'num_runs': 2}
+    assert format_report(report) == '\n'.join([
+        '2 runs, 20 SimPy events in 2.00 s (10 events/s)',
+        '  arrival process events: 3',
+        '  turnaround process events: 7',
+        '  counters: 0.500 s in 8 calls (25.0% of wall time)',
+        '  rng: 0.250 s in 5 calls (12.5% of wall time)'])
+
+
+def test_instrumented_run():
+    _, plain = run_simulation(**CONFIGURATION)
+    _, instrumented = run_simulation(**CONFIGURATION, instrument=True)
+    # Instrumentation only observes the run
+    assert [getattr(instrumented, name)() for name in METRIC_NAMES] == [getattr(plain, name)() for name in METRIC_NAMES]
+    report = instrumented.instrumentation_report()
+    assert set(report['process_events']) == {'arrival', 'turnaround', 'departure', 'passenger', 'pooling'}
+    assert set(report['update_calls']) == {'rng', 'counters', 'queue_lengths', 'surface_count'}
+    assert report['simpy_events'] > 0 and report['wall_time'] > 0
+    # Every record after the initial ones is timed
+    simulation = instrumented.sim
+    assert report['update_calls']['surface_count'] == len(simulation.surface_aircraft_count) - 1
+    queues = ('aircraft_arrival_queue', 'aircraft_departure_queue', 'passenger_queue', 'park_queue_length',
+              'passenger_service_queue')
+    assert report['update_calls']['queue_lengths'] == sum(len(simulation.queue_lengths[name]) for name in queues) - 4
+
+
+def test_uninstrumented_run_is_not_wrapped():
+    _, system_metrics = run_simulation(**CONFIGURATION)
+    simulation = system_metrics.sim
+    assert simulation.instrumentation is None
+    assert system_metrics.instrumentation_report() is None
+    # Wrapping replaces methods and samplers by instance attributes
+    for name in ('aircraft_arrival_process', 'departure_process', 'passenger_process', 'board', 'trace_event'):
+        assert name not in vars(simulation), name
+    assert getattr(simulation.tlof_sampler, '__name__', None) != 'timed_function'
+    assert 'record' not in vars(simulation.surface_aircraft_count)
+    assert 'step' not in vars(simulation.env)
@@ -0,0 +1,139 @@
+"""
+Regression tests of the recorded traces and time-weighted statistics against the simulation
+before TimeSeries, which kept a time -> value dict per trace and averaged it with a loop over
+the keys. A record at a time already among the latest keys was pushed 1/60/60/1000 hour
+later, else the dict key was overwritten.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import time_weighted_mean_variance
+from replications import METRIC_NAMES
+from sim_runner import run_simulation
+
+NUDGE = 1/60/60/1000
+
+BASE_PARAMS = dict(aircraft_arrival_rate=20, passenger_arrival_rate=60, charge_time=6, num_park=3,
+                   num_aircraft=400, num_passenger=1600, seat_capacity=4, tlof_feedback=False,
+                   tlof_time=1, stochastic=True, blocking=True, terminal_buffer_capacity=50, seed=0,
+                   no_pax_arrival=False)
+CONFIGURATIONS = [
+    {},
+    {'seed': 1, 'no_pax_arrival': True},
+    {'seed': 2, 'tlof_feedback': True, 'blocking': False},
+    {'seed': 3, 'stochastic': False, 'aircraft_arrival_rate': 28},
+    {'seed': 4, 'terminal_buffer_capacity': 5, 'aircraft_arrival_rate': 40},
+]
+
+
+def dict_trace(times, values, nudge=True):
+    """
+    Rebuilds a trace the old way, nudging records that tie with one of the latest three keys,
+    or overwriting them without nudge. Returns the trace and the number of nudges.
+    """
+    trace = {}
+    num_nudges = 0
+    for time, value in zip(times, values):
+        while nudge and time in list(trace.keys())[-3:]:
+            time += NUDGE
+            num_nudges += 1
+        trace[time] = value
+    return trace, num_nudges
+
+
+def nudge_tolerance(trace, num_nudges, warmup_period):
+    """
+    Bound on how far the nudges can move the mean and variance: each one moves a record
+    boundary by NUDGE hours, over a period of total_time hours.
+    """
+    keys = np.asarray(list(trace.keys()))
+    start = keys[np.searchsorted(keys, keys[0] + warmup_period, side='right')] if keys[-1] - keys[0] > warmup_period else keys[0]
+    total_time = keys[-1] - start
+    if total_time == 0:
+        return 0
+    scale = max(abs(value) for value in trace.values()) + 1
+    return 4 * num_nudges * NUDGE * scale**2 / total_time
+
+
+def dict_mean_variance(trace, warmup_period):
+    keys = list(trace.keys())
+    values = list(trace.values())
+    start_index = 0
+    for i, key in enumerate(keys):
+        if key - keys[0] > warmup_period:
+            start_index = i
+            break
+    if start_index == len(keys) - 1:
+        return 0, 0
+    total_time = keys[-1] - keys[start_index]
+    if total_time == 0:
+        return 0, 0
+    mean = sum(values[i] * (keys[i+1] - keys[i]) for i in range(start_index, len(keys) - 1)) / total_time
+    variance = sum((values[i] - mean)**2 * (keys[i+1] - keys[i]) for i in range(start_index, len(keys) - 1)) / total_time
+    return mean, variance
+
+
+def traces(simulation):
+    yield 'surface_aircraft_count', simulation.surface_aircraft_count
+    for name, trace in simulation.queue_lengths.items():
+        yield name, trace
+
+
+@pytest.mark.parametrize('overrides', CONFIGURATIONS)
+def test_time_weighted_statistics_match_dict_traces(overrides):
+    params = {**BASE_PARAMS, **overrides}
+    _, system_metrics = run_simulation(**params, is_logging=False, summary_only=False)
+    warmup_period = system_metrics.warmup_period
+    for name, trace in traces(system_metrics.sim):
+        if len(trace) == 0:
+            continue
+        actual = time_weighted_mean_variance(trace.keys(), trace.values(), warmup_period)
+        # Overwritten ties only drop intervals of zero length
+        overwritten, _ = dict_trace(trace.keys(), trace.values(), nudge=False)
+        np.testing.assert_allclose(actual, dict_mean_variance(overwritten, warmup_period), rtol=1e-9, atol=1e-12,
+                                   err_msg=name)
+        reference, num_nudges = dict_trace(trace.keys(), trace.values())
+        expected = dict_mean_variance(reference, warmup_period)
+        np.testing.assert_allclose(actual, expected, rtol=1e-9,
+                                   atol=nudge_tolerance(reference, num_nudges, warmup_period) + 1e-12, err_msg=name)
+
+
+# Metrics (in METRIC_NAMES order) and end time of deterministic runs of the baseline
+# dict-based simulation. Without random draws its runs are the same as today's, whatever
+# the seed, so these pin the recording of tied records and the warm-up cut.
+DETERMINISTIC_PARAMS = {**BASE_PARAMS, 'stochastic': False}
+BASELINE_RESULTS = [
+    ({},
+     [48.0, 14.962593516209365, 44.58000000000173, 2.5, 1.500554938956714, 65.14360000001544, 0.25,
+      1.2488898141293174], 20.05000000000015),
+    ({'no_pax_arrival': True},
+     [0.0, 19.850374064837755, 0.0, 249.50000000000048, -998.0000000000018, 0.0, 7499.916666666636,
+      116819.99999999962], 20.05000000000015),
+    ({'tlof_feedback': True, 'blocking': False},
+     [0.0, 14.962593516209365, 0.017777777778333587, 62.31555555555675, 1.762486126523854, 0.01746172839559782,
+      469.8004246913815, 1.441922343036196], 20.05000000000015),
+    ({'aircraft_arrival_rate': 28},
+     [133.0, 14.942643391521077, 49.72257898792791, 2.4999999999999996, 1.5008976660682225, 0.2004585941329881,
+      0.25, 1.2482038620591849], 14.321428571428687),
+    ({'terminal_buffer_capacity': 5, 'aircraft_arrival_rate': 40},
+     [243.0, 14.962593516209365, 4.869999999999417, 2.5033557046979866, 1.5016722408026753, 0.11310000000043406,
+      0.24998873924597942, 1.2533416852160508], 10.025000000000075),
+    ({'aircraft_arrival_rate': 60, 'tlof_feedback': True},
+     [248.0, 14.962593516209518, 49.7422680412371, 2.510204081632653, 1.505050505050505, 0.19130619619513228,
+      0.24989587671803404, 1.2600755024997448], 6.683333333333315),
+]
+
+
+@pytest.mark.parametrize('summary_only', [False, True])
+@pytest.mark.parametrize('overrides, expected_metrics, expected_end_time', BASELINE_RESULTS)
+def test_system_metrics_match_baseline(overrides, expected_metrics, expected_end_time, summary_only):
+    _, system_metrics = run_simulation(**{**DETERMINISTIC_PARAMS, **overrides}, is_logging=False,
+                                       summary_only=summary_only)
+    np.testing.assert_allclose([getattr(system_metrics, name)() for name in METRIC_NAMES], expected_metrics,
+                               rtol=1e-9, atol=1e-9)
+    assert system_metrics.sim.env.now == pytest.approx(expected_end_time, rel=1e-12)
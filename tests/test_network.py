@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import NetworkSimulation
+
+# The ring of network.py's demo: vertiports exchanging a fleet, with no arrivals from outside
+VERTIPORT = dict(aircraft_arrival_rate=0, passenger_arrival_rate=200, charge_time=6, num_park=4,
+                 num_aircraft=0, num_passenger=100000, seat_capacity=4, tlof_feedback=False, tlof_time=1,
+                 stochastic=True, blocking=True, terminal_buffer_capacity=50, no_pax_arrival=False,
+                 initial_aircraft=10)
+NUM_VERTIPORTS = 6
+FLIGHT_TIMES = [[0.25 + 0.1 * min(abs(i - j), NUM_VERTIPORTS - abs(i - j)) for j in range(NUM_VERTIPORTS)]
+                for i in range(NUM_VERTIPORTS)]
+
+
+def run_network(num_processes):
+    return NetworkSimulation([VERTIPORT] * NUM_VERTIPORTS, FLIGHT_TIMES, duration=20, seed=0,
+                             num_processes=num_processes).run()
+
+
+@pytest.fixture(scope='module')
+def runs():
+    return {num_processes: run_network(num_processes) for num_processes in (1, 2)}
+
+
+def test_results_do_not_depend_on_num_processes(runs):
+    single, parallel = runs[1], runs[2]
+    assert single.vertiports == parallel.vertiports
+    assert (single.num_windows, single.num_handoffs, single.num_in_flight) == \
+        (parallel.num_windows, parallel.num_handoffs, parallel.num_in_flight)
+
+
+@pytest.mark.parametrize('num_processes', [1, 2])
+def test_handoffs_are_conserved(runs, num_processes):
+    results = runs[num_processes]
+    assert results.num_handoffs > 0
+    assert results['aircraft_sent'].sum() == results.num_handoffs
+    # Every hand-off is either received or still in flight when the run ends
+    assert results['aircraft_sent'].sum() == results['aircraft_received'].sum() + results.num_in_flight
+    assert np.all(results['average_aircraft_throughput'] > 0)
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distributions import Deterministic, Empirical, Erlang, Exponential, LogNormal
+from random_streams import RANDOM_STREAMS, BufferedSampler, make_random_streams
+
+MEAN = 0.1
+EMPIRICAL = Empirical([0.0, 0.05, 0.1, 0.2, 0.5], [3, 10, 5, 1])
+
+
+def empirical_draw(rng):
+    bin_uniform, within_uniform = rng.random(), rng.random()
+    scaled = bin_uniform * len(EMPIRICAL.probabilities)
+    bin_ = int(scaled)
+    if scaled - bin_ >= EMPIRICAL.alias_probability[bin_]:
+        bin_ = EMPIRICAL.alias[bin_]
+    return EMPIRICAL.bin_edges[bin_] + EMPIRICAL.bin_widths[bin_] * within_uniform
+
+
+# Every distribution with its draw of a single variate straight from the Generator
+SCALAR_DRAWS = [
+    (Exponential(MEAN), lambda rng: rng.exponential(MEAN)),
+    (Deterministic(MEAN), lambda rng: MEAN),
+    (Erlang(MEAN, k=3), lambda rng: rng.gamma(3, MEAN / 3)),
+    (LogNormal(MEAN, sigma=0.8), lambda rng: rng.lognormal(np.log(MEAN) - 0.8 ** 2 / 2, 0.8)),
+    (EMPIRICAL, empirical_draw),
+]
+
+
+@pytest.mark.parametrize('block_size', [1, 4096])
+@pytest.mark.parametrize('distribution, scalar_draw', SCALAR_DRAWS, ids=lambda value: type(value).__name__)
+def test_sampler_is_bit_identical_to_scalar_draws(distribution, scalar_draw, block_size):
+    sampler = distribution.sampler(np.random.default_rng(11), block_size=block_size)
+    rng = np.random.default_rng(11)
+    # More than one block
+    num_draws = 5000
+    assert [sampler() for _ in range(num_draws)] == [float(scalar_draw(rng)) for _ in range(num_draws)]
+
+
+def test_buffered_sampler_draws_blocks():
+    sizes = []
+
+    def draw_block(size):
+        sizes.append(size)
+        return np.arange(size, dtype=np.float64)
+    sampler = BufferedSampler(draw_block, block_size=3)
+    assert [sampler() for _ in range(7)] == [0, 1, 2, 0, 1, 2, 0]
+    assert sizes == [3, 3, 3]
+
+
+def test_streams_depend_on_the_seed_and_name_only():
+    streams = make_random_streams(5)
+    assert list(streams) == list(RANDOM_STREAMS)
+    again = make_random_streams(np.random.SeedSequence(5))
+    for name in RANDOM_STREAMS:
+        assert streams[name].random() == again[name].random()
+    assert streams['arrivals'].random() != streams['tlof'].random()
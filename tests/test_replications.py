@@ -0,0 +1,121 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_engine import TandemQueueSimulation
+from metrics import SystemMetrics
+from replications import (METRIC_NAMES, ReplicationBatch, ReplicationResults, confidence_interval, run_until_precise,
+                          t_critical_value)
+from sim_runner import run_replication_batch, run_simulation
+
+SEEDS = [0, 1, 2, 3]
+# run_simulation parameters of a configuration without passengers
+CONFIGURATION = dict(aircraft_arrival_rate=25, passenger_arrival_rate=10000, charge_time=6.0, num_park=3,
+                     num_aircraft=400, num_passenger=10000, seat_capacity=4, tlof_feedback=False, tlof_time=1,
+                     stochastic=True, blocking=False, terminal_buffer_capacity=np.inf, no_pax_arrival=True)
+
+
+def simulation_parameters(params):
+    return dict(num_aircraft=params['num_aircraft'],
+                aircraft_mean_interarrival_time=1/params['aircraft_arrival_rate'],
+                num_park=params['num_park'],
+                tlof_mean_service_time=params['tlof_time']/60,
+                charge_mean_service_time=params['charge_time']/60,
+                seat_capacity=params['seat_capacity'],
+                stochastic=params['stochastic'],
+                terminal_buffer_capacity=params['terminal_buffer_capacity'],
+                tlof_feedback=params['tlof_feedback'],
+                blocking=params['blocking'])
+
+
+def metric_values(metrics):
+    return [getattr(metrics, name)() for name in METRIC_NAMES]
+
+
+def test_vectorized_batch_matches_single_runs():
+    batch = ReplicationBatch(SEEDS, **simulation_parameters(CONFIGURATION), use_recursions=True)
+    assert batch.is_vectorized
+    results = batch.run()
+    for seed, metrics in zip(results.seeds, results):
+        simulation = TandemQueueSimulation(**simulation_parameters(CONFIGURATION), seed=seed, summary_only=True,
+                                           use_recursions=True).run()
+        np.testing.assert_allclose(metric_values(metrics), metric_values(SystemMetrics(simulation)), rtol=1e-9, atol=1e-9,
+                                   err_msg=f'seed {seed}')
+
+
+@pytest.mark.parametrize('overrides', [{}, {'blocking': True, 'terminal_buffer_capacity': 50}, {'tlof_feedback': True}])
+def test_batch_matches_run_simulation(overrides):
+    params = {**CONFIGURATION, **overrides}
+    replications, results = run_replication_batch(**params, seeds=SEEDS)
+    assert results.seeds == SEEDS
+    for parameters, metrics in replications:
+        for engine in ('fast', 'simpy'):
+            _, system_metrics = run_simulation(**parameters, summary_only=True, engine=engine)
+            np.testing.assert_allclose(metric_values(metrics), metric_values(system_metrics), rtol=1e-9, atol=1e-9,
+                                       err_msg=f"seed {parameters['seed']}, {engine} engine")
+
+
+def test_batch_uses_recursions_only_when_asked_to():
+    assert not ReplicationBatch(SEEDS, **simulation_parameters(CONFIGURATION)).is_vectorized
+    coupled = {**CONFIGURATION, 'blocking': True}
+    assert not ReplicationBatch(SEEDS, **simulation_parameters(coupled), use_recursions=True).is_vectorized
+
+
+def test_confidence_interval():
+    mean, half_width = confidence_interval([1, 2, 3, 4, 5])
+    assert mean == 3
+    assert half_width == pytest.approx(2.776 * np.sqrt(2.5) / np.sqrt(5))
+    assert confidence_interval([4.0]) == (4.0, np.inf)
+    # Beyond the table the critical value tends to the normal quantile
+    assert t_critical_value(0.95, 30) == 2.042
+    assert 1.960 < t_critical_value(0.95, 1000) < 1.963
+    with pytest.raises(ValueError):
+        t_critical_value(0.8, 10)
+
+
+def fake_run_seeds(values, calls):
+    """
+    run_seeds of run_until_precise whose replication of seed s has every metric at values[s].
+    """
+    def run_seeds(seeds):
+        calls.append(list(seeds))
+        return ReplicationResults(seeds, {name: np.array([values[seed] for seed in seeds], dtype=np.float64)
+                                          for name in METRIC_NAMES})
+    return run_seeds
+
+
+def test_run_until_precise_stops_at_the_target_half_width():
+    rng = np.random.default_rng(0)
+    values = 10 + rng.normal(0, 1, 100)
+    calls = []
+    results = run_until_precise(fake_run_seeds(values, calls), range(100), relative_precision=0.05,
+                                min_replications=5, batch_size=5)
+    num_run = len(results)
+    assert 5 < num_run < 100
+    assert calls == [list(range(start, start + 5)) for start in range(0, num_run, 5)]
+    targets = ('average_aircraft_throughput', 'average_terminal_queue_length')
+    assert results.is_precise(targets, 0.05)
+    # One batch fewer was not precise enough
+    _, half_width = confidence_interval(values[:num_run - 5])
+    assert half_width > 0.05 * abs(values[:num_run - 5].mean())
+
+
+def test_run_until_precise_stops_at_the_last_seed():
+    values = np.tile([0.0, 100.0], 6)
+    calls = []
+    results = run_until_precise(fake_run_seeds(values, calls), range(12), relative_precision=0.01,
+                                min_replications=5, batch_size=5)
+    assert results.seeds == list(range(12))
+    assert calls == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10, 11]]
+    assert not results.is_precise(('average_aircraft_throughput',), 0.01)
+
+
+def test_run_until_precise_stops_after_min_replications_of_constant_metrics():
+    calls = []
+    results = run_until_precise(fake_run_seeds(np.ones(30), calls), range(30), min_replications=8, batch_size=5)
+    assert len(results) == 8
+    assert calls == [list(range(8))]
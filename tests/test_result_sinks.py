@@ -0,0 +1,247 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_sinks import (RESULT_COLUMN_NAMES, RESULT_TABLE, RUN_KEY_INDEX, ResultWriter, SQLiteResultSink, load_spilled_results,
+                          replay_spilled_results, unique_rows)
+
+
+def make_row(run_key, seed=0):
+    row = {name: 0 for name in RESULT_COLUMN_NAMES}
+    row.update(run_key=run_key, seed=seed, num_replications=None, configuration_key=None)
+    return row
+
+
+def write_spill_file(path, rows):
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+
+
+def stored_keys(sink):
+    return sorted(key for key, in sink.conn.execute(f'SELECT run_key FROM {RESULT_TABLE}'))
+
+
+def test_sqlite_sink_stores_each_run_once(tmp_path):
+    sink = SQLiteResultSink(str(tmp_path / 'results.db'))
+    for row in [make_row('a'), make_row('b', seed=1), make_row('a', seed=2)]:
+        sink.write(row)
+    sink.flush()
+    # A resumed configuration writes its rows again
+    sink.write(make_row('b', seed=3))
+    sink.flush()
+    assert stored_keys(sink) == ['a', 'b']
+    assert sink.conn.execute(f"SELECT seed FROM {RESULT_TABLE} WHERE run_key = 'b'").fetchall() == [(1,)]
+    sink.close()
+
+
+def test_unique_rows_keeps_the_last_row_of_each_run():
+    rows = [make_row('a'), make_row(None, seed=1), make_row('b', seed=2), make_row('a', seed=3), make_row(None, seed=4)]
+    assert [(row['run_key'], row['seed']) for row in unique_rows(rows)] == [('a', 3), (None, 1), ('b', 2), (None, 4)]
+
+
+def test_replay_writes_runs_spilled_twice_in_one_batch(tmp_path):
+    spill_path = str(tmp_path / 'spilled.jsonl')
+    # Two failed sweeps spilled the same configuration
+    write_spill_file(spill_path, [make_row('a'), make_row('b', seed=1), make_row('a'), make_row('b', seed=1)])
+    sink = SQLiteResultSink(str(tmp_path / 'results.db'))
+    batches = []
+    write_rows = sink._write_rows
+
+    def record_batch(rows):
+        batches.append([row['run_key'] for row in rows])
+        write_rows(rows)
+    sink._write_rows = record_batch
+    assert replay_spilled_results(sink, spill_path) == 4
+    assert batches == [['a', 'b']]
+    assert stored_keys(sink) == ['a', 'b']
+    sink.close()
+
+
+def test_sqlite_sink_completes_configurations_once_all_replications_are_stored(tmp_path):
+    sink = SQLiteResultSink(str(tmp_path / 'results.db'))
+    # A sweep of single runs stored the first seed
+    sink.write(make_row('a0'))
+    sink.flush()
+    assert sink.completed_configuration_keys() == set()
+    # An adaptive configuration reruns it with two more seeds, and is interrupted
+    configuration_rows = [{**make_row(key, seed), 'num_replications': 3, 'configuration_key': 'a'}
+                          for seed, key in enumerate(['a0', 'a1', 'a2'])]
+    sink.write(configuration_rows[1])
+    sink.flush()
+    assert sink.completed_configuration_keys() == set()
+    for row in configuration_rows:
+        sink.write(row)
+    sink.flush()
+    assert sink.completed_configuration_keys() == {'a'}
+    assert sink.conn.execute(f'SELECT run_key, num_replications, configuration_key FROM {RESULT_TABLE} ORDER BY id').fetchall() == \
+        [('a0', 3, 'a'), ('a1', 3, 'a'), ('a2', 3, 'a')]
+    # Single runs written again keep the replication columns
+    sink.write(make_row('a1', seed=1))
+    sink.flush()
+    assert sink.completed_configuration_keys() == {'a'}
+    sink.close()
+
+
+def test_sqlite_sink_removes_duplicates_of_older_tables(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    sink = SQLiteResultSink(db_path)
+    sink.conn.execute(f'DROP INDEX {RUN_KEY_INDEX}')
+    sink.conn.executemany(f'INSERT INTO {RESULT_TABLE} (run_key, seed) VALUES (?, ?)', [('a', 0), ('a', 1), (None, 2), (None, 3)])
+    sink.conn.commit()
+    sink.close()
+    sink = SQLiteResultSink(db_path)
+    assert sink.conn.execute(f'SELECT run_key, seed FROM {RESULT_TABLE} ORDER BY id').fetchall() == [('a', 0), (None, 2), (None, 3)]
+    sink.close()
+
+
+def test_sqlite_sink_removes_duplicates_only_when_adding_the_index(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'results.db')
+    SQLiteResultSink(db_path).close()
+    statements = []
+    connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+    monkeypatch.setattr(sqlite3, 'connect', traced_connect)
+    SQLiteResultSink(db_path).close()
+    assert statements and not any(statement.startswith('DELETE') for statement in statements)
+
+
+def test_replay_spilled_results_writes_rows_and_removes_file(tmp_path):
+    spill_path = str(tmp_path / 'spilled.jsonl')
+    row = make_row('a')
+    # Rows spilled by older versions may miss newer columns
+    del row['num_replications']
+    write_spill_file(spill_path, [row, make_row('b')])
+    sink = SQLiteResultSink(str(tmp_path / 'results.db'))
+    assert replay_spilled_results(sink, spill_path) == 2
+    assert not os.path.exists(spill_path)
+    assert sink.completed_keys() == {'a', 'b'}
+    assert replay_spilled_results(sink, spill_path) == 0
+    sink.close()
+
+
+def test_replay_spilled_results_keeps_file_on_failure(tmp_path):
+    spill_path = str(tmp_path / 'spilled.jsonl')
+    write_spill_file(spill_path, [make_row('a')])
+    sink = SQLiteResultSink(str(tmp_path / 'results.db'))
+
+    def fail(rows):
+        raise RuntimeError('database is down')
+    sink._write_rows = fail
+    with pytest.raises(RuntimeError):
+        replay_spilled_results(sink, spill_path)
+    assert os.path.exists(spill_path)
+    assert sink.buffer == []
+    sink.close()
+
+
+class FailingSink(SQLiteResultSink):
+    """
+    SQLite sink whose writes fail, counting the attempts.
+    """
+    def __init__(self, db_path, batch_size=1):
+        super().__init__(db_path, batch_size=batch_size)
+        self.num_attempts = 0
+
+    def _write_rows(self, rows):
+        self.num_attempts += 1
+        raise RuntimeError('database is down')
+
+
+def test_result_writer_spills_rows_after_the_sink_failed(tmp_path):
+    spill_path = str(tmp_path / 'spilled.jsonl')
+    sink = FailingSink(str(tmp_path / 'results.db'))
+    with ResultWriter(sink, max_retries=2, retry_delay=0, spill_path=spill_path) as writer:
+        for key in 'abc':
+            writer.put(make_row(key))
+    # The first row is tried and retried, the later ones go straight to the spill file
+    assert sink.num_attempts == 3
+    assert writer.num_spilled == 3
+    assert [row['run_key'] for row in load_spilled_results(spill_path)] == ['a', 'b', 'c']
+
+
+class FlakySink(FailingSink):
+    """
+    SQLite sink whose first num_failures writes fail.
+    """
+    def __init__(self, db_path, num_failures, batch_size=1):
+        super().__init__(db_path, batch_size=batch_size)
+        self.num_failures = num_failures
+
+    def _write_rows(self, rows):
+        if self.num_attempts < self.num_failures:
+            # Counts the attempt and fails
+            super()._write_rows(rows)
+        SQLiteResultSink._write_rows(self, rows)
+
+
+def test_result_writer_tries_the_sink_again_after_the_recovery_delay(tmp_path):
+    spill_path = str(tmp_path / 'spilled.jsonl')
+    sink = FlakySink(str(tmp_path / 'results.db'), num_failures=3)
+    with ResultWriter(sink, max_retries=1, retry_delay=0, spill_path=spill_path, recovery_delay=0) as writer:
+        for key in 'abcd':
+            writer.put(make_row(key))
+    # a fails with its retry, b fails its single attempt and c is written
+    assert [row['run_key'] for row in load_spilled_results(spill_path)] == ['a', 'b']
+    assert not writer.sink_failed
+    check = SQLiteResultSink(str(tmp_path / 'results.db'))
+    assert stored_keys(check) == ['c', 'd']
+    check.close()
+
+
+def test_result_writer_probes_a_batched_sink_with_a_flush(tmp_path):
+    spill_path = str(tmp_path / 'spilled.jsonl')
+    sink = FlakySink(str(tmp_path / 'results.db'), num_failures=3, batch_size=10)
+    writer = ResultWriter(sink, max_retries=1, retry_delay=0, spill_path=spill_path, recovery_delay=0)
+    # The final flush of a and b fails with its retry
+    writer.sink.write(make_row('a'))
+    writer._write(make_row('b'))
+    writer._with_retries(sink.flush)
+    assert (sink.num_attempts, writer.sink_failed) == (2, True)
+    # Each probe flushes at once, and fails once, without retries
+    writer._write(make_row('c'))
+    assert (sink.num_attempts, writer.sink_failed) == (3, True)
+    writer._write(make_row('d'))
+    assert (sink.num_attempts, writer.sink_failed) == (3, False)
+    # Rows are buffered again once a probe has flushed
+    writer._write(make_row('e'))
+    assert sink.buffer == [make_row('e')]
+    sink.close()
+    assert [row['run_key'] for row in load_spilled_results(spill_path)] == ['a', 'b', 'c']
+    check = SQLiteResultSink(str(tmp_path / 'results.db'))
+    assert stored_keys(check) == ['d', 'e']
+    check.close()
+
+
+def test_result_writer_keeps_consuming_when_spilling_fails(tmp_path):
+    sink = FailingSink(str(tmp_path / 'results.db'))
+    writer = ResultWriter(sink, max_queue_size=1, max_retries=0, retry_delay=0,
+                          spill_path=str(tmp_path / 'missing' / 'spilled.jsonl')).start()
+    for key in 'abcd':
+        writer.put(make_row(key))
+    writer.close()
+    assert writer.num_spilled == 0
+
+
+def test_result_writer_raises_the_error_that_stopped_it(tmp_path):
+    sink = FailingSink(str(tmp_path / 'results.db'), batch_size=10)
+    writer = ResultWriter(sink, max_retries=0, retry_delay=0, spill_path=str(tmp_path / 'missing' / 'spilled.jsonl'))
+    with pytest.raises(RuntimeError, match='not running'):
+        writer.put(make_row('a'))
+    writer.start()
+    writer.put(make_row('a'))
+    # The final flush fails and so does spilling its rows
+    with pytest.raises(RuntimeError) as error:
+        writer.close()
+    assert isinstance(error.value.__cause__, FileNotFoundError)
+    with pytest.raises(RuntimeError, match='not running'):
+        writer.put(make_row('b'))
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sweep import TimingLog, configuration_key, parameter_key
+
+
+def test_timing_log_keeps_task_types_apart(tmp_path):
+    log = TimingLog(str(tmp_path / 'timings.jsonl'))
+    assert log.load() == []
+    log.append({'num_aircraft': np.int64(100)}, 1.5)
+    log.append({'num_aircraft': 100}, 12.0, task_type='configuration')
+    with open(log.path, 'a') as f:
+        f.write('{"params": {"num_aircraft": 100}, "seconds": 3.0}\n')
+    assert log.load() == [({'num_aircraft': 100}, 1.5)]
+    assert log.load('configuration') == [({'num_aircraft': 100}, 12.0)]
+
+
+def test_configuration_key_differs_from_run_keys():
+    params = {'num_aircraft': 100, 'num_park': 3, 'seed': 0}
+    key = configuration_key(params)
+    assert key == configuration_key({**params, 'seed': 4})
+    assert key != parameter_key(params)
+    assert key != parameter_key({name: value for name, value in params.items() if name != 'seed'})
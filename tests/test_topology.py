@@ -0,0 +1,99 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import simpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resource_pools import IndexedResourcePool
+from sim_runner import run_simulation
+from topology import StandGroup, VertiportTopology, make_topology
+
+CONFIGURATION = dict(aircraft_arrival_rate=20, passenger_arrival_rate=10000, charge_time=12, num_park=None,
+                     num_aircraft=400, num_passenger=10000, seat_capacity=4, tlof_feedback=False, tlof_time=1,
+                     stochastic=True, blocking=True, terminal_buffer_capacity=50, no_pax_arrival=True, seed=0)
+STAND_GROUPS = [{'name': 'slow', 'num_stands': 2}, {'name': 'fast', 'num_stands': 2, 'charge_rate': 3},
+                {'name': 'medium', 'num_stands': 2, 'charge_rate': 1.5}]
+
+
+def stand_pool(topology):
+    return IndexedResourcePool(simpy.Environment(), topology.num_stands, preferences=topology.stand_preferences())
+
+
+def granted_stands(pool, origins):
+    return [pool.request(origin=origin).unit for origin in origins]
+
+
+@pytest.mark.parametrize('assignment, expected', [('in_order', [0, 1, 2, 3, 4, 5]),
+                                                  ('fastest_charger', [2, 3, 4, 5, 0, 1])])
+def test_assignment_ignoring_pads(assignment, expected):
+    topology = make_topology({'num_arrival_pads': 2, 'stand_groups': STAND_GROUPS, 'assignment': assignment})
+    pool = stand_pool(topology)
+    requests = [pool.request(origin=index % 2) for index in range(6)]
+    assert [request.unit for request in requests] == expected
+    # A released stand is the first choice again
+    pool.release(requests[1])
+    assert granted_stands(pool, [0]) == [expected[1]]
+
+
+def test_nearest_pad_assignment():
+    # Pads at 1/4 and 3/4 of the apron, stands at 1/6, 1/2 and 5/6
+    topology = VertiportTopology(num_arrival_pads=2, stand_groups=[StandGroup('park', 3)], assignment='nearest_pad')
+    pool = stand_pool(topology)
+    first, second = pool.request(origin=1), pool.request(origin=1)
+    assert (first.unit, second.unit) == (2, 1)
+    assert granted_stands(pool, [0]) == [0]
+    pool.release(second)
+    pool.release(first)
+    assert granted_stands(pool, [0, 0]) == [1, 2]
+
+
+def test_unknown_assignment_policy():
+    with pytest.raises(ValueError, match='assignment policy'):
+        VertiportTopology(stand_groups=[StandGroup('park', 3)], assignment='random')
+
+
+def test_release_of_a_request_that_was_never_granted():
+    env = simpy.Environment()
+    pool = IndexedResourcePool(env, 1)
+    holder, cancelled, waiting = pool.request(), pool.request(), pool.request()
+    assert holder.unit == 0 and pool.queue_length == 2
+    pool.release(cancelled)
+    assert pool.queue_length == 1 and pool.count == 1
+    pool.release(holder)
+    env.run()
+    assert waiting.unit == 0
+    assert not cancelled.triggered and cancelled.unit is None
+    assert pool.queue_length == 0 and pool.count == 1
+
+
+def test_utilization():
+    env = simpy.Environment()
+    pool = IndexedResourcePool(env, 2)
+
+    def hold(duration):
+        with pool.request() as request:
+            yield request
+            yield env.timeout(duration)
+
+    env.process(hold(2))
+    env.run(until=4)
+    assert pool.utilization([0]) == 0.5
+    assert pool.utilization([1]) == 0
+    assert pool.utilization() == 0.25
+
+
+def test_stand_group_utilization():
+    topology = {'num_arrival_pads': 2, 'stand_groups': STAND_GROUPS, 'assignment': 'fastest_charger'}
+    _, system_metrics = run_simulation(**CONFIGURATION, topology=topology, summary_only=True)
+    utilization = system_metrics.stand_group_utilization()
+    assert list(utilization) == ['slow', 'fast', 'medium']
+    assert all(0 < value <= 1 for value in utilization.values())
+    # The fastest chargers are offered first
+    assert utilization['fast'] > utilization['medium'] > utilization['slow']
+    # Equal groups of stands average to the utilization of all of them
+    assert np.mean(list(utilization.values())) == pytest.approx(system_metrics.sim.stands.utilization())
+    _, fast_engine = run_simulation(**{**CONFIGURATION, 'num_park': 6}, summary_only=True, engine='fast')
+    assert fast_engine.stand_group_utilization() == {}
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from replications import METRIC_NAMES
+from sim_runner import run_simulation
+
+# Without TLOF feedback, blocking or a finite terminal buffer the landings are computed with
+# Lindley's recursion
+INDEPENDENT_ARRIVALS = dict(aircraft_arrival_rate=25, passenger_arrival_rate=80, charge_time=6, num_park=3,
+                            num_aircraft=600, num_passenger=2000, seat_capacity=4, tlof_feedback=False,
+                            tlof_time=1, stochastic=True, blocking=False, terminal_buffer_capacity=np.inf,
+                            seed=7, no_pax_arrival=False, is_logging=False)
+
+
+@pytest.mark.parametrize('no_pax_arrival', [False, True])
+@pytest.mark.parametrize('summary_only', [True, False])
+def test_recursive_arrivals_match_event_arrivals(no_pax_arrival, summary_only):
+    # With deterministic TLOF times the order of the TLOF draws does not matter
+    params = {**INDEPENDENT_ARRIVALS, 'no_pax_arrival': no_pax_arrival, 'tlof_distribution': 'deterministic'}
+    runs = []
+    for use_recursions in (True, False):
+        _, system_metrics = run_simulation(**params, summary_only=summary_only, use_recursions=use_recursions)
+        runs.append(system_metrics)
+    recursive, event_driven = runs
+    assert recursive.sim.arrival_stage_is_independent
+    assert not event_driven.sim.arrival_stage_is_independent
+    np.testing.assert_allclose([getattr(recursive, name)() for name in METRIC_NAMES] + [recursive.sim.env.now],
+                               [getattr(event_driven, name)() for name in METRIC_NAMES] + [event_driven.sim.env.now],
+                               rtol=1e-12, atol=1e-12)
+    if not summary_only:
+        for field in recursive.sim.aircraft_records.table.dtype.names:
+            np.testing.assert_allclose(recursive.sim.aircraft_records.table[field],
+                                       event_driven.sim.aircraft_records.table[field], rtol=1e-12, atol=1e-12,
+                                       err_msg=field)
+
+
+@pytest.mark.parametrize('overrides', [{'blocking': True}, {'tlof_feedback': True}, {'terminal_buffer_capacity': 50}])
+def test_coupled_arrivals_use_events(overrides):
+    _, system_metrics = run_simulation(**{**INDEPENDENT_ARRIVALS, **overrides}, summary_only=True, use_recursions=True)
+    assert not system_metrics.sim.arrival_stage_is_independent
+
+
+def test_recursions_are_opt_in():
+    _, system_metrics = run_simulation(**INDEPENDENT_ARRIVALS, summary_only=True)
+    assert not system_metrics.sim.arrival_stage_is_independent
+
+
+def test_instrumented_arrivals_use_events():
+    _, system_metrics = run_simulation(**INDEPENDENT_ARRIVALS, summary_only=True, instrument=True, use_recursions=True)
+    assert not system_metrics.sim.arrival_stage_is_independent
+    report = system_metrics.instrumentation_report()
+    assert report['process_events']['arrival'] > INDEPENDENT_ARRIVALS['num_aircraft']
+
+
+TOPOLOGY = {'num_arrival_pads': 2, 'stand_groups': [{'name': 'fast', 'num_stands': 2, 'charge_rate': 2},
+                                                    {'name': 'slow', 'num_stands': 3}]}
+
+
+def test_topology_sets_the_recorded_num_park():
+    params = {**INDEPENDENT_ARRIVALS, 'blocking': True, 'terminal_buffer_capacity': 50, 'topology': TOPOLOGY}
+    parameters, system_metrics = run_simulation(**{**params, 'num_park': None}, summary_only=True)
+    assert parameters['num_park'] == system_metrics.sim.num_park == 5
+    parameters, _ = run_simulation(**{**params, 'num_park': 5}, summary_only=True)
+    assert parameters['num_park'] == 5
+    with pytest.raises(ValueError, match='num_park'):
+        run_simulation(**{**params, 'num_park': 3}, summary_only=True)
@@ -0,0 +1,301 @@
+import math
+from bisect import bisect_right
+from typing import Tuple
+import numpy as np
+
+
+class TimeSeries:
+    """
+    Append-only recorder for a piecewise-constant (time, value) trace.
+
+    Records are stored in preallocated NumPy float64 columns that grow by doubling,
+    and the latest value is cached so that incremental updates are O(1).
+    Several records may share the same simulated time; they are kept in the order
+    they were made and the position of a record is its sequence number.
+    keys(), values(), items() and lookup by time give a read view that is compatible
+    with the time -> value dicts the trackers used to be.
+    """
+    def __init__(self, initial_capacity: int = 1024):
+        self._times = np.empty(initial_capacity, dtype=np.float64)
+        self._values = np.empty(initial_capacity, dtype=np.float64)
+        self._size = 0
+        self.last_time = None
+        self.last_value = 0
+        # Area under the trace up to the record at _integrated_index, advanced on demand
+        self._integral = 0.0
+        self._integrated_index = 0
+
+    def record(self, time: float, value: float) -> int:
+        """
+        Records the value of the trace at the given time and returns the sequence
+        number of the record.
+        """
+        if self._size == len(self._times):
+            self._grow()
+        sequence = self._size
+        self._times[sequence] = time
+        self._values[sequence] = value
+        self._size += 1
+        self.last_time = time
+        self.last_value = value
+        return sequence
+
+    def update(self, time: float, change: float) -> int:
+        """
+        Records the latest value plus the given change at the given time.
+        """
+        return self.record(time, self.last_value + change)
+
+    def extend(self, times: np.ndarray, values: np.ndarray):
+        """
+        Appends many records at once. times must be sorted and not precede the latest record.
+        """
+        num_records = len(times)
+        if num_records == 0:
+            return
+        while self._size + num_records > len(self._times):
+            self._grow()
+        self._times[self._size:self._size + num_records] = times
+        self._values[self._size:self._size + num_records] = values
+        self._size += num_records
+        self.last_time = float(self._times[self._size - 1])
+        self.last_value = float(self._values[self._size - 1])
+
+    def integral(self, until: float) -> float:
+        """
+        Area under the trace from its first record to until, which must not precede the
+        latest record. Only the records made since the previous call are integrated.
+        """
+        if self._size == 0:
+            return 0.0
+        last_index = self._size - 1
+        if last_index > self._integrated_index:
+            start = self._integrated_index
+            self._integral += float(np.dot(self._values[start:last_index], np.diff(self._times[start:last_index + 1])))
+            self._integrated_index = last_index
+        return self._integral + self.last_value * (until - self.last_time)
+
+    def _grow(self):
+        capacity = max(2 * len(self._times), 1)
+        times = np.empty(capacity, dtype=np.float64)
+        values = np.empty(capacity, dtype=np.float64)
+        times[:self._size] = self._times[:self._size]
+        values[:self._size] = self._values[:self._size]
+        self._times = times
+        self._values = values
+
+    # Read view. The returned arrays are views on the recorder's storage; copy them
+    # if they need to outlive further appends.
+    def keys(self) -> np.ndarray:
+        return self._times[:self._size]
+
+    def values(self) -> np.ndarray:
+        return self._values[:self._size]
+
+    def items(self):
+        return zip(self.keys().tolist(), self.values().tolist())
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self.keys().tolist())
+
+    def __contains__(self, time):
+        return self._find(time) is not None
+
+    def __getitem__(self, time):
+        # Tied records resolve to the last one made at that time, like a dict key
+        # that was overwritten.
+        index = self._find(time)
+        if index is None:
+            raise KeyError(time)
+        return self._values[index]
+
+    def _find(self, time):
+        index = np.searchsorted(self.keys(), time, side='right') - 1
+        if index < 0 or self._times[index] != time:
+            return None
+        return index
+
+    def __repr__(self):
+        return f"TimeSeries(len={self._size}, last_time={self.last_time}, last_value={self.last_value})"
+
+
+class TimeWeightedAccumulator:
+    """
+    Weighted Welford accumulator for the mean and variance of a piecewise-constant
+    trace, where each level is weighted by how long it was held.
+    """
+    def __init__(self):
+        self.total_time = 0
+        self.mean = 0
+        self.sum_squared_deviations = 0
+
+    def add(self, value: float, duration: float):
+        if duration <= 0:
+            return
+        self.total_time += duration
+        delta = value - self.mean
+        self.mean += delta * duration / self.total_time
+        self.sum_squared_deviations += duration * delta * (value - self.mean)
+
+    def merge(self, other: 'TimeWeightedAccumulator'):
+        """
+        Adds the levels accumulated by another accumulator, with the pairwise update of
+        Chan et al.
+        """
+        if other.total_time <= 0:
+            return
+        total_time = self.total_time + other.total_time
+        delta = other.mean - self.mean
+        self.sum_squared_deviations += (other.sum_squared_deviations
+                                        + delta * delta * self.total_time * other.total_time / total_time)
+        self.mean += delta * other.total_time / total_time
+        self.total_time = total_time
+
+    @property
+    def variance(self):
+        if self.total_time == 0:
+            return 0
+        return self.sum_squared_deviations / self.total_time
+
+
+class SummaryTimeSeries:
+    """
+    Drop-in replacement for TimeSeries that keeps no history. The time-weighted mean
+    and variance are accumulated at every record, so memory does not grow with the
+    length of the run.
+
+    The statistics follow metrics.time_weighted_mean_variance: intervals start at the
+    first record strictly after warmup_period hours, or at the first record if the
+    run never gets past the warm-up period. With a cut_interval the warm-up period can
+    also be chosen after the run among the multiples of cut_interval, such as the
+    batches of a convergence monitor.
+    """
+    def __init__(self, warmup_period: float = 5, cut_interval: float = None):
+        self.warmup_period = warmup_period
+        self.cut_interval = cut_interval
+        self.first_time = None
+        self.last_time = None
+        self.last_value = 0
+        self.num_records = 0
+        self._next_cut = None
+        self._area = 0.0
+        # One accumulator per segment of the run. A segment starts at the first record strictly
+        # after each possible warm-up period, so the statistics after any of them merge the
+        # segments that follow it.
+        self._segment_starts = []
+        self._segments = []
+        self._accumulator = None
+
+    def record(self, time: float, value: float) -> int:
+        if time == self.last_time:
+            # Tied records hold for no time and only change the latest value
+            self.last_value = value
+            sequence = self.num_records
+            self.num_records += 1
+            return sequence
+        if self.first_time is None:
+            self.first_time = time
+            self._start_segment(time)
+        else:
+            last_value = self.last_value
+            duration = time - self.last_time
+            if duration > 0:
+                # TimeWeightedAccumulator.add, inlined as this runs on every record
+                accumulator = self._accumulator
+                accumulator.total_time += duration
+                delta = last_value - accumulator.mean
+                accumulator.mean += delta * duration / accumulator.total_time
+                accumulator.sum_squared_deviations += duration * delta * (last_value - accumulator.mean)
+            self._area += last_value * duration
+            if time > self._next_cut:
+                self._start_segment(time)
+        self.last_time = time
+        self.last_value = value
+        sequence = self.num_records
+        self.num_records += 1
+        return sequence
+
+    def _start_segment(self, time: float):
+        self._accumulator = TimeWeightedAccumulator()
+        self._segments.append(self._accumulator)
+        self._segment_starts.append(time)
+        # The next segment starts after the earliest possible warm-up period this record is not past
+        cuts = []
+        if self.first_time + self.warmup_period >= time:
+            cuts.append(self.first_time + self.warmup_period)
+        if self.cut_interval:
+            num_intervals = math.ceil((time - self.first_time) / self.cut_interval)
+            if self.first_time + num_intervals * self.cut_interval < time:
+                num_intervals += 1
+            cuts.append(self.first_time + num_intervals * self.cut_interval)
+        self._next_cut = min(cuts, default=math.inf)
+
+    def is_cut(self, warmup_period: float) -> bool:
+        """
+        Whether the statistics after the given warm-up period are accumulated.
+        """
+        if warmup_period == self.warmup_period:
+            return True
+        if not self.cut_interval or warmup_period < 0:
+            return False
+        return warmup_period == round(warmup_period / self.cut_interval) * self.cut_interval
+
+    def update(self, time: float, change: float) -> int:
+        return self.record(time, self.last_value + change)
+
+    def extend(self, times: np.ndarray, values: np.ndarray):
+        for time, value in zip(np.asarray(times).tolist(), np.asarray(values).tolist()):
+            self.record(time, value)
+
+    def integral(self, until: float) -> float:
+        """
+        Area under the trace from its first record to until, like TimeSeries.integral.
+        """
+        if self.first_time is None:
+            return 0.0
+        return self._area + self.last_value * (until - self.last_time)
+
+    def mean_variance(self, warmup_period: float = None) -> Tuple[float, float]:
+        """
+        Returns the time-weighted mean and variance accumulated so far after the given
+        warm-up period, by default the one the trace was created with.
+        """
+        if warmup_period is None:
+            warmup_period = self.warmup_period
+        if not self.is_cut(warmup_period):
+            raise ValueError(f'Trace was summarized with a {self.warmup_period} hour warm-up period, '
+                             f'cannot compute statistics for a {warmup_period} hour warm-up period.')
+        if not self._segments:
+            return 0, 0
+        first_segment = bisect_right(self._segment_starts, self.first_time + warmup_period)
+        if first_segment == len(self._segments):
+            first_segment = 0
+        accumulator = self._segments[first_segment]
+        if first_segment < len(self._segments) - 1:
+            merged = TimeWeightedAccumulator()
+            for segment in self._segments[first_segment:]:
+                merged.merge(segment)
+            accumulator = merged
+        if accumulator.total_time == 0:
+            return 0, 0
+        return float(accumulator.mean), float(accumulator.variance)
+
+    def __len__(self):
+        return self.num_records
+
+    def __repr__(self):
+        return f"SummaryTimeSeries(records={self.num_records}, last_time={self.last_time}, last_value={self.last_value})"
+
+
+def record_changes(series, changes):
+    """
+    Records the trace of a counter from (times, change) pairs. At equal times the changes
+    are applied in the order they are listed.
+    """
+    times = np.concatenate([change_times for change_times, _ in changes])
+    deltas = np.concatenate([np.full(len(change_times), change, dtype=np.float64) for change_times, change in changes])
+    order = np.argsort(times, kind='stable')
+    series.extend(times[order], series.last_value + np.cumsum(deltas[order]))
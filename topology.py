@@ -0,0 +1,120 @@
+from typing import Dict, List, Optional, Sequence, Union
+
+# Stand assignment policies, see VertiportTopology.stand_preferences
+ASSIGNMENT_POLICIES = ('in_order', 'fastest_charger', 'nearest_pad')
+
+
+class StandGroup:
+    """
+    Stands sharing a charger class. charge_rate is the charging speed relative to the
+    charge_time of the simulation, e.g. 2 charges in half the time.
+    """
+    def __init__(self, name: str, num_stands: int, charge_rate: float = 1.0):
+        if num_stands < 1:
+            raise ValueError(f"Stand group '{name}' needs at least one stand.")
+        if charge_rate <= 0:
+            raise ValueError(f"Stand group '{name}' needs a positive charge rate.")
+        self.name = name
+        self.num_stands = num_stands
+        self.charge_rate = charge_rate
+
+    def __repr__(self):
+        return f"StandGroup({self.name!r}, num_stands={self.num_stands}, charge_rate={self.charge_rate})"
+
+
+class VertiportTopology:
+    """
+    Layout of a vertiport: its TLOF pads and its stand groups. Stands are numbered group by
+    group in the order given, and assignment picks the free stand an aircraft gets:
+
+    - in_order: the lowest numbered free stand,
+    - fastest_charger: a free stand of the fastest charger class, then in order,
+    - nearest_pad: the free stand nearest to the pad the aircraft landed on, with pads and
+      stands spread evenly along the apron in number order.
+
+    Arrival pads serve landings. With tlof_feedback departures share the arrival pads, at a
+    lower priority than landings, and the departure pads are not used.
+    """
+    def __init__(self, num_arrival_pads: int = 1, num_departure_pads: int = 1,
+                 stand_groups: Sequence[StandGroup] = (), assignment: str = 'in_order'):
+        if num_arrival_pads < 1 or num_departure_pads < 1:
+            raise ValueError('A vertiport needs at least one arrival and one departure pad.')
+        if not stand_groups:
+            raise ValueError('A vertiport needs at least one stand group.')
+        if assignment not in ASSIGNMENT_POLICIES:
+            raise ValueError(f"Unknown assignment policy '{assignment}'. Choose from {list(ASSIGNMENT_POLICIES)}.")
+        self.num_arrival_pads = num_arrival_pads
+        self.num_departure_pads = num_departure_pads
+        self.stand_groups = list(stand_groups)
+        self.assignment = assignment
+
+    @classmethod
+    def single(cls, num_park: int) -> 'VertiportTopology':
+        """
+        The classic layout: one arrival pad, one departure pad and num_park stands.
+        """
+        return cls(stand_groups=[StandGroup('park', num_park)])
+
+    @property
+    def num_stands(self) -> int:
+        return sum(group.num_stands for group in self.stand_groups)
+
+    def charge_rates(self) -> List[float]:
+        """
+        Charge rate of every stand, by stand number.
+        """
+        return [group.charge_rate for group in self.stand_groups for _ in range(group.num_stands)]
+
+    def group_stands(self) -> Dict[str, range]:
+        """
+        Stand numbers of every group.
+        """
+        stands, first = {}, 0
+        for group in self.stand_groups:
+            stands[group.name] = range(first, first + group.num_stands)
+            first += group.num_stands
+        return stands
+
+    def stand_preferences(self) -> List[List]:
+        """
+        Preference keys of the stands for IndexedResourcePool, lowest first: one row for the
+        policies that ignore the landing pad, else one row per arrival pad.
+        """
+        num_stands = self.num_stands
+        if self.assignment == 'in_order':
+            return [list(range(num_stands))]
+        if self.assignment == 'fastest_charger':
+            # Ties are broken by stand number
+            return [[(-rate, stand) for stand, rate in enumerate(self.charge_rates())]]
+        pad_positions = [(pad + 0.5) / self.num_arrival_pads for pad in range(self.num_arrival_pads)]
+        stand_positions = [(stand + 0.5) / num_stands for stand in range(num_stands)]
+        return [[(abs(stand_position - pad_position), stand) for stand, stand_position in enumerate(stand_positions)]
+                for pad_position in pad_positions]
+
+    def __repr__(self):
+        return (f"VertiportTopology(num_arrival_pads={self.num_arrival_pads}, num_departure_pads={self.num_departure_pads}, "
+                f"stand_groups={self.stand_groups}, assignment={self.assignment!r})")
+
+
+def make_topology(spec: Union[Dict, VertiportTopology, None], num_park: Optional[int] = None) -> VertiportTopology:
+    """
+    Creates a topology from a dict of the VertiportTopology arguments, with stand_groups given
+    as dicts of the StandGroup arguments, e.g. {'num_arrival_pads': 4, 'stand_groups':
+    [{'name': 'fast', 'num_stands': 20, 'charge_rate': 2}, {'name': 'slow', 'num_stands': 30}]},
+    or returns a VertiportTopology as is. None is the classic layout with num_park stands.
+    With a topology num_park may be None, else it must be the number of stands.
+    """
+    if spec is None:
+        if num_park is None:
+            raise ValueError('A vertiport needs num_park or a topology.')
+        return VertiportTopology.single(num_park)
+    if isinstance(spec, VertiportTopology):
+        topology = spec
+    else:
+        kwargs = dict(spec)
+        kwargs['stand_groups'] = [group if isinstance(group, StandGroup) else StandGroup(**group)
+                                  for group in kwargs.get('stand_groups', ())]
+        topology = VertiportTopology(**kwargs)
+    if num_park is not None and num_park != topology.num_stands:
+        raise ValueError(f'num_park is {num_park} but the topology has {topology.num_stands} stands.')
+    return topology
@@ -1,10 +1,18 @@
-from helpers import generate_ids
+from agent_records import AIRCRAFT_RECORD_GROUPS, PASSENGER_RECORD_GROUPS, AgentRecords
 from logger import Logger
-import simpy
-import random
+from time_series import TimeSeries, SummaryTimeSeries, record_changes
+from random_streams import make_random_streams
+from distributions import make_distribution
+from convergence import ConvergenceMonitor
+import event_trace
+from event_trace import EventTraceWriter
+from instrumentation import Instrumentation
+from lindley import lindley_service_times
+from resource_pools import CapacityCounter, IndexedResourcePool
+from topology import make_topology
 import numpy as np
-from collections import defaultdict
-from typing import List, Dict, Any, Tuple, Union
+from collections import defaultdict, deque
+from typing import Dict, Union
 from datetime import datetime, timedelta
 
 
@@ -12,8 +20,8 @@ from datetime import datetime, timedelta
 class VertiportSimulation:
     def __init__(self, 
                  env, 
-                 aircraft_ids, 
-                 passenger_ids, 
+                 num_aircraft,
+                 num_passenger,
                  aircraft_mean_interarrival_time, 
                  passenger_mean_interarrival_time,
                  num_park,
@@ -27,13 +35,33 @@ class VertiportSimulation:
                  blocking=False,
                  is_logging=False,
                  no_pax_arrival=False,
-                 seed=0):
+                 seed=0,
+                 summary_only=False,
+                 warmup_period=5,
+                 aircraft_interarrival_distribution=None,
+                 tlof_distribution=None,
+                 charge_distribution=None,
+                 passenger_interarrival_distribution=None,
+                 stop_on_convergence=False,
+                 convergence_tolerance=0.05,
+                 batch_duration=1.0,
+                 event_trace_path=None,
+                 instrument=False,
+                 topology=None,
+                 use_recursions=False):
         self.env = env
-        self.aircraft_ids = iter(aircraft_ids)  # Make iterators
-        self.passenger_ids = iter(passenger_ids)
+        # Agents are the integer ids 0 .. num_aircraft - 1 and 0 .. num_passenger - 1; labels
+        # like 'Aircraft_3' are made when the records are exported.
+        self.num_aircraft = num_aircraft
+        self.num_passenger = num_passenger
+        self.aircraft_ids = iter(range(self.num_aircraft))  # Make iterators
+        self.passenger_ids = iter(range(self.num_passenger))
         self.aircraft_mean_interarrival_time = aircraft_mean_interarrival_time
         self.passenger_mean_interarrival_time = passenger_mean_interarrival_time
-        self.num_park = num_park
+        # Pads and stands (see topology.py). The default is one arrival pad, one departure
+        # pad and num_park stands. With a topology num_park is None or its number of stands.
+        self.topology = make_topology(topology, num_park)
+        self.num_park = self.topology.num_stands
         self.tlof_mean_service_time = tlof_mean_service_time
         self.charge_mean_service_time = charge_mean_service_time
         self.seat_capacity = seat_capacity
@@ -46,54 +74,190 @@ class VertiportSimulation:
         self.is_logging = is_logging
         self.simulation_start_datetime = datetime(2024, 1, 1)
         self.seed = seed
-
-        # Servers and queues
-        self.tlof_server = simpy.PriorityResource(env, capacity=1)
-        self.tlof_server2 = simpy.PriorityResource(env, capacity=1)
-        self.park_server = simpy.Resource(env, capacity=num_park)
-        self.passenger_queue = []
-        self.aircraft_departure_queue = simpy.Store(env)
+        # In summary-only mode the trackers accumulate time-weighted statistics instead of
+        # keeping their history, and per-agent timing records are not kept.
+        self.summary_only = summary_only
+        self.warmup_period = warmup_period
+
+        # Servers and queues. Free pads and stands are kept in heaps, so the cost of an event
+        # does not grow with their number.
+        self.arrival_pads = IndexedResourcePool(env, self.topology.num_arrival_pads)
+        self.departure_pads = IndexedResourcePool(env, self.topology.num_departure_pads)
+        self.stands = IndexedResourcePool(env, self.num_park, preferences=self.topology.stand_preferences())
+        self.stand_charge_rates = self.topology.charge_rates()
+        # Passengers waiting for their seat batch to fill up, full batches waiting for an
+        # aircraft and charged aircraft waiting for a batch. Passengers join batches in id
+        # order, so a batch is identified by its first passenger.
+        self.passenger_queue = deque()
+        self.boarding_batches = deque()
+        self.ready_aircraft = deque()
         # Statistics
-        self.waiting_times = defaultdict(lambda: defaultdict(dict))
-        self.arrival_departure_times = defaultdict(lambda: defaultdict(dict))
-        self.arrival_departure_counter = defaultdict(lambda: defaultdict(dict))
-        self.queue_lengths = defaultdict(lambda: defaultdict(dict))
-        self.in_service_counts = defaultdict(lambda: defaultdict(dict))
-        self.time_logs = defaultdict(lambda: defaultdict(dict))
-        self.process_times = defaultdict(lambda: defaultdict(dict))
+        if summary_only:
+            # A run stopped on convergence picks its warm-up period among the batches afterwards
+            cut_interval = batch_duration if stop_on_convergence else None
+            series = lambda: SummaryTimeSeries(warmup_period, cut_interval=cut_interval)
+        else:
+            series = TimeSeries
+        # Per-agent timing records, one row per agent (none in summary-only mode)
+        self.aircraft_records = AgentRecords(0 if summary_only else self.num_aircraft, AIRCRAFT_RECORD_GROUPS, 'Aircraft')
+        self.passenger_records = AgentRecords(0 if summary_only else self.num_passenger, PASSENGER_RECORD_GROUPS, 'Passenger')
+        self.arrival_departure_counter = defaultdict(lambda: defaultdict(series))
+        self.queue_lengths = defaultdict(series)
         self.rejected_aircraft_counter = 0
-        self.surface_aircraft_count = defaultdict(dict)
+        self.surface_aircraft_count = series()
         self.departing_passenger_queue_length = 0
         self.passenger_service_queue_length = 0
-        self.terminal_store = simpy.Store(env, capacity=self.terminal_buffer_capacity)
-        self.surface_store = simpy.Store(env, capacity=num_park)
-        # Populate the surface store with the number of parking spots
-        for _ in range(num_park):
-            self.surface_store.put('park')
-        # self.surface_store.put('park')
-        
-        # If terminal buffer capacity is not infinite, then populate the terminal store with the capacity
-        if self.terminal_buffer_capacity != np.inf:
-            for _ in range(self.terminal_buffer_capacity):
-                self.terminal_store.put('capacity')
+        # Free places in the terminal buffer and, for blocking, stands not yet reserved by an
+        # aircraft. An infinite terminal buffer gets a place for every arriving aircraft.
+        self.terminal_buffer = CapacityCounter(env, 0 if self.terminal_buffer_capacity == np.inf else self.terminal_buffer_capacity)
+        self.surface_capacity = CapacityCounter(env, self.num_park)
 
         # Initiate arrival_departure_counter to zero
-        self.arrival_departure_counter['aircraft']['arrival_counter'][0] = 0
-        self.arrival_departure_counter['aircraft']['departure_counter'][0] = 0
-        self.arrival_departure_counter['passenger']['arrival_counter'][0] = 0
-        self.arrival_departure_counter['passenger']['departure_counter'][0] = 0
+        self.arrival_departure_counter['aircraft']['arrival_counter'].record(0, 0)
+        self.arrival_departure_counter['aircraft']['departure_counter'].record(0, 0)
+        self.arrival_departure_counter['passenger']['arrival_counter'].record(0, 0)
+        self.arrival_departure_counter['passenger']['departure_counter'].record(0, 0)
         # Initiate queue lengths to zero
-        self.queue_lengths['aircraft_arrival_queue'][0] = 0
-        self.queue_lengths['aircraft_departure_queue'][0] = 0
-        self.queue_lengths['passenger_queue'][0] = 0
-        self.queue_lengths['park_queue_length'][0] = 0
+        self.queue_lengths['aircraft_arrival_queue'].record(0, 0)
+        self.queue_lengths['aircraft_departure_queue'].record(0, 0)
+        self.queue_lengths['passenger_queue'].record(0, 0)
+        self.queue_lengths['park_queue_length'].record(0, 0)
 
-        self.surface_aircraft_count[0] = 0
+        self.surface_aircraft_count.record(0, 0)
         self.logger = Logger(env, self.simulation_start_datetime, self.is_logging)
 
-        # Seed the random number generator
-        random.seed(seed)
-        np.random.seed(seed)
+        # Independent random number streams owned by this simulation. Global random state
+        # is left untouched, so several simulations can run in one process.
+        self.random_streams = make_random_streams(seed)
+        # Each process can use its own distribution (a name, a spec dict or a Distribution, see
+        # distributions.py), with times in hours. By default times are exponential if stochastic,
+        # else constant.
+        default_distribution = 'exponential' if stochastic else 'deterministic'
+        self.aircraft_interarrival_distribution = make_distribution(aircraft_interarrival_distribution or default_distribution, aircraft_mean_interarrival_time)
+        self.tlof_distribution = make_distribution(tlof_distribution or default_distribution, tlof_mean_service_time)
+        self.charge_distribution = make_distribution(charge_distribution or default_distribution, charge_mean_service_time)
+        self.passenger_interarrival_distribution = make_distribution(passenger_interarrival_distribution or default_distribution, passenger_mean_interarrival_time)
+        # Service and interarrival times are drawn in vectorized blocks and handed out one by
+        # one. Landings and take-offs share the TLOF sampler, and so the TLOF stream.
+        self.aircraft_interarrival_sampler = self.aircraft_interarrival_distribution.sampler(self.random_streams['arrivals'])
+        self.tlof_sampler = self.tlof_distribution.sampler(self.random_streams['tlof'])
+        self.charge_sampler = self.charge_distribution.sampler(self.random_streams['charging'])
+        self.passenger_interarrival_sampler = self.passenger_interarrival_distribution.sampler(self.random_streams['passengers'])
+
+        # Optional early stop: batch means of the queue lengths are checked every batch_duration
+        # hours by convergence_process, which ends the run once they have converged. Without
+        # passengers the passenger service queue only decreases, so it is not watched.
+        self.convergence_monitor = None
+        if stop_on_convergence:
+            monitored = {'aircraft_arrival_queue': self.queue_lengths['aircraft_arrival_queue'],
+                         'park_queue_length': self.queue_lengths['park_queue_length']}
+            if not no_pax_arrival:
+                monitored['passenger_service_queue'] = self.queue_lengths['passenger_service_queue']
+            self.convergence_monitor = ConvergenceMonitor(monitored,
+                                                          batch_duration=batch_duration,
+                                                          relative_tolerance=convergence_tolerance)
+
+        # Structured event trace for post-hoc analysis (see event_trace.py)
+        self.event_trace = None
+        if event_trace_path is not None:
+            self.event_trace = EventTraceWriter(event_trace_path)
+
+        # Called with the id of every departed aircraft, e.g. to fly it to another vertiport of
+        # a network (see network.py)
+        self.departure_handler = None
+        # Whether aircraft_arrival_process may compute the landings with Lindley's recursion,
+        # see arrival_stage_is_independent
+        self.use_recursions = use_recursions
+
+        # Opt-in profiling, see instrument
+        self.instrumentation = None
+        if instrument:
+            self.instrument(Instrumentation())
+
+    def instrument(self, instrumentation: Instrumentation):
+        """
+        Wraps the processes, samplers and trackers of this simulation to record event counts per
+        process type, and calls and wall time per update category. Without it the simulation
+        runs unwrapped code only.
+        """
+        self.instrumentation = instrumentation
+        for name, category in (('aircraft_arrival_process', 'arrival'),
+                               ('terminal_arrival_process', 'turnaround'),
+                               ('request_terminal_buffer', 'turnaround'),
+                               ('request_surface', 'turnaround'),
+                               ('turnaround_process', 'turnaround'),
+                               ('landed_aircraft_process', 'turnaround'),
+                               ('departure_process', 'departure'),
+                               ('passenger_process', 'passenger'),
+                               ('convergence_process', 'convergence')):
+            setattr(self, name, instrumentation.count_events(category, getattr(self, name)))
+        self.board = instrumentation.count_calls('pooling', self.board)
+        for name in ('aircraft_interarrival_sampler', 'tlof_sampler', 'charge_sampler', 'passenger_interarrival_sampler'):
+            setattr(self, name, instrumentation.timed('rng', getattr(self, name)))
+        for counters in self.arrival_departure_counter.values():
+            for tracker in counters.values():
+                instrumentation.time_tracker('counters', tracker)
+        for name in ('aircraft_arrival_queue', 'aircraft_departure_queue', 'passenger_queue', 'park_queue_length', 'passenger_service_queue'):
+            instrumentation.time_tracker('queue_lengths', self.queue_lengths[name])
+        instrumentation.time_tracker('surface_count', self.surface_aircraft_count)
+        if self.event_trace is not None:
+            self.trace_event = instrumentation.timed('event_trace', self.trace_event)
+        instrumentation.count_simpy_events(self.env)
+
+    def trace_event(self, event: int, agent_type: int, agent_id: int):
+        """
+        Appends an event with the current queue lengths to the event trace.
+        """
+        queue_lengths = self.queue_lengths
+        self.event_trace.record(self.env.now, event, agent_type, agent_id,
+                                queue_lengths['aircraft_arrival_queue'].last_value,
+                                queue_lengths['park_queue_length'].last_value,
+                                self.surface_aircraft_count.last_value,
+                                queue_lengths['aircraft_departure_queue'].last_value,
+                                self.passenger_service_queue_length)
+
+    def close_event_trace(self):
+        if self.event_trace is not None:
+            self.event_trace.close()
+
+    @property
+    def detected_warmup(self) -> Union[float, None]:
+        """
+        End of the warm-up period detected by the convergence monitor, if there is one.
+        """
+        if self.convergence_monitor is None:
+            return None
+        return self.convergence_monitor.detected_warmup
+
+    def convergence_process(self):
+        while not self.termination_event.triggered:
+            yield self.env.timeout(self.convergence_monitor.batch_duration)
+            self.convergence_monitor.observe(self.env.now)
+            if self.convergence_monitor.has_converged() and not self.termination_event.triggered:
+                self.logger.info("Estimates converged at %s after a %s hour warm-up.", self.logger.sim_time, self.detected_warmup)
+                self.termination_event.succeed()
+
+    # The per-agent records in the nested-dict layout of earlier versions, {agent_type: {label:
+    # {field: time}}}. They are built from the record tables on every access.
+    @property
+    def arrival_departure_times(self):
+        return self._export_records('arrival_departure_times')
+
+    @property
+    def waiting_times(self):
+        return self._export_records('waiting_times')
+
+    @property
+    def process_times(self):
+        return self._export_records('process_times')
+
+    @property
+    def time_logs(self):
+        return self._export_records('time_logs')
+
+    def _export_records(self, group: str) -> Dict[str, Dict[str, Dict[str, float]]]:
+        exported = {'aircraft': self.aircraft_records.to_dicts(group), 'passenger': self.passenger_records.to_dicts(group)}
+        return {agent_type: records for agent_type, records in exported.items() if records}
 
     def convert_hr_to_dt(self, hour: float) -> str:
         """
@@ -103,87 +267,138 @@ class VertiportSimulation:
 
     def update_counter(self, agent_type: str, counter: dict, counter_type: str, change: int):
         last_value = self.get_latest_value(agent_type, counter, counter_type)
-        time = self.is_time_overlapping(self.env.now, agent_type, counter)
-        counter[agent_type][counter_type][time] = last_value + change
+        counter[agent_type][counter_type].record(self.env.now, last_value + change)
 
     def get_latest_value(self, agent_type: str, counter: dict, counter_type: str):
-        return list(counter[agent_type][counter_type].values())[-1]
+        return counter[agent_type][counter_type].last_value
     
-    def get_latest_value_from_dict(self, counter: dict):
-        return list(counter.values())[-1]
+    def get_latest_value_from_dict(self, counter: TimeSeries):
+        return counter.last_value
     
     def get_latest_queue_length(self, counter: dict, counter_type: str):
-        if len(counter[counter_type]) == 0:
-            return 0
-        return list(counter[counter_type].values())[-1]
+        return counter[counter_type].last_value
     
     def update_aircraft_arrival_queue_length(self, update):
         # Save the tlof queue length
-        time = self.is_time_overlapping(time=self.env.now, agent_type='queue', tracker=self.queue_lengths)
         # Get the last value of the tlof queue length
         queue_length = self.get_latest_queue_length(counter=self.queue_lengths, counter_type='aircraft_arrival_queue')
-        self.queue_lengths['aircraft_arrival_queue'][time] = queue_length + update 
+        self.queue_lengths['aircraft_arrival_queue'].record(self.env.now, queue_length + update) 
 
     def update_park_queue_length(self, update):
         # Save the park queue length
-        time = self.is_time_overlapping(time=self.env.now, agent_type='queue', tracker=self.queue_lengths)
         # Get the last value of the park queue length
         queue_length = self.get_latest_queue_length(counter=self.queue_lengths, counter_type='park_queue_length')
-        self.queue_lengths['park_queue_length'][time] = queue_length + update
+        self.queue_lengths['park_queue_length'].record(self.env.now, queue_length + update)
 
     def update_aircraft_departure_queue_length(self, update):
         # Save the tlof queue length
-        time = self.is_time_overlapping(time=self.env.now, agent_type='queue', tracker=self.queue_lengths)
         # Get the last value of the tlof queue length
         queue_length = self.get_latest_queue_length(counter=self.queue_lengths, counter_type='aircraft_departure_queue')
-        self.queue_lengths['aircraft_departure_queue'][time] = queue_length + update
+        self.queue_lengths['aircraft_departure_queue'].record(self.env.now, queue_length + update)
 
     def update_passenger_queue_length(self, update):
         # Save the tlof queue length
-        time = self.is_time_overlapping(time=self.env.now, agent_type='queue', tracker=self.queue_lengths)
         # Get the last value of the tlof queue length
         queue_length = self.get_latest_queue_length(counter=self.queue_lengths, counter_type='passenger_queue')
-        self.queue_lengths['passenger_queue'][time] = queue_length + update
+        self.queue_lengths['passenger_queue'].record(self.env.now, queue_length + update)
 
     def update_passenger_service_queue_length(self, update):
         # Save the tlof queue length
-        time = self.is_time_overlapping(time=self.env.now, agent_type='queue', tracker=self.queue_lengths)
         # Get the last value of the tlof queue length
         queue_length = self.get_latest_queue_length(counter=self.queue_lengths, counter_type='passenger_service_queue')
-        self.queue_lengths['passenger_service_queue'][time] = queue_length + update
+        self.queue_lengths['passenger_service_queue'].record(self.env.now, queue_length + update)
+
+    @property
+    def arrival_stage_is_independent(self) -> bool:
+        """
+        Without TLOF feedback, blocking or a finite terminal buffer, nothing but the arrivals
+        feeds the single arrival pad, which is then a FIFO single server whose landings
+        aircraft_arrival_process computes up front with Lindley's recursion if use_recursions
+        is set. Event traces, convergence checks, logging and instrumentation need the arrivals
+        as events. Vertiports of a network receive aircraft from other vertiports and leave
+        use_recursions False.
+        """
+        return (self.use_recursions and not self.tlof_feedback and not self.blocking
+                and self.terminal_buffer_capacity == np.inf and self.topology.num_arrival_pads == 1
+                and self.event_trace is None and self.convergence_monitor is None and not self.is_logging
+                and self.instrumentation is None)
 
     def aircraft_arrival_process(self):
+        if self.arrival_stage_is_independent:
+            yield from self.recursive_arrival_process()
+            return
         while True:
-            if self.stochastic:
-                yield self.env.timeout(np.random.exponential(self.aircraft_mean_interarrival_time))
-            else:
-                yield self.env.timeout(self.aircraft_mean_interarrival_time)
+            yield self.env.timeout(self.aircraft_interarrival_sampler())
             try:
                 aircraft_id = next(self.aircraft_ids)
-                time = self.is_time_overlapping(self.env.now, 'aircraft', self.arrival_departure_times)
-                self.arrival_departure_times['aircraft'][aircraft_id]['arrival_time'] = time
-                
-                self.logger.debug(f"{aircraft_id} will request terminal buffer at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at terminal buffer: {self.terminal_buffer_capacity - len(self.terminal_store.items)}")
-                if self.terminal_buffer_capacity != np.inf and len(self.terminal_store.items) == 0:
-                    # self.logger.debug(f"{aircraft_id} rejected at {self.convert_hr_to_dt(self.env.now)}")
-                    # last_value = self.get_latest_value_from_dict(self.rejected_aircraft_counter)
-                    self.rejected_aircraft_counter += 1
-                    continue
-                else:
-                    # Increase the arrival counter
-                    self.update_counter('aircraft', self.arrival_departure_counter, 'arrival_counter', 1)
-            
-                    self.env.process(self.terminal_arrival_process(aircraft_id))
             except StopIteration:
                 break  # No more pre-generated aircraft IDs 
+            self.admit_aircraft(aircraft_id)
 
-        self.termination_event.succeed()      
+        if not self.termination_event.triggered:
+            self.termination_event.succeed()
+
+    def recursive_arrival_process(self):
+        """
+        Computes the arrivals and landings of all the aircraft at once and only schedules the
+        landing ends, where the aircraft go on to the parks. Landings take the first TLOF
+        draws, and take-offs the later ones, so runs are not the same as with use_recursions
+        False, except with deterministic TLOF times.
+        """
+        num_aircraft = self.num_aircraft
+        # The run ends at the arrival that finds no aircraft left
+        arrival_times = np.cumsum(self.aircraft_interarrival_distribution.sample(self.random_streams['arrivals'], num_aircraft + 1))
+        end_time = arrival_times[-1]
+        arrival_times = arrival_times[:-1]
+        landing_times = self.tlof_distribution.sample(self.random_streams['tlof'], num_aircraft)
+        landing_start, landing_end = lindley_service_times(arrival_times, landing_times)
+        # Landings that start or end after the run never happen
+        started = landing_start < end_time
+        landed = np.flatnonzero(landing_end < end_time)
+
+        record_changes(self.arrival_departure_counter['aircraft']['arrival_counter'], [(arrival_times, 1)])
+        record_changes(self.queue_lengths['aircraft_arrival_queue'], [(arrival_times, 1), (landing_start[started], -1)])
+        if not self.summary_only:
+            self.aircraft_records.arrival_time[:num_aircraft] = arrival_times
+            self.aircraft_records.tlof_arrival_queue_waiting_time[started] = (landing_start - arrival_times)[started]
+            self.aircraft_records.landing_process_time[landed] = landing_times[landed]
+
+        for aircraft_id, landing_time in zip(landed.tolist(), landing_end[landed].tolist()):
+            yield self.env.timeout(landing_time - self.env.now)
+            self.env.process(self.landed_aircraft_process(aircraft_id))
+        yield self.env.timeout(end_time - self.env.now)
+        if not self.termination_event.triggered:
+            self.termination_event.succeed()
+
+    def admit_aircraft(self, aircraft_id):
+        """
+        An aircraft arrives now: it enters the terminal buffer, or is rejected if it is full.
+        Aircraft handed over by other vertiports of a network (see network.py) arrive here too.
+        """
+        if not self.summary_only:
+            self.aircraft_records.arrival_time[aircraft_id] = self.env.now
+        
+        self.logger.debug("%s will request terminal buffer at %s. Num aircraft at terminal buffer: %s",
+                          aircraft_id, self.logger.sim_time, self.terminal_buffer_capacity - self.terminal_buffer.available)
+        if self.event_trace is not None:
+            self.trace_event(event_trace.AIRCRAFT_ARRIVAL, event_trace.AIRCRAFT, aircraft_id)
+        if self.terminal_buffer_capacity != np.inf and self.terminal_buffer.available == 0:
+            # self.logger.debug(f"{aircraft_id} rejected at {self.convert_hr_to_dt(self.env.now)}")
+            # last_value = self.get_latest_value_from_dict(self.rejected_aircraft_counter)
+            self.rejected_aircraft_counter += 1
+            if self.event_trace is not None:
+                self.trace_event(event_trace.AIRCRAFT_REJECTED, event_trace.AIRCRAFT, aircraft_id)
+        else:
+            # Increase the arrival counter
+            self.update_counter('aircraft', self.arrival_departure_counter, 'arrival_counter', 1)
+    
+            self.env.process(self.terminal_arrival_process(aircraft_id))
 
     def terminal_arrival_process(self, aircraft_id):
         # Request a space from the terminal airspace
         # yield self.env.timeout(0)
         if self.terminal_buffer_capacity == np.inf:
-            self.terminal_store.put('capacity')
+            self.terminal_buffer.put()
         
         # Get on the terminal buffer
         yield self.env.process(self.request_terminal_buffer(aircraft_id))
@@ -197,146 +412,158 @@ class VertiportSimulation:
         self.env.process(self.turnaround_process(aircraft_id, start_time))
 
     def request_terminal_buffer(self, aircraft_id):
-        yield self.terminal_store.get()
+        yield self.terminal_buffer.get()
         # Save the terminal queue length
         self.update_aircraft_arrival_queue_length(update=1)
-        # self.logger.debug(f"{aircraft_id} entered the terminal buffer at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at terminal buffer: {self.terminal_buffer_capacity - len(self.terminal_store.items)}")
-        # self.logger.debug(f"Number of aircraft at the terminal buffer from queue length counter: {list(self.queue_lengths['aircraft_arrival_queue'].values())[-1]}")
+        if self.event_trace is not None:
+            self.trace_event(event_trace.TERMINAL_ENTER, event_trace.AIRCRAFT, aircraft_id)
+        # self.logger.debug(f"{aircraft_id} entered the terminal buffer at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at terminal buffer: {self.terminal_buffer_capacity - self.terminal_buffer.available}")
+        # self.logger.debug(f"Number of aircraft at the terminal buffer from queue length counter: {self.queue_lengths['aircraft_arrival_queue'].last_value}")
 
     def request_surface(self, aircraft_id):
-        yield self.surface_store.get()
-        # self.logger.debug(f"{aircraft_id} got the surface reservation at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - len(self.surface_store.items)}")
+        yield self.surface_capacity.get()
+        # self.logger.debug(f"{aircraft_id} got the surface reservation at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - self.surface_capacity.available}")
 
     def turnaround_process(self, aircraft_id, start_time):
         # TLOF and Park handling with exponential service times
-        with self.tlof_server.request(priority=0) as request:
-            yield request
+        with self.arrival_pads.request(priority=0) as request:
+            pad = yield request
             # Update the arrival queue length
-            self.update_aircraft_arrival_queue_length(update=-1)            
+            self.update_aircraft_arrival_queue_length(update=-1)
+            if self.event_trace is not None:
+                self.trace_event(event_trace.LANDING_START, event_trace.AIRCRAFT, aircraft_id)
             # Open space in the terminal buffer
-            self.terminal_store.put('capacity')
-            # self.logger.debug(f"{aircraft_id} left the terminal buffer at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at terminal buffer: {self.terminal_buffer_capacity - len(self.terminal_store.items)}")
-            # self.logger.debug(f"Number of aircraft at the terminal buffer from queue length counter: {list(self.queue_lengths['aircraft_arrival_queue'].values())[-1]}")
+            self.terminal_buffer.put()
+            # self.logger.debug(f"{aircraft_id} left the terminal buffer at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at terminal buffer: {self.terminal_buffer_capacity - self.terminal_buffer.available}")
+            # self.logger.debug(f"Number of aircraft at the terminal buffer from queue length counter: {self.queue_lengths['aircraft_arrival_queue'].last_value}")
             # Save the tlof queue waiting time
-            self.waiting_times['aircraft'][aircraft_id]['tlof_arrival_queue_waiting_time'] = self.env.now - start_time
+            if not self.summary_only:
+                self.aircraft_records.tlof_arrival_queue_waiting_time[aircraft_id] = self.env.now - start_time
             # Get the landing process time
-            if self.stochastic:
-                landing_process_time = np.random.exponential(self.tlof_mean_service_time)
-            else:
-                landing_process_time = self.tlof_mean_service_time
+            landing_process_time = self.tlof_sampler()
             # Save the landing process time
             yield self.env.timeout(landing_process_time)
         # Save the landing process time
-        self.process_times['aircraft'][aircraft_id]['landing_process_time'] = landing_process_time
+        if not self.summary_only:
+            self.aircraft_records.landing_process_time[aircraft_id] = landing_process_time
+        yield from self.park_process(aircraft_id, pad)
+
+    def landed_aircraft_process(self, aircraft_id):
+        """
+        Park stage of an aircraft whose landing recursive_arrival_process computed.
+        """
+        yield from self.park_process(aircraft_id, pad=0)
 
+    def park_process(self, aircraft_id, pad):
+        """
+        Parks and charges a landed aircraft, then sends it to boarding or departure.
+        """
         # Increase the surface count
-        last_value = self.get_latest_value_from_dict(self.surface_aircraft_count)
-        self.surface_aircraft_count[self.env.now] = last_value + 1
+        self.surface_aircraft_count.update(self.env.now, 1)
         # # Log the surface count
-        # self.logger.debug(f"{aircraft_id} landed at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - len(self.surface_store.items)}")
+        # self.logger.debug(f"{aircraft_id} landed at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - self.surface_capacity.available}")
         
         start_time = self.env.now
         # Save the park queue length
         self.update_park_queue_length(update=1)
+        # Traced after every queue length the landing changes, the park queue included
+        if self.event_trace is not None:
+            self.trace_event(event_trace.LANDING_END, event_trace.AIRCRAFT, aircraft_id)
 
-        with self.park_server.request() as request:
-            yield request
+        with self.stands.request(origin=pad) as request:
+            stand = yield request
             # Log parking time
-            # self.logger.debug(f"{aircraft_id} parked at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - len(self.surface_store.items)}")
+            # self.logger.debug(f"{aircraft_id} parked at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - self.surface_capacity.available}")
             # Update the park queue length
             self.update_park_queue_length(update=-1)
-            self.waiting_times['aircraft'][aircraft_id]['park_queue_waiting_time'] = self.env.now - start_time
-            if self.stochastic:
-                charge_process_time = np.random.exponential(self.charge_mean_service_time)
-            else:
-                charge_process_time = self.charge_mean_service_time
+            if self.event_trace is not None:
+                self.trace_event(event_trace.CHARGE_START, event_trace.AIRCRAFT, aircraft_id)
+            if not self.summary_only:
+                self.aircraft_records.park_queue_waiting_time[aircraft_id] = self.env.now - start_time
+            charge_process_time = self.charge_sampler() / self.stand_charge_rates[stand]
             yield self.env.timeout(charge_process_time)
+            if self.event_trace is not None:
+                self.trace_event(event_trace.CHARGE_END, event_trace.AIRCRAFT, aircraft_id)
             # Save the charge time
-            self.process_times['aircraft'][aircraft_id]['charge_process_time'] = charge_process_time
+            if not self.summary_only:
+                self.aircraft_records.charge_process_time[aircraft_id] = charge_process_time
         
         if self.no_pax_arrival:
             self.env.process(self.departure_process(aircraft_id))
         else:
-            # Put aircraft in the the available departure queue
-            self.aircraft_departure_queue.put(aircraft_id)
-            self.time_logs['aircraft'][aircraft_id]['departure_queue_enter_time'] = self.env.now
+            if not self.summary_only:
+                self.aircraft_records.departure_queue_enter_time[aircraft_id] = self.env.now
+            # Board the oldest full batch, or wait in the departure queue for one
+            if self.boarding_batches:
+                self.board(aircraft_id, self.boarding_batches.popleft())
+            else:
+                self.ready_aircraft.append(aircraft_id)
 
-        # self.logger.debug(f"{aircraft_id} charged and entered the departure queue at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - len(self.surface_store.items)}")
-        # self.logger.debug(f"Number of aircraft at the departure queue: {list(self.queue_lengths['aircraft_departure_queue'].values())[-1]}")
+        # self.logger.debug(f"{aircraft_id} charged and entered the departure queue at {self.convert_hr_to_dt(self.env.now)}. Num aircraft at surface: {self.num_park - self.surface_capacity.available}")
+        # self.logger.debug(f"Number of aircraft at the departure queue: {self.queue_lengths['aircraft_departure_queue'].last_value}")
 
     def passenger_process(self):
         while True:
-            if self.stochastic:
-                yield self.env.timeout(np.random.exponential(self.passenger_mean_interarrival_time))
-            else:
-                yield self.env.timeout(self.passenger_mean_interarrival_time)
+            yield self.env.timeout(self.passenger_interarrival_sampler())
             try:
                 passenger_id = next(self.passenger_ids)
-                time = self.is_time_overlapping(self.env.now, 'passenger', self.arrival_departure_times)
-                self.arrival_departure_times['passenger'][passenger_id]['arrival_time'] = self.env.now
+                if not self.summary_only:
+                    self.passenger_records.arrival_time[passenger_id] = self.env.now
                 # Increase the arrival counter
                 self.update_counter(agent_type='passenger', counter=self.arrival_departure_counter, counter_type='arrival_counter', change=1)
                 self.passenger_service_queue_length += 1
 
                 # self.update_passenger_service_queue_length(update=1)
-                # Save the tlof queue length
-                time = self.is_time_overlapping(time=self.env.now, agent_type='queue', tracker=self.queue_lengths)
-                # Get the last value of the tlof queue length
-                self.queue_lengths['passenger_service_queue'][time] = self.passenger_service_queue_length   
+                # Save the passenger service queue length
+                self.queue_lengths['passenger_service_queue'].record(self.env.now, self.passenger_service_queue_length)   
+                if self.event_trace is not None:
+                    self.trace_event(event_trace.PASSENGER_ARRIVAL, event_trace.PASSENGER, passenger_id)
 
                 # Log the passenger arrival
-                # self.logger.debug(f"{passenger_id} arrived at {self.convert_hr_to_dt(self.env.now)}. Num passengers at passenger service queue: {list(self.queue_lengths['passenger_service_queue'].values())[-1]}")
+                # self.logger.debug(f"{passenger_id} arrived at {self.convert_hr_to_dt(self.env.now)}. Num passengers at passenger service queue: {self.queue_lengths['passenger_service_queue'].last_value}")
                 # self.logger.debug(f"Number of passengers at the passenger service queue counter: {self.passenger_service_queue_length}")
                     
                 self.passenger_queue.append(passenger_id)
                 # Save the passenger queue length
-                # time = self.is_time_overlapping(self.env.now, 'passenger', self.queue_lengths)
-                # self.queue_lengths['passenger_queue'][time] = len(self.passenger_queue)
+                # self.queue_lengths['passenger_queue'].record(self.env.now, len(self.passenger_queue))
 
                 if len(self.passenger_queue) >= self.seat_capacity:
 
-                    time = self.is_time_overlapping(self.env.now, 'queue', self.queue_lengths)
-                    self.queue_lengths['passenger_service_queue'][time] = self.passenger_service_queue_length             
-                    self.env.process(self.pool_passengers())
+                    self.queue_lengths['passenger_service_queue'].record(self.env.now, self.passenger_service_queue_length)             
+                    first_passenger = self.passenger_queue[0]
+                    self.passenger_queue.clear()
+                    # Board the aircraft that has waited longest, or wait for one
+                    if self.ready_aircraft:
+                        self.board(self.ready_aircraft.popleft(), first_passenger)
+                    else:
+                        self.boarding_batches.append(first_passenger)
 
             except StopIteration:
                 break  # No more pre-generated passenger IDs
 
-    def get_aircraft_from_departure_queue(self):
-        aircraft_id = yield self.aircraft_departure_queue.get()
-        return aircraft_id
-        
-    def pool_passengers(self):
-        departing_passengers = [self.passenger_queue.pop(0) for _ in range(self.seat_capacity)]
-        # Get available aircraft from the departure queue
-        aircraft_id = yield self.aircraft_departure_queue.get()
-        # aircraft_id = self.env.process(self.get_aircraft_from_departure_queue())
-
-        self.time_logs['aircraft'][aircraft_id]['departure_queue_exit_time'] = self.env.now
+    def board(self, aircraft_id: int, first_passenger: int):
+        """
+        Boards the seat batch that starts at first_passenger on a charged aircraft and sends
+        the aircraft to departure.
+        """
+        if not self.summary_only:
+            self.aircraft_records.departure_queue_exit_time[aircraft_id] = self.env.now
+            batch = slice(first_passenger, first_passenger + self.seat_capacity)
+            self.passenger_records.departure_queue_exit_time[batch] = self.env.now
+            self.passenger_records.waiting_time[batch] = self.env.now - self.passenger_records.arrival_time[batch]
         # Update the departure queue length
         self.update_aircraft_departure_queue_length(update=1)
-        # Log the passenger departure and aircraft departure
-        # self.logger.debug(f"{departing_passengers} assigned to {aircraft_id} at {self.convert_hr_to_dt(self.env.now)}. Num passengers at passenger service queue: {list(self.queue_lengths['passenger_service_queue'].values())[-1]}")
-        # self.logger.debug(f"Departure queue length: {list(self.queue_lengths['aircraft_departure_queue'].values())[-1]}")
-        
-        self.departing_passenger_queue_length += len(departing_passengers)
-        for passenger_id in departing_passengers:
-            self.time_logs['passenger'][passenger_id]['departure_queue_exit_time'] = self.env.now
-            self.waiting_times['passenger'][passenger_id]['waiting_time'] = self.env.now - self.arrival_departure_times['passenger'][passenger_id]['arrival_time']
+        self.departing_passenger_queue_length += self.seat_capacity
 
-        # # Blocking of the surface ends here.
-        # self.surface_store.put('park')
         # Decrese the surface count
-        last_value = self.get_latest_value_from_dict(self.surface_aircraft_count)
-        self.surface_aircraft_count[self.env.now] = last_value - 1
+        self.surface_aircraft_count.update(self.env.now, -1)
+        if self.event_trace is not None:
+            self.trace_event(event_trace.BOARDING, event_trace.AIRCRAFT, aircraft_id)
 
-        # # Log surface count
-        # self.logger.debug(f"Num aircraft at surface: {self.num_park - len(self.surface_store.items)}")
-        
         self.env.process(self.departure_process(aircraft_id))
 
     def put_back_surface_capacity(self):
-        self.surface_store.put('park')
+        self.surface_capacity.put()
 
     def departure_process(self, aircraft_id):
         start_time = self.env.now
@@ -345,13 +572,14 @@ class VertiportSimulation:
 
         if self.tlof_feedback:
             # Request the tlof server
-            with self.tlof_server.request(priority=1) as request:
+            with self.arrival_pads.request(priority=1) as request:
                 yield request
 
                 # # Blocking of the surface ends here.
-                # self.surface_store.put('park')
+                # self.put_back_surface_capacity()
                 # Save the pushback time
-                self.arrival_departure_times['aircraft'][aircraft_id]['pushback_time'] = self.env.now
+                if not self.summary_only:
+                    self.aircraft_records.pushback_time[aircraft_id] = self.env.now
                 # Update the departure queue length
                 self.update_aircraft_departure_queue_length(update=-1)            
                 # # Update the passenger queue length
@@ -359,69 +587,49 @@ class VertiportSimulation:
 
                 self.passenger_service_queue_length -= self.seat_capacity
                 
-                time = self.is_time_overlapping(self.env.now, 'queue', self.queue_lengths)
-                self.queue_lengths['passenger_service_queue'][time] = self.passenger_service_queue_length            
+                self.queue_lengths['passenger_service_queue'].record(self.env.now, self.passenger_service_queue_length)            
+                if self.event_trace is not None:
+                    self.trace_event(event_trace.PUSHBACK, event_trace.AIRCRAFT, aircraft_id)
 
                 # Save the tlof queue waiting time
-                self.waiting_times['aircraft'][aircraft_id]['tlof_departure_queue_waiting_time'] = self.env.now - start_time
-                if self.stochastic:
-                    departure_process_time = np.random.exponential(self.tlof_mean_service_time)
-                else:
-                    departure_process_time = self.tlof_mean_service_time
+                if not self.summary_only:
+                    self.aircraft_records.tlof_departure_queue_waiting_time[aircraft_id] = self.env.now - start_time
+                departure_process_time = self.tlof_sampler()
                 yield self.env.timeout(departure_process_time)
         else:
-            with self.tlof_server2.request(priority=1) as request:
+            with self.departure_pads.request(priority=1) as request:
                 yield request
                 # Save the pushback time
-                self.arrival_departure_times['aircraft'][aircraft_id]['pushback_time'] = self.env.now
+                if not self.summary_only:
+                    self.aircraft_records.pushback_time[aircraft_id] = self.env.now
                 # Update the departure queue length
                 self.update_aircraft_departure_queue_length(update=-1)            
                 # # Update the passenger queue length
                 self.passenger_service_queue_length -= self.seat_capacity
                 
-                time = self.is_time_overlapping(self.env.now, 'queue', self.queue_lengths)
-                self.queue_lengths['passenger_service_queue'][time] = self.passenger_service_queue_length            
+                self.queue_lengths['passenger_service_queue'].record(self.env.now, self.passenger_service_queue_length)            
+                if self.event_trace is not None:
+                    self.trace_event(event_trace.PUSHBACK, event_trace.AIRCRAFT, aircraft_id)
 
                 # Save the tlof queue waiting time
-                self.waiting_times['aircraft'][aircraft_id]['tlof_departure_queue_waiting_time'] = self.env.now - start_time
-                if self.stochastic:
-                    departure_process_time = np.random.exponential(self.tlof_mean_service_time)
-                else:
-                    departure_process_time = self.tlof_mean_service_time
+                if not self.summary_only:
+                    self.aircraft_records.tlof_departure_queue_waiting_time[aircraft_id] = self.env.now - start_time
+                departure_process_time = self.tlof_sampler()
                 yield self.env.timeout(departure_process_time)
 
         # Blocking of the surface ends here.
         self.put_back_surface_capacity()                
         # Save the tlof service time
-        self.process_times['aircraft'][aircraft_id]['departure_process_time'] = departure_process_time
+        if not self.summary_only:
+            self.aircraft_records.departure_process_time[aircraft_id] = departure_process_time
         # Update the departure counter
         self.update_counter('aircraft', self.arrival_departure_counter, 'departure_counter', 1)
+        if self.event_trace is not None:
+            self.trace_event(event_trace.DEPARTURE, event_trace.AIRCRAFT, aircraft_id)
         # Save passenger departure count
         self.update_counter(agent_type='passenger', counter=self.arrival_departure_counter, counter_type='departure_counter', change=self.seat_capacity)
         # Save departure time
-        self.arrival_departure_times['aircraft'][aircraft_id]['departure_time'] = self.env.now
-
-    def is_time_overlapping(self, time: float, agent_type: str, tracker: Dict) -> int:
-        if agent_type == 'aircraft':
-            if len(tracker) == 0:
-                return time
-            if time not in list(tracker[agent_type].keys())[-3:]:
-                return time
-            time += 1/60/60/1000  # add 0.01 milisecond
-            return self.is_time_overlapping(time=time, agent_type=agent_type, tracker=tracker)
-        elif agent_type == 'passenger':
-            if len(tracker) == 0:
-                return time
-            if time not in list(tracker[agent_type].keys())[-3:]:
-                return time
-            time += 1/60/60/1000
-            return self.is_time_overlapping(time=time, agent_type=agent_type, tracker=tracker)
-        elif agent_type == 'queue':
-            if len(tracker) == 0:
-                return time
-            if time not in list(tracker.keys())[-3:]:
-                return time
-            time += 1/60/60/1000
-            return self.is_time_overlapping(time=time, agent_type=agent_type, tracker=tracker)
-        else:
-            raise ValueError('agent_type must be either aircraft, passenger or tracker')          
\ No newline at end of file
+        if not self.summary_only:
+            self.aircraft_records.departure_time[aircraft_id] = self.env.now
+        if self.departure_handler is not None:
+            self.departure_handler(aircraft_id)